@@ -36,9 +36,131 @@ class Settings(BaseSettings):
     # OpenRouter-specific optional headers (recommended by OpenRouter docs)
     openrouter_site_url: Optional[str] = None
     openrouter_app_name: Optional[str] = None
+    # Failover providers tried in order after the primary: JSON list of
+    # {"name": ..., "base_url": ..., "api_key": ..., "model": ...} (base_url/api_key default to the primary's)
+    llm_fallback_providers: Optional[str] = None
+    llm_request_timeout_seconds: float = 30.0
+    # Ask for provider-native JSON-schema output (response_format) in generate_json(schema=...);
+    # per fallback provider use "json_schema": false. Turned off automatically if a provider rejects it.
+    llm_structured_output: bool = True
+    llm_max_retries: int = 2  # per provider, on 429/5xx/timeouts
+    llm_retry_base_delay_seconds: float = 0.5  # exponential backoff base (full jitter)
+    llm_retry_max_delay_seconds: float = 8.0  # cap; a longer Retry-After fails over instead of waiting
+    llm_hedge_enabled: bool = False  # duplicate a slow call to the second provider after the primary's p95
+    llm_hedge_min_samples: int = 20  # primary latency samples needed before hedging kicks in
+    # Circuit breaker around LLM calls: opens on high error rate (slow calls count as errors),
+    # then routes return their fallback payloads immediately until a half-open probe succeeds
+    # (reflection agent runs use a separate breaker with these settings, slow past their time budget)
+    llm_circuit_enabled: bool = True
+    llm_circuit_window_size: int = 20  # recent calls considered
+    llm_circuit_min_calls: int = 5  # don't open before this many calls are in the window
+    llm_circuit_failure_rate: float = 0.5
+    # A provider attempt this slow is about to time out, so it counts as a failure. The default is
+    # 0.9 * LLM_REQUEST_TIMEOUT_SECONDS: large prompts (reflections, multi-habit batches) routinely
+    # take 15-25s and must not open the breaker; only attempts near the timeout signal a degraded provider
+    llm_circuit_slow_call_seconds: Optional[float] = None
+    llm_circuit_open_seconds: float = 30.0  # then half-open
+    llm_circuit_half_open_max_calls: int = 1
+    # Adaptive max_tokens per prompt name: after min_samples completions, reserve
+    # percentile * (1 + headroom) tokens (at least the floor, at most the caller's max_tokens).
+    # A finish_reason=length answer is retried once with a larger budget (up to llm_max_tokens_cap).
+    llm_adaptive_max_tokens_enabled: bool = True
+    llm_adaptive_max_tokens_min_samples: int = 20
+    llm_adaptive_max_tokens_percentile: float = 0.99
+    llm_adaptive_max_tokens_headroom: float = 0.2
+    llm_adaptive_max_tokens_floor: int = 256
+    llm_max_tokens_cap: int = 8192
+    # Per-prompt LLM usage accounting: in-memory for /api/v1/metrics/llm, rolled up per UTC day
+    # into the llm_usage_daily collection. Prices are used when the provider reports no usage.cost.
+    llm_usage_rollup_enabled: bool = True
+    llm_usage_flush_interval_seconds: float = 60.0
+    llm_price_input_per_million: float = 0.0  # USD per 1M prompt tokens
+    llm_price_output_per_million: float = 0.0  # USD per 1M completion tokens
+    llm_price_cached_input_ratio: float = 0.5  # cached prompt tokens cost this fraction of the input price
+    # LLM trace sink: sampled NDJSON events written off the event loop, size-rotated, prompts redacted
+    llm_trace_enabled: bool = True
+    llm_trace_path: str = "logs/llm_trace.ndjson"
+    llm_trace_sample_rate: float = 0.1  # fraction of LLM calls traced
+    llm_trace_max_bytes: int = 5 * 1024 * 1024
+    llm_trace_backup_count: int = 3
+    llm_trace_queue_size: int = 1000  # events beyond this are dropped, never block
+    llm_trace_include_prompts: bool = False  # False: prompts/responses stored as hash + length
+    # In-memory LLM response cache (filled by speculative onboarding prefetch, read by onboarding routes)
+    llm_cache_ttl_seconds: int = 900
+    llm_cache_max_entries: int = 512
 
-    # Tavily (optional — for reflection agent web search / James Clear content)
+    # LLM gateway: admission control for provider calls (0 disables a rate limit)
+    llm_max_in_flight: int = 8  # max concurrent provider calls per worker
+    llm_requests_per_minute: int = 0
+    llm_tokens_per_minute: int = 0  # prompt estimate + max_tokens, refunded to actual usage
+    llm_queue_timeout_seconds: float = 60.0  # give up (ValueError -> route fallback) after waiting this long
+
+    # Speculative onboarding prefetch: after saveUserHabitPreference, pre-generate the next steps' options
+    onboarding_prefetch_enabled: bool = True
+    onboarding_prefetch_max_concurrency_per_user: int = 2  # max in-flight speculative LLM calls per user
+
+    # Reflection agent search: curated Atomic Habits snippets (local index, always on) and snippets per lookup
+    reflection_snippet_results: int = 3
+    # Tavily (optional — live web search for the reflection agent, in addition to the local snippets)
     tavily_api_key: Optional[str] = None
+    reflection_agent_web_search_enabled: bool = False
+    # Mongo cache of live search results, keyed by normalized query
+    web_search_cache_enabled: bool = True
+    web_search_cache_ttl_seconds: int = 7 * 24 * 3600
+    # Reflection agent budgets: wall time per run, LangGraph steps per run (each tool round trip
+    # is 2 steps), and threads for its synchronous setup work
+    reflection_agent_timeout_seconds: float = 45.0
+    reflection_agent_max_steps: int = 8
+    reflection_agent_max_threads: int = 2
+    # Reflection cache: entries are reused while their input fingerprint (habit context + streak +
+    # prompt version) matches; matching entries older than the soft TTL are served while a background
+    # refresh runs, entries older than the hard TTL are a miss (generated while the user waits)
+    reflection_cache_soft_ttl_seconds: int = 7 * 24 * 3600
+    reflection_cache_hard_ttl_seconds: int = 30 * 24 * 3600
+    # In-process L1 in front of reflection_cache: entry lifetime (how long another worker's update can
+    # go unseen without the change stream), entry and memory bounds, and change-stream invalidation
+    # (needs a replica set)
+    reflection_l1_enabled: bool = True
+    reflection_l1_ttl_seconds: float = 60.0
+    reflection_l1_max_entries: int = 2048
+    reflection_l1_max_bytes: int = 8 * 1024 * 1024
+    reflection_l1_change_stream: bool = False
+    # Cross-worker reflection generation lease: lease lifetime (must exceed one generation), how
+    # often a request waiting on another worker's generation polls the cache, and how long it waits
+    # before generating itself (well under the Reflection page's latency budget)
+    reflection_lease_ttl_seconds: float = 120.0
+    reflection_lease_poll_interval_seconds: float = 0.5
+    reflection_lease_wait_seconds: float = 15.0
+    # Background job queue (jobs collection): run the worker pool in the API process (else run
+    # python -m app.workers), workers per process, idle poll interval, claim lease (renewed every
+    # third of it while the job runs; a job whose lease runs out is taken over), attempts before
+    # dead-lettering, retry backoff base/cap, how long finished jobs are kept and shutdown drain time
+    job_workers_in_process: bool = True
+    job_worker_concurrency: int = 2
+    job_poll_interval_seconds: float = 1.0
+    job_lease_seconds: float = 180.0
+    job_max_attempts: int = 5
+    job_retry_base_seconds: float = 10.0
+    job_retry_max_seconds: float = 600.0
+    job_retention_seconds: int = 24 * 3600
+    job_drain_timeout_seconds: float = 30.0
+    # Check-ins / backfills within this window of each other trigger one reflection generation,
+    # which runs this long after the last of them
+    reflection_checkin_debounce_seconds: float = 5.0
+    # Hedged reflection generation: start the direct LLM call if the agent has not produced valid
+    # items after this many seconds (0 = run both at once) and keep the first valid result
+    reflection_hedge_enabled: bool = True
+    reflection_hedge_delay_seconds: float = 8.0
+    # Prefetch generates a user's stale habits this many per LLM call (shared instructions sent once)
+    reflection_batch_enabled: bool = True
+    reflection_batch_max_habits: int = 4
+    # Nightly reflection cache warming: off-peak window start (UTC hour) and length, global budget
+    # of habits generated per hour, and how recent a check-in must be for a user to be warmed
+    reflection_warming_enabled: bool = True
+    reflection_warming_start_hour: int = 2
+    reflection_warming_window_hours: float = 4.0
+    reflection_warming_max_habits_per_hour: int = 120
+    reflection_warming_active_days: int = 14
 
     # Opik (optional — LLM observability and tracing)
     opik_api_key: Optional[str] = None
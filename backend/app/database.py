@@ -19,6 +19,28 @@ logger = logging.getLogger(__name__)
 client: Optional[AsyncIOMotorClient] = None
 
 
+async def _dedupe_reflection_cache(db) -> None:
+    """
+    Keep only the most recently cached reflection_cache entry per (userId, habitId), so the
+    unique index can be built over entries saved before it existed. No-op once it exists.
+    """
+    if "userId_habitId_unique" in await db.reflection_cache.index_information():
+        return
+    removed = 0
+    async for group in db.reflection_cache.aggregate(
+        [
+            {"$sort": {"cachedAt": -1}},
+            {"$group": {"_id": {"userId": "$userId", "habitId": "$habitId"}, "ids": {"$push": "$_id"}}},
+            {"$match": {"ids.1": {"$exists": True}}},
+        ],
+        allowDiskUse=True,
+    ):
+        result = await db.reflection_cache.delete_many({"_id": {"$in": group["ids"][1:]}})
+        removed += result.deleted_count
+    if removed:
+        logger.info(f"Removed {removed} duplicate reflection_cache entries")
+
+
 async def connect_to_mongo():
     """Create database connection."""
     global client
@@ -50,6 +72,14 @@ async def connect_to_mongo():
         except Exception as e:
             logger.debug(f"Index creation note: {str(e)}")
 
+        # Nightly reflection warming: recently active streaks, past reflections per user
+        try:
+            await db.streaks.create_index([("lastCheckInDate", 1)], name="lastCheckInDate")
+            await db.reflections.create_index([("userId", 1), ("createdAt", -1)], name="userId_createdAt")
+            logger.info("Created indexes for reflection warming on streaks and reflections")
+        except Exception as e:
+            logger.debug(f"Index creation note: {str(e)}")
+
         # Habits: compound unique index allows multiple habits per user (each userId+habitId is unique)
         try:
             await db.habits.create_index(
@@ -61,6 +91,60 @@ async def connect_to_mongo():
         except Exception as e:
             logger.debug(f"Index creation note: {str(e)}")
 
+        # LLM usage rollup: one document per day + prompt (_id); query by date range
+        try:
+            await db.llm_usage_daily.create_index([("date", 1)], name="date")
+            logger.info("Created index on llm_usage_daily collection: date")
+        except Exception as e:
+            logger.debug(f"Index creation note: {str(e)}")
+
+        # Web search cache: expire entries at expiresAt
+        try:
+            await db.web_search_cache.create_index("expiresAt", expireAfterSeconds=0, name="expiresAt_ttl")
+            logger.info("Created index on web_search_cache collection: expiresAt_ttl")
+        except Exception as e:
+            logger.debug(f"Index creation note: {str(e)}")
+
+        # Reflection cache: entries removed at expiresAt (set on save)
+        try:
+            await db.reflection_cache.create_index("expiresAt", expireAfterSeconds=0, name="expiresAt_ttl")
+            logger.info("Created index on reflection_cache collection: expiresAt_ttl")
+        except Exception as e:
+            logger.warning(f"Could not create reflection_cache expiresAt_ttl index: {str(e)}")
+
+        # Reflection cache: one entry per habit (older duplicates would fail the build)
+        try:
+            await _dedupe_reflection_cache(db)
+            await db.reflection_cache.create_index(
+                [("userId", 1), ("habitId", 1)],
+                unique=True,
+                name="userId_habitId_unique"
+            )
+            logger.info("Created index on reflection_cache collection: userId_habitId_unique")
+        except Exception as e:
+            logger.warning(f"Could not create reflection_cache userId_habitId_unique index: {str(e)}")
+
+        # Generation leases: clean up expired leases (expired ones are free to take over anyway)
+        try:
+            await db.generation_leases.create_index("expiresAt", expireAfterSeconds=0, name="expiresAt_ttl")
+            logger.info("Created index on generation_leases collection: expiresAt_ttl")
+        except Exception as e:
+            logger.debug(f"Index creation note: {str(e)}")
+
+        # Job queue: claim by status + runAt, one queued job per dedupe key, finished jobs expire
+        try:
+            await db.jobs.create_index([("status", 1), ("runAt", 1)], name="status_runAt")
+            await db.jobs.create_index(
+                "dedupeKey",
+                unique=True,
+                partialFilterExpression={"status": "queued"},
+                name="dedupeKey_queued_unique",
+            )
+            await db.jobs.create_index("expireAt", expireAfterSeconds=0, name="expireAt_ttl")
+            logger.info("Created indexes on jobs collection")
+        except Exception as e:
+            logger.debug(f"Index creation note: {str(e)}")
+
     except Exception as e:
         logger.error(f"Error connecting to MongoDB: {str(e)}")
         logger.error(f"Traceback: {traceback.format_exc()}")
@@ -16,10 +16,18 @@ load_dotenv()
 from app.core.logging_config import setup_logging
 logger = setup_logging()
 
-from app.database import connect_to_mongo, close_mongo_connection
+from app.database import connect_to_mongo, close_mongo_connection, get_database
 from app.core.config import get_cors_origins, is_firebase_configured, settings
 from app.core.firebase import init_firebase
-from app.routers import habits, streaks, reflections, admin
+from app.routers import habits, streaks, reflections, admin, metrics
+from app.services.llm_service import llm_service
+from app.services.circuit_breaker import llm_circuit_breaker
+from app.services.llm_trace import llm_trace
+from app.services.llm_metrics import llm_usage_metrics
+from app.services.reflection_agent_service import shutdown_agent_executor
+from app.services.job_queue import job_worker_pool
+from app.services.reflection_cache_service import reflection_cache_service
+from app.services.reflection_warming import schedule_reflection_warming
 from app.utils.opik_prompts import register_all_prompts
 
 
@@ -50,7 +58,44 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         logger.warning("Opik prompt registration failed (non-fatal): %s", e)
 
+    # Periodic per-prompt LLM usage rollup to MongoDB
+    llm_usage_metrics.start_flusher(get_database)
+
+    # Background job workers (reflection generation), unless they run as python -m app.workers
+    if settings.job_workers_in_process:
+        job_worker_pool.start(get_database, settings.job_worker_concurrency)
+
+    # Reflection cache entries from before source/expiresAt existed
+    try:
+        await reflection_cache_service.backfill_entry_metadata(get_database())
+    except Exception as e:
+        logger.warning(f"Reflection cache backfill failed (non-fatal): {e}")
+
+    # Keep this worker's reflection L1 coherent with other workers' writes (REFLECTION_L1_CHANGE_STREAM)
+    reflection_cache_service.start_l1_invalidation(get_database)
+
+    # Nightly reflection cache warming (one planning job queued across all processes)
+    try:
+        await schedule_reflection_warming(get_database())
+    except Exception as e:
+        logger.warning(f"Reflection warming not scheduled: {e}")
+
     yield
+
+    # Shutdown: stop claiming jobs and let in-flight ones finish (they still need DB and LLM)
+    await job_worker_pool.stop()
+    await reflection_cache_service.stop_l1_invalidation()
+    # Shutdown: write buffered LLM usage before the DB connection closes
+    await llm_usage_metrics.stop_flusher(get_database)
+    # Shutdown: close the shared LLM HTTP client
+    try:
+        await llm_service.close()
+    except Exception as e:
+        logger.warning(f"Error closing LLM HTTP client: {e}")
+    # Stop the reflection agent's worker threads
+    shutdown_agent_executor()
+    # Flush queued LLM trace events
+    llm_trace.stop()
     
     # Shutdown: Close MongoDB connection
     try:
@@ -98,6 +143,7 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
 app.include_router(habits.router)
 app.include_router(streaks.router)
 app.include_router(reflections.router)
+app.include_router(metrics.router)
 # Admin router only when Firebase is configured (optional)
 if is_firebase_configured():
     app.include_router(admin.router)
@@ -116,8 +162,9 @@ async def root():
 
 @app.get("/health", tags=["health"])
 async def health_check():
-    """Health check endpoint."""
+    """Health check endpoint. Reports LLM circuit state but stays healthy (fallbacks keep the app usable)."""
     return {
         "status": "healthy",
-        "service": settings.app_name
+        "service": settings.app_name,
+        "llm": {"circuit": llm_circuit_breaker.snapshot()["state"]},
     }
@@ -87,7 +87,52 @@ class ReflectionItemsResponse(BaseModel):
     )
 
 
-# ----- Save reflection answers -----
+# ----- Compact LLM wire format for reflection items -----
+# Short keys and no derivable fields (titles, current values) keep the model's output small;
+# app.utils.reflection_format.expand_reflection_items turns it into ReflectionItemsResponse.
+
+
+class CompactInsight(BaseModel):
+    """Insight card: e = emoji, t = text, h = highlight."""
+
+    e: str = "💪"
+    t: str
+    h: Optional[str] = None
+
+
+class CompactExperiment(BaseModel):
+    """Experiment: s = suggested text, w = why."""
+
+    s: str
+    w: str
+
+
+class CompactExperiments(BaseModel):
+    """One experiment per lever."""
+
+    anchor: Optional[CompactExperiment] = None
+    environment: Optional[CompactExperiment] = None
+    enjoyment: Optional[CompactExperiment] = None
+
+
+class CompactReflectionItems(BaseModel):
+    """Reflection items as generated by the LLM: i = insights, q = questions, x = experiments."""
+
+    i: list[CompactInsight] = Field(default_factory=list)
+    q: list[str] = Field(..., min_length=2, max_length=2)
+    x: CompactExperiments
+
+
+class CompactHabitReflection(CompactReflectionItems):
+    """One habit's section of a multi-habit response: n = habit number in the prompt (from 1)."""
+
+    n: int
+
+
+class CompactReflectionBatch(BaseModel):
+    """Reflection items for several habits from one LLM call (get_reflection_items_batch_prompt)."""
+
+    r: list[CompactHabitReflection]
 
 
 # ----- Single reflection suggestion (Screen 2) -----
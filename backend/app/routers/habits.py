@@ -25,6 +25,7 @@ from app.models.habit import (
 from app.services.habit_service import habit_service
 from app.services.llm_service import llm_service
 from app.services.reflection_cache_service import reflection_cache_service
+from app.services.onboarding_prefetch_service import onboarding_prefetch_service
 from app.utils.prompts import (
     get_identity_generation_prompt,
     get_short_habit_options_prompt,
@@ -132,6 +133,13 @@ async def save_user_habit_preference(
         )
         result = await habit_service.save_habit_preference(db, data_to_save)
         logger.info(f"Successfully saved habit preference - _id: {result.id}")
+
+        # Speculatively generate the next onboarding step's options (cached for the next request)
+        onboarding_prefetch_service.schedule(
+            current_user.uid,
+            result.habitId,
+            habit_service.build_habit_context(result.preferences.model_dump()),
+        )
         return result
     except Exception as e:
         logger.error(f"Error saving habit preference: {str(e)}")
@@ -185,7 +193,7 @@ async def generate_identities(
 
         try:
             # Call LLM to generate identity statements
-            identities = await llm_service.generate_list(prompt)
+            identities = await llm_service.generate_list(prompt, prompt_name="identity_generation")
             logger.info(f"Successfully generated {len(identities)} identities")
         except ValueError as e:
             # Common case during local dev: LLM API key not configured.
@@ -244,8 +252,8 @@ async def generate_short_habit_options(
         prompt = get_short_habit_options_prompt(habit_context)
         logger.debug(f"Generated prompt for short habit options - length: {len(prompt)}")
         
-        # Call LLM
-        options = await llm_service.generate_list(prompt)
+        # Call LLM (served from cache when speculatively pre-generated after the last save)
+        options = await llm_service.generate_list(prompt, use_cache=True, prompt_name="short_habit_options")
         logger.info(f"Successfully generated {len(options)} short habit options")
         
         return HabitOptionResponse(options=options)
@@ -295,8 +303,8 @@ async def generate_full_habit_options(
         prompt = get_full_habit_options_prompt(habit_context)
         logger.debug(f"Generated prompt for full habit options - length: {len(prompt)}")
         
-        # Call LLM
-        options = await llm_service.generate_list(prompt)
+        # Call LLM (served from cache when speculatively pre-generated after the last save)
+        options = await llm_service.generate_list(prompt, use_cache=True, prompt_name="full_habit_options")
         logger.info(f"Successfully generated {len(options)} full habit options")
         
         return HabitOptionResponse(options=options)
@@ -346,8 +354,8 @@ async def generate_obvious_cues(
         prompt = get_obvious_cues_prompt(habit_context)
         logger.debug(f"Generated prompt for obvious cues - length: {len(prompt)}")
         
-        # Call LLM
-        cues = await llm_service.generate_list(prompt)
+        # Call LLM (served from cache when speculatively pre-generated after the last save)
+        cues = await llm_service.generate_list(prompt, use_cache=True, prompt_name="obvious_cues")
         logger.info(f"Successfully generated {len(cues)} obvious cues")
         
         return ObviousCueResponse(cues=cues)
@@ -414,7 +422,7 @@ async def get_preference_edit_options(
             reflection_context,
         )
         try:
-            options = await llm_service.generate_list(prompt)
+            options = await llm_service.generate_list(prompt, prompt_name="preference_edit_options")
         except ValueError as e:
             logger.warning(
                 f"LLM unavailable for preference edit options, using fallback. Error: {str(e)}"
@@ -0,0 +1,79 @@
+"""
+Operational metrics for the LLM pipeline (gateway queues, caches, per-prompt usage).
+Unauthenticated like /health: contains no user data.
+"""
+import logging
+from fastapi import APIRouter, status
+
+from app.services.circuit_breaker import llm_circuit_breaker, reflection_agent_circuit_breaker
+from app.database import get_database
+from app.services.generation_lease import generation_lease
+from app.services.job_queue import job_queue, job_worker_pool
+from app.services.llm_gateway import llm_gateway
+from app.services.llm_service import llm_service
+from app.services.llm_metrics import llm_usage_metrics
+from app.services.llm_trace import llm_trace
+from app.services.reflection_cache_service import reflection_cache_service
+from app.services.reflection_warming import reflection_warming_scheduler
+from app.services.token_budget import token_budget_tracker
+from app.services.web_search_cache import web_search_cache
+from app.utils.prompt_registry import prompt_registry
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/api/v1", tags=["metrics"])
+
+# One item per section of the response, in response order
+METRICS_DESCRIPTION = "Snapshot of: " + "; ".join((
+    "circuit breaker state",
+    "reflection agent circuit breaker state",
+    "gateway in-flight count, queue depth and wait times per priority",
+    "LLM response cache",
+    "trace sink",
+    "per-prompt max_tokens budgets",
+    "per-prompt usage (tokens, cost, wall time, TTFB histograms)",
+    "prompt template versions",
+    "reflection generation outcomes (agent vs direct LLM winners, hedges, cache reads, batches, repairs)",
+    "the reflection cache L1",
+    "generation leases",
+    "the last nightly cache warming plan",
+    "job queue counters, depth and latency",
+    "the agent's web search cache",
+)) + "."
+
+
+async def _job_metrics() -> dict:
+    """Job queue counters and latency for this process, plus queue depth across all workers."""
+    stats = {**job_queue.snapshot(), "pool": job_worker_pool.snapshot()}
+    try:
+        stats["depth"] = await job_queue.depth(get_database())
+    except Exception as e:
+        logger.warning(f"Could not read job queue depth: {e}")
+        stats["depth"] = None
+    return stats
+
+
+@router.get(
+    "/metrics/llm",
+    status_code=status.HTTP_200_OK,
+    summary="LLM pipeline metrics",
+    description=METRICS_DESCRIPTION,
+)
+async def get_llm_metrics():
+    """Snapshot of in-process LLM metrics for this worker."""
+    return {
+        "circuitBreaker": llm_circuit_breaker.snapshot(),
+        "agentCircuitBreaker": reflection_agent_circuit_breaker.snapshot(),
+        "gateway": llm_gateway.snapshot(),
+        "responseCache": llm_service.response_cache.stats(),
+        "trace": llm_trace.stats(),
+        "tokenBudgets": token_budget_tracker.snapshot(),
+        "prompts": llm_usage_metrics.snapshot(),
+        "promptTemplates": prompt_registry.snapshot(),
+        "reflectionGeneration": reflection_cache_service.generation_stats(),
+        "reflectionL1": reflection_cache_service.l1_stats(),
+        "generationLeases": generation_lease.stats(),
+        "reflectionWarming": reflection_warming_scheduler.stats(),
+        "jobs": await _job_metrics(),
+        "webSearchCache": web_search_cache.stats(),
+    }
@@ -20,9 +20,8 @@ from app.models.reflection import (
 )
 from app.services.llm_service import llm_service
 from app.services.habit_service import habit_service
-from app.services.streak_service import streak_service
 from app.services.reflection_cache_service import reflection_cache_service
-from app.utils.prompts import get_reflection_items_prompt, get_reflection_suggestion_prompt
+from app.utils.prompts import get_reflection_suggestion_prompt
 from app.core.auth import CurrentUser, get_current_user
 
 logger = logging.getLogger(__name__)
@@ -49,49 +48,21 @@ async def get_reflection_items(
 ):
     """
     Get reflection flow items (Screen 1 & 2) for one habit.
-    Uses authenticated user's uid. Fetches habit + streak, sends to LLM, returns structured items.
+    Uses authenticated user's uid. Serves cached items (stale-while-revalidate); on a miss fetches
+    habit + streak, sends to LLM, returns structured items.
     """
     uid = current_user.uid
     try:
         logger.info(f"GET /getReflectionItems - userId: {uid}, habitId: {habitId}")
 
-        # Check cache first (populated by background task after check-in)
-        cached_data = await reflection_cache_service.get_cached_reflection(db, uid, habitId)
-        if cached_data:
-            logger.info(f"Returning cached reflection items for user={uid}, habit={habitId}")
-            data = cached_data
-        else:
-            # Cache miss - generate fresh data
-            habit_context = await habit_service.get_habit_context(db, uid, habitId)
-            if not habit_context:
-                raise HTTPException(
-                    status_code=status.HTTP_404_NOT_FOUND,
-                    detail=f"Habit not found for userId={uid}, habitId={habitId}",
-                )
-
-            streak = await streak_service.get_streak_by_id(db, uid, habitId)
-            streak_data = {
-                "currentStreak": streak.currentStreak,
-                "longestStreak": streak.longestStreak,
-                "totalStones": getattr(streak, "totalStones", streak.longestStreak),
-                "lastCheckInDate": str(streak.lastCheckInDate) if streak.lastCheckInDate else None,
-            }
-
-            data = None
-            try:
-                prompt = get_reflection_items_prompt(habit_context, streak_data)
-                # Reflection JSON is large; need enough output tokens to avoid truncation
-                data = await llm_service.generate_json(prompt, max_tokens=4096)
-            except Exception as llm_err:
-                logger.warning(
-                    "LLM reflection failed (%s); using default reflection payload",
-                    llm_err,
-                )
-                from app.services.reflection_cache_service import DEFAULT_REFLECTION_DATA
-                data = DEFAULT_REFLECTION_DATA.copy()
-
-            # Save to cache for future requests
-            await reflection_cache_service.save_cached_reflection(db, uid, habitId, data)
+        # Cache (populated by background task after check-in); stale entries are served while
+        # a background refresh runs, only a miss generates while the user waits
+        data = await reflection_cache_service.get_reflection_items(db, uid, habitId)
+        if data is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Habit not found for userId={uid}, habitId={habitId}",
+            )
 
         insights = [
             InsightItem(
@@ -227,7 +198,9 @@ async def get_reflection_suggestion(
         logger.info(f"getReflectionSuggestion calling LLM, prompt_length={len(prompt)}")
         try:
             # Use low max_tokens for a single small JSON object — reduces latency significantly
-            data = await llm_service.generate_json(prompt, max_tokens=400)
+            data = await llm_service.generate_json(
+                prompt, max_tokens=400, schema=ReflectionSuggestionResponse, prompt_name="reflection_suggestion"
+            )
             print(f"[getReflectionSuggestion] LLM returned: type={data.get('type')} title={data.get('title', '')[:40]}...")
             logger.info(f"getReflectionSuggestion LLM success type={data.get('type')}")
         except ValueError as e:
@@ -95,9 +95,9 @@ async def update_user_habit_streak_by_id(
         
         result = await streak_service.update_streak_by_checkin(db, request_data)
         
-        # Trigger background generation of reflection items (fire-and-forget)
+        # Queue background generation of reflection items (debounced across check-in bursts)
         # This pre-caches the LLM response so Reflection page loads instantly
-        trigger_background_reflection_generation(db, current_user.uid, request_data.habitId)
+        await trigger_background_reflection_generation(db, current_user.uid, request_data.habitId, debounce=True)
         
         return result
         
@@ -318,8 +318,8 @@ async def backfill_check_ins(
         # Fetch the final streak state for the response
         result = await streak_service.get_streak_by_id(db, uid, habit_id)
 
-        # Fire background reflection generation after backfill
-        trigger_background_reflection_generation(db, uid, habit_id)
+        # Queue background reflection generation after backfill
+        await trigger_background_reflection_generation(db, uid, habit_id, debounce=True)
 
         logger.info(
             f"POST /backfillCheckIns - userId: {uid}, habitId: {habit_id}, "
@@ -0,0 +1,170 @@
+"""
+Circuit breaker for LLM provider calls.
+
+CLOSED: calls go through; outcomes are recorded in a sliding window. A call counts as a failure
+when it errors or takes longer than slow_call_seconds. When the failure rate over the window
+reaches failure_rate_threshold (with at least min_calls recorded) the breaker OPENs.
+OPEN: calls are rejected immediately with CircuitOpenError (a ValueError, so routes use their
+existing fallback payloads in milliseconds instead of waiting for the provider timeout).
+HALF_OPEN: after open_seconds, up to half_open_max_calls probe calls are let through; a
+successful probe closes the breaker, a failed one re-opens it.
+"""
+import logging
+import time
+from collections import deque
+from typing import Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(ValueError):
+    """Raised instead of calling the provider while the circuit is open."""
+
+
+class CircuitBreaker:
+    """Error-rate + latency circuit breaker (single event loop, no locking needed)."""
+
+    def __init__(
+        self,
+        name: str,
+        window_size: int = 20,
+        min_calls: int = 5,
+        failure_rate_threshold: float = 0.5,
+        slow_call_seconds: float = 15.0,
+        open_seconds: float = 30.0,
+        half_open_max_calls: int = 1,
+        enabled: bool = True,
+    ):
+        self.name = name
+        self.min_calls = min_calls
+        self.failure_rate_threshold = failure_rate_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.open_seconds = open_seconds
+        self.half_open_max_calls = max(1, half_open_max_calls)
+        self.enabled = enabled
+        self.state = STATE_CLOSED
+        self._window: deque = deque(maxlen=window_size)  # True = failure
+        self._opened_at: Optional[float] = None
+        self._half_open_in_flight = 0
+        self.rejected = 0
+        self.times_opened = 0
+
+    def _refresh_state(self) -> None:
+        if self.state == STATE_OPEN and self._opened_at is not None:
+            if time.monotonic() - self._opened_at >= self.open_seconds:
+                self.state = STATE_HALF_OPEN
+                self._half_open_in_flight = 0
+                logger.info(f"Circuit {self.name}: half-open, allowing probe calls")
+
+    def is_open(self) -> bool:
+        """True while calls would be rejected (used to skip work that depends on the provider)."""
+        if not self.enabled:
+            return False
+        self._refresh_state()
+        return self.state == STATE_OPEN or (
+            self.state == STATE_HALF_OPEN and self._half_open_in_flight >= self.half_open_max_calls
+        )
+
+    def before_call(self) -> None:
+        """Raise CircuitOpenError if the call must be short-circuited; otherwise admit it."""
+        if not self.enabled:
+            return
+        if self.is_open():
+            self.rejected += 1
+            raise CircuitOpenError(f"LLM circuit {self.name} is open; using fallback")
+        if self.state == STATE_HALF_OPEN:
+            self._half_open_in_flight += 1
+
+    def record_success(self, duration_seconds: float) -> None:
+        """Record a completed call; slow calls count as failures."""
+        if duration_seconds > self.slow_call_seconds:
+            logger.warning(f"Circuit {self.name}: slow call ({duration_seconds:.1f}s) counted as failure")
+            self.record_failure()
+            return
+        if self.state == STATE_HALF_OPEN:
+            self._close()
+            return
+        self._window.append(False)
+
+    def record_failure(self) -> None:
+        if self.state == STATE_HALF_OPEN:
+            self._open()
+            return
+        self._window.append(True)
+        if self.state == STATE_CLOSED and len(self._window) >= self.min_calls:
+            if self.failure_rate() >= self.failure_rate_threshold:
+                self._open()
+
+    def record_ignored(self) -> None:
+        """Call finished without a provider verdict (cancelled, local queue timeout): free the probe slot."""
+        if self.state == STATE_HALF_OPEN and self._half_open_in_flight > 0:
+            self._half_open_in_flight -= 1
+
+    def failure_rate(self) -> float:
+        if not self._window:
+            return 0.0
+        return sum(1 for failed in self._window if failed) / len(self._window)
+
+    def _open(self) -> None:
+        self.state = STATE_OPEN
+        self._opened_at = time.monotonic()
+        self.times_opened += 1
+        logger.warning(
+            f"Circuit {self.name}: OPEN for {self.open_seconds:.0f}s "
+            f"(failure rate {self.failure_rate():.0%} over {len(self._window)} calls)"
+        )
+
+    def _close(self) -> None:
+        self.state = STATE_CLOSED
+        self._opened_at = None
+        self._half_open_in_flight = 0
+        self._window.clear()
+        logger.info(f"Circuit {self.name}: closed (probe succeeded)")
+
+    def snapshot(self) -> dict:
+        self._refresh_state()
+        return {
+            "name": self.name,
+            "enabled": self.enabled,
+            "state": self.state,
+            "failureRate": round(self.failure_rate(), 3),
+            "windowCalls": len(self._window),
+            "timesOpened": self.times_opened,
+            "rejected": self.rejected,
+            "openForSeconds": (
+                round(time.monotonic() - self._opened_at, 1) if self._opened_at is not None else None
+            ),
+        }
+
+
+# Breaker around LLM provider calls made through LLMService
+llm_circuit_breaker = CircuitBreaker(
+    name="llm",
+    window_size=settings.llm_circuit_window_size,
+    min_calls=settings.llm_circuit_min_calls,
+    failure_rate_threshold=settings.llm_circuit_failure_rate,
+    slow_call_seconds=settings.llm_circuit_slow_call_seconds or 0.9 * settings.llm_request_timeout_seconds,
+    open_seconds=settings.llm_circuit_open_seconds,
+    half_open_max_calls=settings.llm_circuit_half_open_max_calls,
+    enabled=settings.llm_circuit_enabled,
+)
+
+# Breaker around whole reflection agent runs (several LLM steps each): kept apart from the "llm"
+# breaker so multi-step runs neither count as slow single calls nor hold its half-open probe slot;
+# a run is slow only past its own time budget
+reflection_agent_circuit_breaker = CircuitBreaker(
+    name="reflection_agent",
+    window_size=settings.llm_circuit_window_size,
+    min_calls=settings.llm_circuit_min_calls,
+    failure_rate_threshold=settings.llm_circuit_failure_rate,
+    slow_call_seconds=settings.reflection_agent_timeout_seconds,
+    open_seconds=settings.llm_circuit_open_seconds,
+    half_open_max_calls=settings.llm_circuit_half_open_max_calls,
+    enabled=settings.llm_circuit_enabled,
+)
@@ -0,0 +1,84 @@
+"""
+Cross-worker generation leases in MongoDB.
+
+A lease is one document per key (e.g. "reflection:{userId}:{habitId}") in generation_leases,
+taken with a single atomic upsert that only matches a missing or expired lease: while a live
+lease exists the upsert collides on _id and fails, so exactly one worker wins. The holder
+releases the lease when done; if it dies, the lease simply expires and the next worker takes
+over. Expired documents are also removed by a TTL index on expiresAt (database.py).
+"""
+import logging
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+LEASE_COLLECTION = "generation_leases"
+
+# Identifies this worker in lease documents (debugging only; ownership is checked by token)
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+
+class GenerationLease:
+    """Acquire/release of expiring leases; counts wins, contention and takeovers."""
+
+    def __init__(self):
+        self.acquired = 0
+        self.contended = 0
+        self.takeovers = 0
+
+    async def acquire(self, db: AsyncIOMotorDatabase, key: str, ttl_seconds: float) -> Optional[str]:
+        """
+        Take the lease for key if it is free or expired. Returns the owner token, or None if
+        another worker holds a live lease. Other database errors propagate.
+        """
+        now = datetime.now(timezone.utc)
+        token = uuid.uuid4().hex
+        try:
+            previous = await db[LEASE_COLLECTION].find_one_and_update(
+                {"_id": key, "expiresAt": {"$lte": now}},
+                {
+                    "$set": {
+                        "token": token,
+                        "worker": WORKER_ID,
+                        "acquiredAt": now,
+                        "expiresAt": now + timedelta(seconds=ttl_seconds),
+                    }
+                },
+                upsert=True,
+                return_document=ReturnDocument.BEFORE,
+            )
+        except DuplicateKeyError:
+            self.contended += 1
+            return None
+        self.acquired += 1
+        if previous is not None:
+            self.takeovers += 1
+            logger.info(f"Took over expired generation lease {key} from {previous.get('worker')}")
+        return token
+
+    async def release(self, db: AsyncIOMotorDatabase, key: str, token: str) -> None:
+        """Give up the lease (no-op if it expired and someone else took it over)."""
+        try:
+            await db[LEASE_COLLECTION].delete_one({"_id": key, "token": token})
+        except Exception as e:
+            # Expires on its own
+            logger.warning(f"Could not release generation lease {key}: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "acquired": self.acquired,
+            "contended": self.contended,
+            "takeovers": self.takeovers,
+        }
+
+
+# Global lease helper
+generation_lease = GenerationLease()
@@ -143,6 +143,24 @@ class HabitService:
             logger.error(f"Traceback: {traceback.format_exc()}")
             raise
 
+    @staticmethod
+    def build_habit_context(preferences: dict) -> dict:
+        """
+        Build the LLM prompt context from a habit's preferences dict.
+        Shared by get_habit_context and callers that already hold the preferences,
+        so both produce identical prompts (and identical LLM cache keys).
+        """
+        preferences = preferences or {}
+        return {
+            "starting_idea": preferences.get("starting_idea", ""),
+            "identity": preferences.get("identity", ""),
+            "enjoyment": preferences.get("enjoyment", ""),
+            "starter_habit": preferences.get("starter_habit", ""),
+            "full_habit": preferences.get("full_habit", ""),
+            "habit_stack": preferences.get("habit_stack", ""),
+            "habit_environment": preferences.get("habit_environment", "")
+        }
+
     @staticmethod
     async def get_habit_context(
         db: AsyncIOMotorDatabase,
@@ -174,16 +192,7 @@ class HabitService:
                 )
                 return {}
             
-            preferences = habit.get("preferences", {})
-            context = {
-                "starting_idea": preferences.get("starting_idea", ""),
-                "identity": preferences.get("identity", ""),
-                "enjoyment": preferences.get("enjoyment", ""),
-                "starter_habit": preferences.get("starter_habit", ""),
-                "full_habit": preferences.get("full_habit", ""),
-                "habit_stack": preferences.get("habit_stack", ""),
-                "habit_environment": preferences.get("habit_environment", "")
-            }
+            context = HabitService.build_habit_context(habit.get("preferences", {}))
             logger.debug(f"Retrieved habit context - has starting_idea: {bool(context.get('starting_idea'))}")
             return context
         except Exception as e:
@@ -0,0 +1,429 @@
+"""
+Durable background jobs in MongoDB (jobs collection) and the worker pool that runs them.
+
+A job is one document: type, payload, dedupeKey, status (queued / running / done / dead),
+runAt, attempts and a lease. Enqueueing upserts on (dedupeKey, status=queued), so a job that
+is already waiting absorbs further triggers (debounced enqueues also push its runAt back); a
+unique partial index makes that race-free across workers. Workers claim the oldest due job
+with one find_one_and_update that sets a lease and a per-claim lease token; the runner renews
+the lease while its handler runs, and only the holder of the current token can complete or fail
+the job. A job whose lease expired (worker died or hung mid-job) is claimed again while it has
+attempts left, and dead-lettered otherwise. Failures are retried with exponential backoff and
+dead-lettered (status=dead, kept for inspection) after JOB_MAX_ATTEMPTS. Finished jobs are
+removed by a TTL index on expireAt.
+
+The pool runs in the API process (JOB_WORKERS_IN_PROCESS) or standalone via python -m app.workers;
+stop() drains in-flight jobs before returning.
+"""
+import asyncio
+import logging
+import os
+import random
+import socket
+import time
+import uuid
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Optional
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+JOB_COLLECTION = "jobs"
+
+STATUS_QUEUED = "queued"
+STATUS_RUNNING = "running"
+STATUS_DONE = "done"
+STATUS_DEAD = "dead"
+
+# Latency samples kept for the metrics endpoint
+_LATENCY_SAMPLES = 500
+
+JobHandler = Callable[[AsyncIOMotorDatabase, dict], Awaitable[None]]
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _aware(value: Optional[datetime]) -> Optional[datetime]:
+    """MongoDB may return naive datetimes (UTC)."""
+    if value is not None and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+def _latency_stats(samples: deque) -> dict:
+    ordered = sorted(samples)
+    return {
+        "count": len(ordered),
+        "avgMs": round(sum(ordered) / len(ordered), 1) if ordered else 0.0,
+        "p95Ms": round(ordered[int(0.95 * (len(ordered) - 1))], 1) if ordered else 0.0,
+        "maxMs": round(ordered[-1], 1) if ordered else 0.0,
+    }
+
+
+class JobQueue:
+    """Enqueue / claim / complete / fail on the jobs collection, plus handler registry."""
+
+    def __init__(self):
+        self._handlers: dict[str, JobHandler] = {}
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        # Wakes this process's idle workers when a job is enqueued here
+        self.wakeup = asyncio.Event()
+        self.enqueued = 0
+        self.deduped = 0
+        self.debounced = 0
+        self.completed = 0
+        self.retried = 0
+        self.dead = 0
+        self._wait_ms: deque = deque(maxlen=_LATENCY_SAMPLES)
+        self._run_ms: deque = deque(maxlen=_LATENCY_SAMPLES)
+
+    def register(self, job_type: str, handler: JobHandler) -> None:
+        """Handler for a job type: async (db, payload) -> None; raising means retry."""
+        self._handlers[job_type] = handler
+
+    def handler(self, job_type: str) -> Optional[JobHandler]:
+        return self._handlers.get(job_type)
+
+    async def enqueue(
+        self,
+        db: AsyncIOMotorDatabase,
+        job_type: str,
+        payload: dict,
+        dedupe_key: str,
+        delay_seconds: float = 0.0,
+        debounce: bool = False,
+    ) -> bool:
+        """
+        Queue a job to run after delay_seconds unless one with the same dedupe key is already
+        queued. With debounce, an already queued job is pushed back to now + delay_seconds, so a
+        burst of triggers runs the job once, delay_seconds after the last one.
+        Returns True if a new job was created, False if an existing queued job absorbed it.
+        """
+        now = _utcnow()
+        run_at = now + timedelta(seconds=delay_seconds)
+        on_insert = {"type": job_type, "payload": payload, "attempts": 0, "createdAt": now}
+        if debounce:
+            update = {"$set": {"runAt": run_at}, "$setOnInsert": on_insert}
+        else:
+            update = {"$setOnInsert": {**on_insert, "runAt": run_at}}
+        try:
+            result = await db[JOB_COLLECTION].update_one(
+                {"dedupeKey": dedupe_key, "status": STATUS_QUEUED},
+                update,
+                upsert=True,
+            )
+        except DuplicateKeyError:
+            # Concurrent enqueue of the same key won the insert
+            if debounce:
+                return await self.enqueue(db, job_type, payload, dedupe_key, delay_seconds, debounce)
+            result = None
+        if result is None or result.upserted_id is None:
+            self.deduped += 1
+            if debounce:
+                self.debounced += 1
+            return False
+        self.enqueued += 1
+        self.wakeup.set()
+        return True
+
+    async def enqueue_many(
+        self,
+        db: AsyncIOMotorDatabase,
+        job_type: str,
+        jobs: list[tuple[dict, str]],
+        delay_seconds: float = 0.0,
+    ) -> int:
+        """
+        Queue several (payload, dedupe key) jobs in one bulk write, with the same dedupe rule as
+        enqueue. Returns the number of new jobs created.
+        """
+        if not jobs:
+            return 0
+        now = _utcnow()
+        run_at = now + timedelta(seconds=delay_seconds)
+        requests = [
+            UpdateOne(
+                {"dedupeKey": dedupe_key, "status": STATUS_QUEUED},
+                {
+                    "$setOnInsert": {
+                        "type": job_type,
+                        "payload": payload,
+                        "attempts": 0,
+                        "runAt": run_at,
+                        "createdAt": now,
+                    }
+                },
+                upsert=True,
+            )
+            for payload, dedupe_key in jobs
+        ]
+        try:
+            result = await db[JOB_COLLECTION].bulk_write(requests, ordered=False)
+            created = result.upserted_count
+        except BulkWriteError as e:
+            # Duplicate key errors are concurrent enqueues of the same keys; anything else is real
+            if any(err.get("code") != 11000 for err in e.details.get("writeErrors", [])):
+                raise
+            created = e.details.get("nUpserted", 0)
+        self.enqueued += created
+        self.deduped += len(jobs) - created
+        if created:
+            self.wakeup.set()
+        return created
+
+    async def _dead_letter_expired(self, db: AsyncIOMotorDatabase, now: datetime) -> None:
+        """Dead-letter running jobs whose lease expired on their last attempt (they killed or hung their worker)."""
+        result = await db[JOB_COLLECTION].update_many(
+            {
+                "status": STATUS_RUNNING,
+                "leaseExpiresAt": {"$lte": now},
+                "attempts": {"$gte": settings.job_max_attempts},
+            },
+            {
+                "$set": {"status": STATUS_DEAD, "lastError": "lease expired", "finishedAt": now},
+                "$unset": {"leaseExpiresAt": "", "leaseToken": ""},
+            },
+        )
+        if result.modified_count:
+            self.dead += result.modified_count
+            logger.error(f"{result.modified_count} job(s) dead: lease expired on their last attempt")
+
+    async def claim(self, db: AsyncIOMotorDatabase) -> Optional[dict]:
+        """
+        Lease the oldest due job (or one whose previous lease expired, if it has attempts left).
+        None if nothing is due.
+        """
+        now = _utcnow()
+        await self._dead_letter_expired(db, now)
+        job = await db[JOB_COLLECTION].find_one_and_update(
+            {
+                "$or": [
+                    {"status": STATUS_QUEUED, "runAt": {"$lte": now}},
+                    {
+                        "status": STATUS_RUNNING,
+                        "leaseExpiresAt": {"$lte": now},
+                        "attempts": {"$lt": settings.job_max_attempts},
+                    },
+                ]
+            },
+            {
+                "$set": {
+                    "status": STATUS_RUNNING,
+                    "workerId": self.worker_id,
+                    "leaseToken": uuid.uuid4().hex,
+                    "startedAt": now,
+                    "leaseExpiresAt": now + timedelta(seconds=settings.job_lease_seconds),
+                },
+                "$inc": {"attempts": 1},
+            },
+            sort=[("runAt", 1)],
+            return_document=ReturnDocument.AFTER,
+        )
+        if job is not None:
+            run_at = _aware(job.get("runAt")) or now
+            self._wait_ms.append(max(0.0, (now - run_at).total_seconds() * 1000))
+        return job
+
+    async def renew(self, db: AsyncIOMotorDatabase, job: dict) -> bool:
+        """Extend the job's lease by JOB_LEASE_SECONDS; False if the claim is no longer ours."""
+        result = await db[JOB_COLLECTION].update_one(
+            {"_id": job["_id"], "leaseToken": job.get("leaseToken"), "status": STATUS_RUNNING},
+            {"$set": {"leaseExpiresAt": _utcnow() + timedelta(seconds=settings.job_lease_seconds)}},
+        )
+        return result.matched_count > 0
+
+    async def complete(self, db: AsyncIOMotorDatabase, job: dict, run_seconds: float) -> None:
+        now = _utcnow()
+        await db[JOB_COLLECTION].update_one(
+            {"_id": job["_id"], "leaseToken": job.get("leaseToken")},
+            {
+                "$set": {
+                    "status": STATUS_DONE,
+                    "finishedAt": now,
+                    "expireAt": now + timedelta(seconds=settings.job_retention_seconds),
+                },
+                "$unset": {"leaseExpiresAt": "", "leaseToken": ""},
+            },
+        )
+        self.completed += 1
+        self._run_ms.append(run_seconds * 1000)
+
+    async def fail(self, db: AsyncIOMotorDatabase, job: dict, error: str, run_seconds: float) -> None:
+        """Retry with exponential backoff, or dead-letter after the last attempt."""
+        now = _utcnow()
+        attempts = job.get("attempts", 1)
+        self._run_ms.append(run_seconds * 1000)
+        if attempts >= settings.job_max_attempts:
+            await db[JOB_COLLECTION].update_one(
+                {"_id": job["_id"], "leaseToken": job.get("leaseToken")},
+                {
+                    "$set": {"status": STATUS_DEAD, "lastError": error, "finishedAt": now},
+                    "$unset": {"leaseExpiresAt": "", "leaseToken": ""},
+                },
+            )
+            self.dead += 1
+            logger.error(f"Job {job['_id']} ({job.get('type')}) dead after {attempts} attempts: {error}")
+            return
+
+        backoff = min(settings.job_retry_max_seconds, settings.job_retry_base_seconds * 2 ** (attempts - 1))
+        backoff *= random.uniform(0.8, 1.2)
+        try:
+            await db[JOB_COLLECTION].update_one(
+                {"_id": job["_id"], "leaseToken": job.get("leaseToken")},
+                {
+                    "$set": {"status": STATUS_QUEUED, "runAt": now + timedelta(seconds=backoff), "lastError": error},
+                    "$unset": {"leaseExpiresAt": "", "leaseToken": ""},
+                },
+            )
+        except DuplicateKeyError:
+            # A newer job with the same dedupe key is already queued and will do the work
+            await db[JOB_COLLECTION].update_one(
+                {"_id": job["_id"], "leaseToken": job.get("leaseToken")},
+                {
+                    "$set": {
+                        "status": STATUS_DONE,
+                        "lastError": error,
+                        "finishedAt": now,
+                        "expireAt": now + timedelta(seconds=settings.job_retention_seconds),
+                    },
+                    "$unset": {"leaseExpiresAt": "", "leaseToken": ""},
+                },
+            )
+            return
+        self.retried += 1
+        logger.warning(f"Job {job['_id']} ({job.get('type')}) failed (attempt {attempts}), retrying in {backoff:.0f}s: {error}")
+
+    async def depth(self, db: AsyncIOMotorDatabase) -> dict:
+        """Job counts by status (queued includes jobs waiting for their retry/debounce time)."""
+        counts = {STATUS_QUEUED: 0, STATUS_RUNNING: 0, STATUS_DEAD: 0}
+        async for row in db[JOB_COLLECTION].aggregate([
+            {"$match": {"status": {"$in": list(counts)}}},
+            {"$group": {"_id": "$status", "n": {"$sum": 1}}},
+        ]):
+            counts[row["_id"]] = row["n"]
+        return counts
+
+    def snapshot(self) -> dict:
+        return {
+            "enqueued": self.enqueued,
+            "deduped": self.deduped,
+            "debounced": self.debounced,
+            "completed": self.completed,
+            "retried": self.retried,
+            "dead": self.dead,
+            "queueWaitMs": _latency_stats(self._wait_ms),
+            "runMs": _latency_stats(self._run_ms),
+        }
+
+
+class JobWorkerPool:
+    """N worker tasks claiming and running jobs; stop() drains in-flight jobs."""
+
+    def __init__(self, queue: JobQueue):
+        self.queue = queue
+        self._tasks: list[asyncio.Task] = []
+        self._stopping = False
+        self.in_flight = 0
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    def start(self, get_db, concurrency: int) -> None:
+        """Start the worker tasks. get_db returns the Motor database."""
+        if self._tasks:
+            return
+        self._stopping = False
+        self._tasks = [asyncio.create_task(self._worker(get_db, i)) for i in range(max(1, concurrency))]
+        logger.info(f"Job worker pool started ({len(self._tasks)} workers, id={self.queue.worker_id})")
+
+    async def _worker(self, get_db, index: int) -> None:
+        while not self._stopping:
+            try:
+                db = get_db()
+                job = await self.queue.claim(db)
+            except Exception as e:
+                logger.warning(f"Job worker {index}: claim failed: {e}")
+                job = None
+            if job is None:
+                # Idle: sleep until the poll interval passes or a local enqueue wakes us
+                self.queue.wakeup.clear()
+                try:
+                    await asyncio.wait_for(self.queue.wakeup.wait(), timeout=settings.job_poll_interval_seconds)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._run(db, job)
+
+    async def _renew_lease(self, db: AsyncIOMotorDatabase, job: dict) -> None:
+        """Keep a running job's lease alive (every third of JOB_LEASE_SECONDS) until cancelled."""
+        while True:
+            await asyncio.sleep(settings.job_lease_seconds / 3)
+            try:
+                if not await self.queue.renew(db, job):
+                    logger.warning(f"Lost the lease of job {job['_id']} ({job.get('type')}); its result will not be recorded")
+                    return
+            except Exception as e:
+                logger.warning(f"Could not renew the lease of job {job['_id']}: {e}")
+
+    async def _run(self, db: AsyncIOMotorDatabase, job: dict) -> None:
+        handler = self.queue.handler(job.get("type"))
+        self.in_flight += 1
+        started = time.monotonic()
+        renewer = asyncio.create_task(self._renew_lease(db, job))
+        try:
+            if handler is None:
+                raise ValueError(f"No handler for job type {job.get('type')!r}")
+            try:
+                await handler(db, job.get("payload") or {})
+            finally:
+                # Before complete/fail, which end the lease
+                renewer.cancel()
+        except asyncio.CancelledError:
+            # Drain timed out: the lease expires and another worker picks the job up again
+            raise
+        except Exception as e:
+            try:
+                await self.queue.fail(db, job, str(e) or type(e).__name__, time.monotonic() - started)
+            except Exception as db_err:
+                logger.warning(f"Could not record failure of job {job['_id']}: {db_err}")
+        else:
+            try:
+                await self.queue.complete(db, job, time.monotonic() - started)
+            except Exception as db_err:
+                logger.warning(f"Could not mark job {job['_id']} done: {db_err}")
+        finally:
+            renewer.cancel()
+            self.in_flight -= 1
+
+    async def stop(self, timeout: Optional[float] = None) -> None:
+        """Stop claiming, wait up to timeout (JOB_DRAIN_TIMEOUT_SECONDS) for in-flight jobs, then cancel."""
+        if not self._tasks:
+            return
+        self._stopping = True
+        self.queue.wakeup.set()
+        timeout = settings.job_drain_timeout_seconds if timeout is None else timeout
+        done, pending = await asyncio.wait(self._tasks, timeout=timeout)
+        for task in pending:
+            task.cancel()
+        if pending:
+            logger.warning(f"Job worker pool: cancelled {len(pending)} worker(s) still running after {timeout:.0f}s")
+            await asyncio.gather(*pending, return_exceptions=True)
+        self._tasks = []
+        logger.info("Job worker pool stopped")
+
+    def snapshot(self) -> dict:
+        return {"workers": len(self._tasks), "inFlight": self.in_flight}
+
+
+# Global queue and this process's worker pool
+job_queue = JobQueue()
+job_worker_pool = JobWorkerPool(job_queue)
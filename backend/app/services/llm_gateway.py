@@ -0,0 +1,225 @@
+"""
+LLM gateway: admission control in front of the LLM provider.
+
+Every provider call takes a slot from the gateway first. The gateway enforces:
+- a max-in-flight cap (concurrent HTTP calls to the provider)
+- requests/minute and tokens/minute token buckets (0 disables a bucket)
+- strict priority between classes: queued "interactive" calls (user is waiting) are always
+  admitted before queued "background" calls (prefetch, cache warming, speculative generation)
+
+It also keeps queue-depth and wait-time metrics for the /metrics endpoint.
+Single event loop only (one gateway per worker process).
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_INTERACTIVE = "interactive"
+PRIORITY_BACKGROUND = "background"
+# Lower value is admitted first
+PRIORITY_ORDER = {PRIORITY_INTERACTIVE: 0, PRIORITY_BACKGROUND: 1}
+
+# How many recent wait times to keep per priority for percentiles
+_WAIT_SAMPLES = 500
+
+
+class TokenBucket:
+    """Classic token bucket refilled continuously at rate_per_minute, capacity = one minute of rate."""
+
+    def __init__(self, rate_per_minute: int):
+        self.rate_per_minute = rate_per_minute
+        self.capacity = float(rate_per_minute)
+        self.tokens = float(rate_per_minute)
+        self._last = time.monotonic()
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate_per_minute > 0
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._last) * self.rate_per_minute / 60.0)
+        self._last = now
+
+    def seconds_until(self, amount: float) -> float:
+        """Seconds until `amount` tokens are available (0 if available now)."""
+        if not self.enabled:
+            return 0.0
+        self._refill()
+        amount = min(amount, self.capacity)  # a single huge request must still be admissible
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) * 60.0 / self.rate_per_minute
+
+    def consume(self, amount: float) -> None:
+        if self.enabled:
+            self._refill()
+            self.tokens -= min(amount, self.capacity)
+
+    def refund(self, amount: float) -> None:
+        if self.enabled and amount > 0:
+            self._refill()
+            self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class GatewayTicket:
+    """Handle for an admitted call; set actual_tokens so unused estimate is refunded on release."""
+
+    def __init__(self, priority: str, estimated_tokens: int, waited_seconds: float):
+        self.priority = priority
+        self.estimated_tokens = estimated_tokens
+        self.waited_seconds = waited_seconds
+        self.actual_tokens: Optional[int] = None
+
+
+class LLMGateway:
+    """Priority admission queue with concurrency cap and rate limits."""
+
+    def __init__(
+        self,
+        max_in_flight: int,
+        requests_per_minute: int = 0,
+        tokens_per_minute: int = 0,
+        queue_timeout_seconds: float = 60.0,
+    ):
+        self.max_in_flight = max(1, max_in_flight)
+        self.request_bucket = TokenBucket(requests_per_minute)
+        self.token_bucket = TokenBucket(tokens_per_minute)
+        self.queue_timeout_seconds = queue_timeout_seconds
+        self.in_flight = 0
+        # heap of (priority order, seq, future, estimated tokens)
+        self._queue: list = []
+        self._seq = itertools.count()
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._queued_by_priority = {p: 0 for p in PRIORITY_ORDER}
+        self._admitted_by_priority = {p: 0 for p in PRIORITY_ORDER}
+        self._timeouts_by_priority = {p: 0 for p in PRIORITY_ORDER}
+        self._waits = {p: deque(maxlen=_WAIT_SAMPLES) for p in PRIORITY_ORDER}
+        self._max_queue_depth = 0
+
+    async def acquire(self, priority: str = PRIORITY_INTERACTIVE, estimated_tokens: int = 0) -> GatewayTicket:
+        """Wait for admission. Raises ValueError if the queue wait exceeds queue_timeout_seconds."""
+        if priority not in PRIORITY_ORDER:
+            priority = PRIORITY_INTERACTIVE
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        started = time.monotonic()
+        heapq.heappush(self._queue, (PRIORITY_ORDER[priority], next(self._seq), future, estimated_tokens, priority))
+        self._queued_by_priority[priority] += 1
+        self._max_queue_depth = max(self._max_queue_depth, len(self._queue))
+        self._dispatch()
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout=self.queue_timeout_seconds or None)
+        except asyncio.TimeoutError:
+            if future.done() and not future.cancelled():
+                # Admitted just as the timeout fired; keep the slot
+                pass
+            else:
+                future.cancel()
+                self._timeouts_by_priority[priority] += 1
+                self._dispatch()
+                logger.warning(f"LLM gateway queue timeout after {self.queue_timeout_seconds}s (priority={priority})")
+                raise ValueError("LLM gateway busy: queue wait timed out")
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self._release_slot()
+            else:
+                future.cancel()
+            self._dispatch()
+            raise
+        waited = time.monotonic() - started
+        self._waits[priority].append(waited)
+        self._admitted_by_priority[priority] += 1
+        return GatewayTicket(priority, estimated_tokens, waited)
+
+    def release(self, ticket: GatewayTicket) -> None:
+        """Return the slot; refund unused token estimate when actual usage is known."""
+        if ticket.actual_tokens is not None:
+            self.token_bucket.refund(ticket.estimated_tokens - ticket.actual_tokens)
+        self._release_slot()
+        self._dispatch()
+
+    def _release_slot(self) -> None:
+        self.in_flight = max(0, self.in_flight - 1)
+
+    @asynccontextmanager
+    async def slot(self, priority: str = PRIORITY_INTERACTIVE, estimated_tokens: int = 0):
+        """`async with llm_gateway.slot(...) as ticket:` around one provider call."""
+        ticket = await self.acquire(priority, estimated_tokens)
+        try:
+            yield ticket
+        finally:
+            self.release(ticket)
+
+    def _dispatch(self) -> None:
+        """Admit queued calls in priority order while capacity and rate budget allow."""
+        while self._queue and self.in_flight < self.max_in_flight:
+            _, _, future, tokens, priority = self._queue[0]
+            if future.done():  # cancelled / timed out waiter
+                heapq.heappop(self._queue)
+                self._queued_by_priority[priority] -= 1
+                continue
+            wait = max(self.request_bucket.seconds_until(1), self.token_bucket.seconds_until(tokens))
+            if wait > 0:
+                self._schedule_retry(wait)
+                return
+            heapq.heappop(self._queue)
+            self._queued_by_priority[priority] -= 1
+            self.request_bucket.consume(1)
+            self.token_bucket.consume(tokens)
+            self.in_flight += 1
+            future.set_result(True)
+
+    def _schedule_retry(self, delay: float) -> None:
+        if self._timer is not None and not self._timer.cancelled():
+            return
+        loop = asyncio.get_running_loop()
+
+        def _fire():
+            self._timer = None
+            self._dispatch()
+
+        self._timer = loop.call_later(delay, _fire)
+
+    def snapshot(self) -> dict:
+        """Queue depth, in-flight count, rate budget and wait-time stats for the metrics endpoint."""
+        waits = {}
+        for p, samples in self._waits.items():
+            ordered = sorted(samples)
+            waits[p] = {
+                "admitted": self._admitted_by_priority[p],
+                "timeouts": self._timeouts_by_priority[p],
+                "queued": self._queued_by_priority[p],
+                "waitAvgMs": round(1000 * sum(ordered) / len(ordered), 1) if ordered else 0.0,
+                "waitP95Ms": round(1000 * ordered[int(0.95 * (len(ordered) - 1))], 1) if ordered else 0.0,
+                "waitMaxMs": round(1000 * ordered[-1], 1) if ordered else 0.0,
+            }
+        return {
+            "inFlight": self.in_flight,
+            "maxInFlight": self.max_in_flight,
+            "queueDepth": len(self._queue),
+            "maxQueueDepth": self._max_queue_depth,
+            "requestsPerMinute": self.request_bucket.rate_per_minute,
+            "tokensPerMinute": self.token_bucket.rate_per_minute,
+            "requestTokensAvailable": round(self.request_bucket.tokens, 1) if self.request_bucket.enabled else None,
+            "tokenBudgetAvailable": round(self.token_bucket.tokens, 1) if self.token_bucket.enabled else None,
+            "priorities": waits,
+        }
+
+
+# Global gateway instance (one per worker process)
+llm_gateway = LLMGateway(
+    max_in_flight=settings.llm_max_in_flight,
+    requests_per_minute=settings.llm_requests_per_minute,
+    tokens_per_minute=settings.llm_tokens_per_minute,
+    queue_timeout_seconds=settings.llm_queue_timeout_seconds,
+)
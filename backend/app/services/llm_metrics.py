@@ -0,0 +1,248 @@
+"""
+Per-prompt LLM accounting: calls, errors, cache hits, prompt/completion tokens (including prompt
+tokens served from the provider's prompt cache), cost, wall time and time-to-first-byte, keyed by
+prompt name (the PROMPT_NAMES keys in prompt_registry.py).
+
+Counters and latency histograms live in memory for /api/v1/metrics/llm. The same increments are
+also buffered per (UTC day, prompt) and periodically folded into the llm_usage_daily collection
+with $inc upserts, so spend and latency can be compared across days and workers.
+"""
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Optional
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Collection with one document per (UTC day, prompt name)
+USAGE_COLLECTION = "llm_usage_daily"
+
+# Histogram bucket upper bounds in milliseconds (last bucket is +Inf)
+LATENCY_BUCKETS_MS = (100, 250, 500, 1000, 2500, 5000, 10000, 20000, 30000, 60000)
+
+UNNAMED_PROMPT = "unnamed"
+
+
+def _bucket_label(ms: float) -> str:
+    for bound in LATENCY_BUCKETS_MS:
+        if ms <= bound:
+            return f"le{bound}"
+    return "inf"
+
+
+class _Histogram:
+    """Fixed-bucket latency histogram (milliseconds)."""
+
+    def __init__(self):
+        self.buckets: dict[str, int] = {}
+        self.count = 0
+        self.total_ms = 0.0
+
+    def observe(self, ms: float) -> str:
+        label = _bucket_label(ms)
+        self.buckets[label] = self.buckets.get(label, 0) + 1
+        self.count += 1
+        self.total_ms += ms
+        return label
+
+    def quantile(self, q: float) -> Optional[int]:
+        """Upper bound of the bucket containing the q-quantile (None when empty or in +Inf)."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound in LATENCY_BUCKETS_MS:
+            seen += self.buckets.get(f"le{bound}", 0)
+            if seen >= rank:
+                return bound
+        return None
+
+    def snapshot(self) -> dict:
+        return {
+            "count": self.count,
+            "avgMs": round(self.total_ms / self.count, 1) if self.count else None,
+            "p50Ms": self.quantile(0.5),
+            "p95Ms": self.quantile(0.95),
+            "buckets": dict(self.buckets),
+        }
+
+
+class _PromptUsage:
+    """Running totals of one prompt name."""
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.cache_hits = 0
+        self.prompt_tokens = 0
+        self.cached_prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cost_usd = 0.0
+        self.wall = _Histogram()
+        self.ttfb = _Histogram()
+
+    def snapshot(self) -> dict:
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "cacheHits": self.cache_hits,
+            "promptTokens": self.prompt_tokens,
+            "cachedPromptTokens": self.cached_prompt_tokens,
+            "cachedPromptRatio": (
+                round(self.cached_prompt_tokens / self.prompt_tokens, 3) if self.prompt_tokens else None
+            ),
+            "completionTokens": self.completion_tokens,
+            "costUsd": round(self.cost_usd, 6),
+            "wallMs": self.wall.snapshot(),
+            "ttfbMs": self.ttfb.snapshot(),
+        }
+
+
+def _usage_cost(usage: dict) -> float:
+    """Cost of one response: provider-reported usage.cost (OpenRouter), else configured prices."""
+    reported = usage.get("cost")
+    if isinstance(reported, (int, float)):
+        return float(reported)
+    prompt_tokens = usage.get("prompt_tokens") or 0
+    cached_tokens = (usage.get("prompt_tokens_details") or {}).get("cached_tokens") or 0
+    input_price = settings.llm_price_input_per_million
+    cached_price = input_price * settings.llm_price_cached_input_ratio
+    return (
+        (prompt_tokens - cached_tokens) * input_price
+        + cached_tokens * cached_price
+        + (usage.get("completion_tokens") or 0) * settings.llm_price_output_per_million
+    ) / 1_000_000
+
+
+class LLMUsageMetrics:
+    """In-memory per-prompt counters plus a buffered daily rollup to MongoDB."""
+
+    def __init__(self):
+        self._prompts: dict[str, _PromptUsage] = {}
+        # (YYYY-MM-DD, prompt name) -> {field: increment} not yet written to Mongo
+        self._pending: dict[tuple[str, str], dict[str, float]] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+
+    def _get(self, prompt_name: Optional[str]) -> _PromptUsage:
+        name = prompt_name or UNNAMED_PROMPT
+        usage = self._prompts.get(name)
+        if usage is None:
+            usage = _PromptUsage()
+            self._prompts[name] = usage
+        return usage
+
+    def _inc(self, prompt_name: Optional[str], **fields: float) -> None:
+        if not settings.llm_usage_rollup_enabled:
+            return
+        day = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+        pending = self._pending.setdefault((day, prompt_name or UNNAMED_PROMPT), {})
+        for field, value in fields.items():
+            pending[field] = pending.get(field, 0) + value
+
+    def record_cache_hit(self, prompt_name: Optional[str]) -> None:
+        self._get(prompt_name).cache_hits += 1
+        self._inc(prompt_name, cacheHits=1)
+
+    def record_usage(self, prompt_name: Optional[str], usage: Optional[dict]) -> None:
+        """Tokens and cost of one provider response (every attempt is billed)."""
+        if not usage:
+            return
+        stats = self._get(prompt_name)
+        prompt_tokens = usage.get("prompt_tokens") or 0
+        completion_tokens = usage.get("completion_tokens") or 0
+        # Prefix served from the provider's prompt cache (OpenAI-style usage.prompt_tokens_details)
+        cached_tokens = (usage.get("prompt_tokens_details") or {}).get("cached_tokens") or 0
+        cost = _usage_cost(usage)
+        stats.prompt_tokens += prompt_tokens
+        stats.cached_prompt_tokens += cached_tokens
+        stats.completion_tokens += completion_tokens
+        stats.cost_usd += cost
+        self._inc(
+            prompt_name,
+            promptTokens=prompt_tokens,
+            cachedPromptTokens=cached_tokens,
+            completionTokens=completion_tokens,
+            costUsd=cost,
+        )
+
+    def record_ttfb(self, prompt_name: Optional[str], seconds: float) -> None:
+        """Time until the provider's response headers arrived (one HTTP attempt)."""
+        label = self._get(prompt_name).ttfb.observe(seconds * 1000)
+        self._inc(prompt_name, **{"ttfbMsSum": seconds * 1000, "ttfbCount": 1, f"ttfbBuckets.{label}": 1})
+
+    def record_call(self, prompt_name: Optional[str], seconds: float, ok: bool) -> None:
+        """One logical generate_text call (including retries/failover), successful or not."""
+        stats = self._get(prompt_name)
+        stats.calls += 1
+        if not ok:
+            stats.errors += 1
+        label = stats.wall.observe(seconds * 1000)
+        self._inc(
+            prompt_name,
+            **{"calls": 1, "errors": 0 if ok else 1, "wallMsSum": seconds * 1000, f"wallBuckets.{label}": 1},
+        )
+
+    def snapshot(self) -> dict:
+        return {name: usage.snapshot() for name, usage in sorted(self._prompts.items())}
+
+    async def flush(self, db: AsyncIOMotorDatabase) -> int:
+        """Fold buffered increments into llm_usage_daily. Returns documents written."""
+        pending, self._pending = self._pending, {}
+        written = 0
+        for (day, prompt_name), fields in pending.items():
+            try:
+                await db[USAGE_COLLECTION].update_one(
+                    {"_id": f"{day}:{prompt_name}"},
+                    {
+                        "$inc": fields,
+                        "$set": {"updatedAt": datetime.now(timezone.utc)},
+                        "$setOnInsert": {"date": day, "promptName": prompt_name},
+                    },
+                    upsert=True,
+                )
+                written += 1
+            except Exception as e:
+                # Keep the increments for the next flush
+                logger.warning(f"LLM usage rollup write failed for {day}/{prompt_name}: {e}")
+                merged = self._pending.setdefault((day, prompt_name), {})
+                for field, value in fields.items():
+                    merged[field] = merged.get(field, 0) + value
+        return written
+
+    def start_flusher(self, get_db) -> None:
+        """Start the periodic rollup task (app startup). get_db returns the Motor database."""
+        if not settings.llm_usage_rollup_enabled or self._flush_task is not None:
+            return
+
+        async def _loop():
+            while True:
+                await asyncio.sleep(settings.llm_usage_flush_interval_seconds)
+                try:
+                    await self.flush(get_db())
+                except Exception as e:
+                    logger.warning(f"LLM usage rollup flush failed: {e}")
+
+        self._flush_task = asyncio.create_task(_loop())
+
+    async def stop_flusher(self, get_db) -> None:
+        """Stop the periodic task and write what is still buffered (app shutdown)."""
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+        if self._pending:
+            try:
+                await self.flush(get_db())
+            except Exception as e:
+                logger.warning(f"Final LLM usage rollup flush failed: {e}")
+
+
+# Global per-prompt LLM metrics
+llm_usage_metrics = LLMUsageMetrics()
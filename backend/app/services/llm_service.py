@@ -1,30 +1,31 @@
 """
 LLM service for interacting with language models.
 """
+import asyncio
 import logging
+import random
 import traceback
 import httpx
 import time
-from typing import Optional, List
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Optional, List, Type
+from pydantic import BaseModel, ValidationError
 from app.core.config import settings
+from app.utils.json_parsing import parse_json_object
+from app.utils.prompt_registry import estimate_tokens, prompt_registry
+from app.utils.ttl_cache import TTLCache
+from app.services.llm_gateway import llm_gateway, PRIORITY_INTERACTIVE
+from app.services.circuit_breaker import llm_circuit_breaker
+from app.services.llm_trace import llm_trace
+from app.services.llm_metrics import llm_usage_metrics
+from app.services.token_budget import token_budget_tracker
+import hashlib
 import json
 import os
 
-DEBUG_LOG_PATH = "/Users/gman/Documents/code/chlapp/.cursor/debug.log"
-# Fallback if .cursor not writable (e.g. server process)
-_DEBUG_LOG_FALLBACK = os.path.join(os.path.dirname(__file__), "..", "..", "debug_llm.ndjson")
-
-
-def _debug_log(location: str, message: str, data: dict, hypothesis_id: str) -> None:
-    payload = json.dumps({"id": f"llm_{int(time.time()*1000)}", "timestamp": int(time.time() * 1000), "location": location, "message": message, "data": data, "hypothesisId": hypothesis_id}) + "\n"
-    for path in (DEBUG_LOG_PATH, _DEBUG_LOG_FALLBACK):
-        try:
-            with open(path, "a") as f:
-                f.write(payload)
-            break
-        except Exception:
-            continue
-
 logger = logging.getLogger(__name__)
 
 
@@ -92,6 +93,99 @@ _configure_opik()
 _track = _get_track_decorator()
 
 
+@dataclass
+class LLMProvider:
+    """One OpenAI-compatible chat completions endpoint + model."""
+    name: str
+    base_url: str
+    api_key: str
+    model: str
+    supports_json_schema: bool = True  # response_format json_schema; switched off if the provider rejects it
+
+    @property
+    def is_openrouter(self) -> bool:
+        return "openrouter.ai" in self.base_url.lower()
+
+
+@dataclass
+class CompletionRequest:
+    """Parameters of one logical chat completion (shared by every retry/hedge/failover attempt)."""
+    prompt: str
+    temperature: Optional[float]
+    max_tokens: int
+    priority: str = PRIORITY_INTERACTIVE
+    # OpenAI-style JSON schema response_format; dropped for providers without structured output
+    json_schema: Optional[dict] = None
+    trace_id: Optional[str] = None  # set when this call is sampled by the LLM trace sink
+    prompt_name: Optional[str] = None  # key in prompt_registry.PROMPT_NAMES, for per-prompt stats
+    # Provider time of the attempt that succeeded (set by _post_once; excludes gateway queueing
+    # and retry backoff), reported to the circuit breaker
+    provider_seconds: Optional[float] = None
+
+
+class LLMProviderError(Exception):
+    """A provider call failed; retryable tells the retry loop whether another attempt may succeed."""
+
+    def __init__(self, message: str, retryable: bool, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retryable = retryable
+        self.retry_after = retry_after
+
+
+def _load_providers() -> List[LLMProvider]:
+    """Primary provider from LLM_* settings, then failover providers from LLM_FALLBACK_PROVIDERS (JSON list)."""
+    base_url = settings.llm_api_base_url or "https://api.openai.com/v1"
+    providers = []
+    if settings.llm_api_key:
+        providers.append(LLMProvider(
+            "primary", base_url, settings.llm_api_key, settings.llm_model,
+            supports_json_schema=settings.llm_structured_output,
+        ))
+    if settings.llm_fallback_providers:
+        try:
+            for i, entry in enumerate(json.loads(settings.llm_fallback_providers)):
+                api_key = entry.get("api_key") or settings.llm_api_key
+                if not api_key or not entry.get("model"):
+                    logger.warning("Skipping LLM fallback provider %d: missing api_key or model", i)
+                    continue
+                providers.append(LLMProvider(
+                    name=entry.get("name") or f"fallback{i + 1}",
+                    base_url=(entry.get("base_url") or base_url).rstrip("/"),
+                    api_key=api_key,
+                    model=entry["model"],
+                    supports_json_schema=bool(entry.get("json_schema", settings.llm_structured_output)),
+                ))
+        except (ValueError, TypeError, AttributeError) as e:
+            logger.warning("Invalid LLM_FALLBACK_PROVIDERS (expected JSON list of objects): %s", e)
+    return providers
+
+
+def _parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Retry-After header as seconds (delta-seconds or HTTP-date form)."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+        if when.tzinfo is None:
+            when = when.replace(tzinfo=timezone.utc)
+        return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+def _rejects_structured_output(body: str) -> bool:
+    """
+    A 400 body is about JSON-schema mode itself (e.g. "unsupported parameter: response_format"),
+    not about the prompt, max tokens or messages, which would fail without it too.
+    """
+    body = body.lower()
+    return "response_format" in body or "json_schema" in body
+
+
 class LLMService:
     """Service for interacting with LLM APIs."""
     
@@ -102,13 +196,271 @@ class LLMService:
         self.temperature = settings.llm_temperature
         self.max_tokens = settings.llm_max_tokens
         self.is_openrouter = "openrouter.ai" in self.base_url.lower()
+        # Ordered failover list; the first entry is the primary (LLM_* settings)
+        self.providers = _load_providers()
+        # Recent successful call latencies (seconds) of the primary provider, for the hedging p95
+        self._latencies: deque = deque(maxlen=200)
+        self._client: Optional[httpx.AsyncClient] = None
+        # Responses keyed by (model, prompt, sampling params); only read/written when use_cache=True
+        self.response_cache = TTLCache(
+            max_entries=settings.llm_cache_max_entries,
+            ttl_seconds=settings.llm_cache_ttl_seconds,
+        )
+
+    def _get_client(self) -> httpx.AsyncClient:
+        """Shared HTTP client so provider connections (TLS) are reused across calls."""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(timeout=settings.llm_request_timeout_seconds)
+        return self._client
+
+    async def close(self) -> None:
+        """Close the shared HTTP client (app shutdown)."""
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+        self._client = None
+
+    def _cache_key(
+        self,
+        prompt: str,
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+    ) -> str:
+        """Cache key for a prompt, resolving defaults the same way generate_text does."""
+        temperature = temperature or self.temperature
+        max_tokens = max_tokens or self.max_tokens
+        raw = f"{self.model}|{temperature}|{max_tokens}|{prompt}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def store_cached_text(
+        self,
+        prompt: str,
+        text: str,
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+    ) -> None:
+        """Put a generated response in the cache so a later generate_text(use_cache=True) is instant."""
+        if text:
+            self.response_cache.set(self._cache_key(prompt, temperature, max_tokens), text)
+
+    def _build_request(
+        self,
+        provider: LLMProvider,
+        request: CompletionRequest,
+    ) -> tuple[dict, dict]:
+        """Headers and JSON payload for one chat completions call to `provider`."""
+        headers = {
+            "Authorization": f"Bearer {provider.api_key}",
+            "Content-Type": "application/json"
+        }
+
+        # OpenRouter recommends these optional attribution headers.
+        if provider.is_openrouter:
+            if settings.openrouter_site_url:
+                headers["HTTP-Referer"] = settings.openrouter_site_url
+            if settings.openrouter_app_name:
+                headers["X-Title"] = settings.openrouter_app_name
+
+        prompt, temperature, max_tokens = request.prompt, request.temperature, request.max_tokens
+        payload = {
+            "model": provider.model,
+            "messages": [
+                {
+                    "role": "user",
+                    "content": prompt
+                }
+            ],
+        }
+        # OpenRouter/provider routing is most compatible with max_tokens.
+        # Keep max_completion_tokens for non-OpenRouter setups that rely on it.
+        if provider.is_openrouter:
+            payload["max_tokens"] = max_tokens
+        else:
+            payload["max_completion_tokens"] = max_tokens
+        # Some models only support the default temperature (1). Omit when not 1 so the API uses default.
+        if temperature is not None and abs(temperature - 1.0) < 0.001:
+            payload["temperature"] = 1.0
+        if request.json_schema and provider.supports_json_schema:
+            payload["response_format"] = {"type": "json_schema", "json_schema": request.json_schema}
+        return headers, payload
+
+    async def _post_once(self, provider: LLMProvider, request: CompletionRequest) -> dict:
+        """One HTTP attempt (holding a gateway slot). Raises LLMProviderError on failure."""
+        headers, payload = self._build_request(provider, request)
+
+        llm_trace.emit(request.trace_id, "request", {
+            "provider": provider.name,
+            "model": provider.model,
+            "token_key": "max_tokens" if provider.is_openrouter else "max_completion_tokens",
+            "max_tokens": request.max_tokens,
+            "payload_keys": list(payload.keys()),
+            "priority": request.priority,
+            "prompt_name": request.prompt_name,
+            "prompt_version": prompt_registry.version(request.prompt_name),
+            "prompt": llm_trace.text_field(request.prompt),
+        })
+
+        async with llm_gateway.slot(request.priority, estimate_tokens(request.prompt) + request.max_tokens) as ticket:
+            started = time.monotonic()
+            try:
+                client = self._get_client()
+                response = await client.send(
+                    client.build_request(
+                        "POST", f"{provider.base_url}/chat/completions", headers=headers, json=payload
+                    ),
+                    stream=True,
+                )
+                # Headers are in: time to first byte of this attempt
+                llm_usage_metrics.record_ttfb(request.prompt_name, time.monotonic() - started)
+                try:
+                    await response.aread()
+                finally:
+                    await response.aclose()
+                response.raise_for_status()
+                data = response.json()
+            except httpx.HTTPStatusError as e:
+                code = e.response.status_code
+                if code == 400 and "response_format" in payload and _rejects_structured_output(e.response.text):
+                    # Model/provider rejects JSON-schema mode: remember and retry right away without it
+                    logger.warning(f"LLM provider {provider.name} rejected response_format; disabling structured output")
+                    provider.supports_json_schema = False
+                    raise LLMProviderError(f"LLM API error: {code} - {e.response.text}", retryable=True, retry_after=0) from e
+                print(f"[LLM] HTTP error provider={provider.name} status={code} body={e.response.text[:200]}")
+                logger.error(
+                    f"LLM API HTTP error - provider: {provider.name}, status: {code}, "
+                    f"response: {e.response.text}"
+                )
+                raise LLMProviderError(
+                    f"LLM API error: {code} - {e.response.text}",
+                    retryable=code == 429 or code >= 500,
+                    retry_after=_parse_retry_after(e.response.headers.get("Retry-After")),
+                ) from e
+            except httpx.TimeoutException as e:
+                print(f"[LLM] Timeout provider={provider.name}: {e}")
+                logger.error(f"LLM API timeout error - provider: {provider.name}: {str(e)}")
+                raise LLMProviderError(f"LLM API timeout: {str(e)}", retryable=True) from e
+            except httpx.TransportError as e:
+                logger.error(f"LLM API connection error - provider: {provider.name}: {str(e)}")
+                raise LLMProviderError(f"Error calling LLM API: {str(e)}", retryable=True) from e
+            except ValueError as e:
+                # Response body was not JSON
+                raise LLMProviderError(f"Error calling LLM API: invalid JSON body ({e})", retryable=True) from e
+            ticket.actual_tokens = (data.get("usage") or {}).get("total_tokens")
+            request.provider_seconds = time.monotonic() - started
+            if provider is self.providers[0]:
+                self._latencies.append(request.provider_seconds)
+            return data
+
+    async def _post_with_retries(self, provider: LLMProvider, request: CompletionRequest) -> dict:
+        """Call one provider, retrying 429/5xx/timeouts with exponential backoff + full jitter."""
+        attempts = max(1, settings.llm_max_retries + 1)
+        for attempt in range(attempts):
+            try:
+                return await self._post_once(provider, request)
+            except LLMProviderError as e:
+                if not e.retryable or attempt == attempts - 1:
+                    raise
+                backoff = min(
+                    settings.llm_retry_max_delay_seconds,
+                    settings.llm_retry_base_delay_seconds * (2 ** attempt),
+                )
+                delay = random.uniform(0, backoff)
+                if e.retry_after is not None:
+                    delay = max(delay, e.retry_after)
+                if delay > settings.llm_retry_max_delay_seconds:
+                    # Provider asks us to wait longer than we are willing to: fail over instead
+                    raise
+                logger.warning(
+                    f"LLM call to {provider.name} failed ({e}); retry {attempt + 1}/{attempts - 1} in {delay:.2f}s"
+                )
+                await asyncio.sleep(delay)
+        raise LLMProviderError("LLM retries exhausted", retryable=False)  # pragma: no cover
+
+    def _hedge_delay(self) -> Optional[float]:
+        """p95 of recent primary latencies, or None when hedging is off / not enough samples."""
+        if not settings.llm_hedge_enabled or len(self.providers) < 2:
+            return None
+        if len(self._latencies) < settings.llm_hedge_min_samples:
+            return None
+        ordered = sorted(self._latencies)
+        return ordered[int(0.95 * (len(ordered) - 1))]
+
+    async def _hedged(self, request: CompletionRequest, hedge_after: float) -> dict:
+        """Primary call; if still running after hedge_after seconds, race a duplicate on the second provider."""
+        primary = asyncio.create_task(
+            self._post_with_retries(self.providers[0], request)
+        )
+        tasks = {primary}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=hedge_after)
+            if not done or primary.exception() is not None:
+                # Slow primary: hedge. Failed primary: plain failover to the second provider.
+                logger.info(f"LLM primary slow (>{hedge_after:.2f}s) or failed; racing {self.providers[1].name}")
+                tasks.add(asyncio.create_task(
+                    self._post_with_retries(self.providers[1], request)
+                ))
+            last_error: Optional[BaseException] = None
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    last_error = task.exception()
+            raise last_error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _complete(self, request: CompletionRequest) -> dict:
+        """Chat completion with retries, optional hedging, and failover down the provider list."""
+        remaining = list(self.providers)
+        last_error: Optional[Exception] = None
+        hedge_after = self._hedge_delay()
+        if hedge_after is not None:
+            try:
+                return await self._hedged(request, hedge_after)
+            except LLMProviderError as e:
+                last_error = e
+                remaining = remaining[2:]
+        for provider in remaining:
+            try:
+                return await self._post_with_retries(provider, request)
+            except LLMProviderError as e:
+                last_error = e
+                if provider is not remaining[-1]:
+                    logger.warning(f"LLM provider {provider.name} failed ({e}); failing over")
+        raise Exception(str(last_error) if last_error else "No LLM provider configured")
+
+    async def _complete_guarded(self, request: CompletionRequest) -> dict:
+        """
+        _complete behind the circuit breaker, recording the outcome. A success is judged by the
+        provider time of the attempt that returned, not the wall time of the call: waits for a
+        gateway slot and retry backoff are local and say nothing about provider health.
+        """
+        # Open circuit: fail fast with CircuitOpenError (ValueError) so routes use their fallbacks
+        llm_circuit_breaker.before_call()
+        try:
+            data = await self._complete(request)
+        except (ValueError, asyncio.CancelledError):
+            # Local gateway timeout or cancellation says nothing about provider health
+            llm_circuit_breaker.record_ignored()
+            raise
+        except Exception:
+            llm_circuit_breaker.record_failure()
+            raise
+        llm_circuit_breaker.record_success(request.provider_seconds or 0.0)
+        return data
 
     @_track
     async def generate_text(
         self,
         prompt: str,
         temperature: Optional[float] = None,
-        max_tokens: Optional[int] = None
+        max_tokens: Optional[int] = None,
+        use_cache: bool = False,
+        priority: str = PRIORITY_INTERACTIVE,
+        json_schema: Optional[dict] = None,
+        prompt_name: Optional[str] = None,
+        budget_key: Optional[str] = None,
     ) -> str:
         """
         Generate text using LLM API.
@@ -117,11 +469,24 @@ class LLMService:
             prompt: The prompt to send to the LLM
             temperature: Optional temperature override
             max_tokens: Optional max_tokens override
+            use_cache: Return a cached response for the same prompt if present, and cache new responses
+            priority: Gateway priority class ("interactive" or "background")
+            json_schema: Optional {"name", "schema"} for provider-native JSON-schema output
+            prompt_name: Prompt key (prompt_registry.PROMPT_NAMES) for adaptive max_tokens and usage metrics
+            budget_key: Adaptive max_tokens key when answers of one prompt differ in length by
+                design (e.g. per batch size); defaults to prompt_name
             
         Returns:
             Generated text response
         """
         try:
+            if use_cache:
+                cached = self.response_cache.get(self._cache_key(prompt, temperature, max_tokens))
+                if cached is not None:
+                    logger.info(f"LLM cache hit - prompt_length: {len(prompt)}")
+                    llm_usage_metrics.record_cache_hit(prompt_name)
+                    return cached
+
             if not self.api_key:
                 logger.warning("LLM API key not configured. Set LLM_API_KEY in environment variables.")
                 raise ValueError("LLM API key not configured. Set LLM_API_KEY in environment variables.")
@@ -133,129 +498,93 @@ class LLMService:
             logger.info(
                 f"Calling LLM API - model: {self.model}, max_tokens: {max_tokens}, prompt_length: {len(prompt)}"
             )
-            
-            headers = {
-                "Authorization": f"Bearer {self.api_key}",
-                "Content-Type": "application/json"
-            }
-
-            # OpenRouter recommends these optional attribution headers.
-            if self.is_openrouter:
-                if settings.openrouter_site_url:
-                    headers["HTTP-Referer"] = settings.openrouter_site_url
-                if settings.openrouter_app_name:
-                    headers["X-Title"] = settings.openrouter_app_name
-            
-            payload = {
-                "model": self.model,
-                "messages": [
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ],
-            }
-            # OpenRouter/provider routing is most compatible with max_tokens.
-            # Keep max_completion_tokens for non-OpenRouter setups that rely on it.
-            if self.is_openrouter:
-                payload["max_tokens"] = max_tokens
-            else:
-                payload["max_completion_tokens"] = max_tokens
-            # Some models only support the default temperature (1). Omit when not 1 so the API uses default.
-            if temperature is not None and abs(temperature - 1.0) < 0.001:
-                payload["temperature"] = 1.0
-
-            # #region debug log
-            _debug_log(
-                "llm_service.py:request",
-                "request payload keys and model",
-                {
-                    "model": self.model,
-                    "token_key": "max_tokens" if self.is_openrouter else "max_completion_tokens",
-                    "max_tokens": max_tokens,
-                    "payload_keys": list(payload.keys()),
-                },
-                "H5",
-            )
-            # #endregion
 
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                try:
-                    response = await client.post(
-                        f"{self.base_url}/chat/completions",
-                        headers=headers,
-                        json=payload
-                    )
-                    response.raise_for_status()
-                    data = response.json()
+            call_started = time.monotonic()
+            try:
+                trace_id = llm_trace.new_trace()
+                budget_key = budget_key or prompt_name
+                budget = token_budget_tracker.budget_for(budget_key, max_tokens)
+                retried = False
+                while True:
+                    attempt_started = time.monotonic()
+                    data = await self._complete_guarded(CompletionRequest(
+                        prompt, temperature, budget, priority, json_schema, trace_id, prompt_name,
+                    ))
 
-                    # #region debug log
                     c0 = data.get("choices", [{}])[0] if data.get("choices") else {}
                     msg = c0.get("message", {}) if isinstance(c0, dict) else {}
                     raw_content = msg.get("content") if isinstance(msg, dict) else None
-                    debug_data = {
-                        "data_keys": list(data.keys()),
-                        "choices_len": len(data.get("choices", [])),
-                        "choice0_keys": list(c0.keys()) if isinstance(c0, dict) else None,
-                        "message_keys": list(msg.keys()) if isinstance(msg, dict) else None,
-                        "finish_reason": c0.get("finish_reason"),
-                        "content_type": type(raw_content).__name__,
-                        "content_is_none": raw_content is None,
-                        "content_repr_len": len(repr(raw_content)) if raw_content is not None else 0,
-                        "content_repr_preview": repr(raw_content)[:300] if raw_content is not None else None,
-                    }
-                    logger.warning("LLM response debug (H1/H3/H4): %s", json.dumps(debug_data))
-                    _debug_log("llm_service.py:response", "API response structure and content", debug_data, "H1")
-                    if isinstance(raw_content, list):
-                        _debug_log("llm_service.py:response", "content is list (multimodal)", {"content_len": len(raw_content), "first_item_type": type(raw_content[0]).__name__ if raw_content else None}, "H2")
-                    # #endregion
-
-                    # Extract the generated text
-                    if "choices" in data and len(data["choices"]) > 0:
-                        content = data["choices"][0]["message"].get("content")
-                        generated_text = (content or "").strip()
-                        print(f"[LLM] API returned success response_len={len(generated_text)}")
-                        logger.info(f"LLM API success response_length={len(generated_text)}")
-                        if not generated_text:
-                            # #region debug log
-                            _debug_log("llm_service.py:empty_branch", "entered empty content branch", {"finish_reason": data["choices"][0].get("finish_reason"), "message_keys": list(data["choices"][0].get("message", {}).keys())}, "H3")
-                            # #endregion
-                            logger.warning("LLM API returned empty content")
-                            msg = data["choices"][0].get("message", {})
-                            logger.warning(
-                                "LLM empty response debug - model=%s max_completion_tokens=%s "
-                                "finish_reason=%s message_keys=%s",
-                                self.model,
-                                max_tokens,
-                                data["choices"][0].get("finish_reason"),
-                                list(msg.keys()) if isinstance(msg, dict) else type(msg),
-                            )
-                            logger.warning(
-                                "PROMPT FOR DEBUG (copy to ChatGPT):\n---\n%s\n---",
-                                prompt,
-                            )
-                            raise ValueError("LLM API returned empty response")
-                        return generated_text
-                    else:
-                        logger.error("Unexpected response format from LLM API - no choices in response")
-                        logger.error(f"Response data: {data}")
-                        raise ValueError("Unexpected response format from LLM API")
-                        
-                except httpx.HTTPStatusError as e:
-                    print(f"[LLM] HTTP error status={e.response.status_code} body={e.response.text[:200]}")
-                    logger.error(
-                        f"LLM API HTTP error - status: {e.response.status_code}, "
-                        f"response: {e.response.text}"
+                    finish_reason = c0.get("finish_reason") if isinstance(c0, dict) else None
+                    if trace_id:
+                        llm_trace.emit(trace_id, "response", {
+                            "duration_ms": round(1000 * (time.monotonic() - attempt_started)),
+                            "choices_len": len(data.get("choices", [])),
+                            "message_keys": list(msg.keys()) if isinstance(msg, dict) else None,
+                            "finish_reason": finish_reason,
+                            "content_type": type(raw_content).__name__,
+                            "content": llm_trace.text_field(raw_content) if isinstance(raw_content, str) else None,
+                            "usage": data.get("usage"),
+                            "max_tokens": budget,
+                        })
+                    llm_usage_metrics.record_usage(prompt_name, data.get("usage"))
+                    token_budget_tracker.record(
+                        budget_key,
+                        (data.get("usage") or {}).get("completion_tokens"),
+                        truncated=finish_reason == "length",
                     )
-                    raise Exception(f"LLM API error: {e.response.status_code} - {e.response.text}")
-                except httpx.TimeoutException as e:
-                    print(f"[LLM] Timeout: {e}")
-                    logger.error(f"LLM API timeout error: {str(e)}")
-                    raise Exception(f"LLM API timeout: {str(e)}")
-                except Exception as e:
-                    logger.error(f"Error calling LLM API: {str(e)}")
-                    logger.error(f"Traceback: {traceback.format_exc()}")
-                    raise Exception(f"Error calling LLM API: {str(e)}")
+                    if finish_reason != "length" or retried:
+                        break
+                    larger = token_budget_tracker.retry_budget(budget, max_tokens)
+                    if larger is None:
+                        break
+                    # Cut off by the output budget: one more attempt with room to finish
+                    logger.warning(
+                        f"LLM answer truncated at max_tokens={budget} (prompt={prompt_name}); retrying with {larger}"
+                    )
+                    token_budget_tracker.record_retry(budget_key)
+                    budget = larger
+                    retried = True
+
+                # Extract the generated text
+                if "choices" in data and len(data["choices"]) > 0:
+                    content = data["choices"][0]["message"].get("content")
+                    generated_text = (content or "").strip()
+                    print(f"[LLM] API returned success response_len={len(generated_text)}")
+                    logger.info(f"LLM API success response_length={len(generated_text)}")
+                    if not generated_text:
+                        logger.warning("LLM API returned empty content")
+                        msg = data["choices"][0].get("message", {})
+                        logger.warning(
+                            "LLM empty response debug - model=%s max_completion_tokens=%s "
+                            "finish_reason=%s message_keys=%s",
+                            self.model,
+                            budget,
+                            data["choices"][0].get("finish_reason"),
+                            list(msg.keys()) if isinstance(msg, dict) else type(msg),
+                        )
+                        # Prompts carry user data: only dumped with DEBUG logging enabled
+                        logger.debug(
+                            "PROMPT FOR DEBUG (copy to ChatGPT):\n---\n%s\n---",
+                            prompt,
+                        )
+                        raise ValueError("LLM API returned empty response")
+                    if use_cache:
+                        self.store_cached_text(prompt, generated_text, temperature, max_tokens)
+                    llm_usage_metrics.record_call(prompt_name, time.monotonic() - call_started, ok=True)
+                    return generated_text
+                else:
+                    logger.error("Unexpected response format from LLM API - no choices in response")
+                    logger.error(f"Response data: {data}")
+                    raise ValueError("Unexpected response format from LLM API")
+
+            except ValueError:
+                # Gateway queue timeout / empty response: expected, let routes fall back
+                llm_usage_metrics.record_call(prompt_name, time.monotonic() - call_started, ok=False)
+                raise
+            except Exception as e:
+                llm_usage_metrics.record_call(prompt_name, time.monotonic() - call_started, ok=False)
+                logger.error(f"Error calling LLM API: {str(e)}")
+                raise
         except ValueError:
             # Re-raise ValueError without logging (expected error)
             raise
@@ -264,20 +593,31 @@ class LLMService:
             logger.error(f"Traceback: {traceback.format_exc()}")
             raise
     
-    async def generate_list(self, prompt: str) -> List[str]:
+    async def generate_list(
+        self,
+        prompt: str,
+        use_cache: bool = False,
+        priority: str = PRIORITY_INTERACTIVE,
+        prompt_name: Optional[str] = None,
+    ) -> List[str]:
         """
         Generate a list of items from LLM response.
         Assumes LLM returns items one per line.
         
         Args:
             prompt: The prompt to send to the LLM
+            use_cache: Serve/store the raw response via the in-memory LLM cache
+            priority: Gateway priority class ("interactive" or "background")
+            prompt_name: Prompt key (prompt_registry.PROMPT_NAMES) for per-prompt stats
             
         Returns:
             List of generated items
         """
         try:
             logger.debug("Generating list from LLM response")
-            response = await self.generate_text(prompt)
+            response = await self.generate_text(
+                prompt, use_cache=use_cache, priority=priority, prompt_name=prompt_name
+            )
             
             # Split by newlines and clean up
             items = [
@@ -308,58 +648,53 @@ class LLMService:
         prompt: str,
         temperature: Optional[float] = None,
         max_tokens: Optional[int] = 2048,
+        priority: str = PRIORITY_INTERACTIVE,
+        schema: Optional[Type[BaseModel]] = None,
+        prompt_name: Optional[str] = None,
+        budget_key: Optional[str] = None,
     ) -> dict:
         """
-        Generate JSON from LLM. Handles:
-        - Pure JSON responses
-        - Markdown-wrapped JSON (```json ... ```)
-        - Reasoning text before/after JSON (extracts first { ... } block)
+        Generate JSON from LLM.
+
+        With `schema` (a Pydantic model), providers that support it are asked for JSON-schema
+        structured output, so the response is a bare object matching the model. Otherwise (or if
+        the provider ignores it) the single tolerant parser handles markdown fences and reasoning
+        text around the object. A schema-valid result is returned normalized via model_dump();
+        a parsed object that fails validation is returned as-is for the caller's own fallbacks.
         """
+        raw = await self.generate_text(
+            prompt=prompt,
+            temperature=temperature or self.temperature,
+            max_tokens=max_tokens or 2048,
+            priority=priority,
+            json_schema=_json_schema_format(schema) if schema else None,
+            prompt_name=prompt_name,
+            budget_key=budget_key,
+        )
         try:
-            raw = await self.generate_text(
-                prompt=prompt,
-                temperature=temperature or self.temperature,
-                max_tokens=max_tokens or 2048,
-            )
-            text = raw.strip()
-            if not text:
-                logger.warning("LLM returned empty response; cannot parse as JSON")
-                raise ValueError("LLM returned empty response; cannot parse as JSON")
-
-            # Strip markdown code blocks if present
-            if text.startswith("```"):
-                lines = text.split("\n")
-                if lines[0].startswith("```"):
-                    lines = lines[1:]
-                if lines and lines[-1].strip() == "```":
-                    lines = lines[:-1]
-                text = "\n".join(lines).strip()
-
-            # Try direct parse first (pure JSON)
-            try:
-                return json.loads(text)
-            except json.JSONDecodeError:
-                pass
-
-            # Extract JSON object from within reasoning text:
-            # Find the first '{' and the matching last '}'
-            first_brace = text.find("{")
-            last_brace = text.rfind("}")
-            if first_brace != -1 and last_brace > first_brace:
-                json_candidate = text[first_brace:last_brace + 1]
-                try:
-                    result = json.loads(json_candidate)
-                    logger.info("Extracted JSON from LLM response with surrounding text")
-                    return result
-                except json.JSONDecodeError:
-                    pass
-
-            # Nothing worked — raise with context
+            data = parse_json_object(raw)
+        except ValueError:
             logger.warning(f"LLM JSON parse error. Raw (first 500 chars): {raw[:500] if raw else 'empty'}")
             raise ValueError(f"LLM did not return valid JSON. Raw start: {raw[:200] if raw else 'empty'}")
-        except json.JSONDecodeError as e:
-            logger.warning(f"LLM JSON parse error: {e}. Raw (first 500 chars): {raw[:500] if raw else 'empty'}")
-            raise ValueError(f"LLM did not return valid JSON: {e}") from e
+        if schema is None:
+            return data
+        try:
+            return schema.model_validate(data).model_dump()
+        except ValidationError as e:
+            logger.warning(f"LLM JSON did not match {schema.__name__}: {e.error_count()} error(s)")
+            return data
+
+
+def _json_schema_format(schema: Type[BaseModel]) -> dict:
+    """OpenAI response_format.json_schema block for a Pydantic model (cached per model)."""
+    cached = _JSON_SCHEMA_CACHE.get(schema)
+    if cached is None:
+        cached = {"name": schema.__name__, "schema": schema.model_json_schema()}
+        _JSON_SCHEMA_CACHE[schema] = cached
+    return cached
+
+
+_JSON_SCHEMA_CACHE: dict = {}
 
 
 # Global LLM service instance
@@ -0,0 +1,161 @@
+"""
+Structured LLM trace sink (NDJSON), replacing the old synchronous debug-file appends.
+
+- emit() only puts a small dict on a bounded in-memory queue; it never touches the disk and
+  never blocks the event loop (events are dropped and counted when the queue is full).
+- A daemon writer thread drains the queue and appends lines to LLM_TRACE_PATH, rotating the
+  file at LLM_TRACE_MAX_BYTES and keeping LLM_TRACE_BACKUP_COUNT old files.
+- Sampling is per logical LLM call: new_trace() returns a trace id for sampled calls and None
+  otherwise, so every event of a sampled call is kept together.
+- Prompts and response text are redacted to a hash + length unless LLM_TRACE_INCLUDE_PROMPTS.
+"""
+import hashlib
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+import uuid
+from typing import Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def redact_text(text: Optional[str]) -> Optional[dict]:
+    """Hash + length stand-in for prompt/response text."""
+    if text is None:
+        return None
+    return {"sha256": hashlib.sha256(text.encode("utf-8")).hexdigest()[:16], "length": len(text)}
+
+
+class LLMTraceSink:
+    """Bounded queue + background writer thread with size-based rotation."""
+
+    def __init__(
+        self,
+        path: str,
+        enabled: bool = True,
+        sample_rate: float = 0.1,
+        max_bytes: int = 5 * 1024 * 1024,
+        backup_count: int = 3,
+        queue_size: int = 1000,
+        include_prompts: bool = False,
+    ):
+        self.path = path
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.include_prompts = include_prompts
+        self._queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._start_lock = threading.Lock()
+        self.written = 0
+        self.dropped = 0
+
+    def new_trace(self) -> Optional[str]:
+        """Trace id if this call is sampled, else None (then emit() is a no-op for it)."""
+        if not self.enabled or self.sample_rate <= 0:
+            return None
+        if self.sample_rate < 1 and random.random() >= self.sample_rate:
+            return None
+        return uuid.uuid4().hex[:12]
+
+    def text_field(self, text: Optional[str]):
+        """Prompt/response text as configured: verbatim or redacted."""
+        return text if self.include_prompts else redact_text(text)
+
+    def emit(self, trace_id: Optional[str], event: str, data: dict) -> None:
+        """Queue one trace event. Non-blocking; drops (and counts) when the queue is full."""
+        if trace_id is None:
+            return
+        self._ensure_started()
+        record = {"traceId": trace_id, "ts": int(time.time() * 1000), "event": event, "data": data}
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="llm-trace-writer", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 2.0) -> None:
+        """Flush what is queued and stop the writer (app shutdown)."""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join(timeout)
+        self._thread = None
+
+    def _run(self) -> None:
+        while not (self._stop.is_set() and self._queue.empty()):
+            try:
+                record = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            batch = [record]
+            while len(batch) < 100:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._write(batch)
+
+    def _write(self, batch: list) -> None:
+        try:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            if os.path.exists(self.path) and os.path.getsize(self.path) >= self.max_bytes:
+                self._rotate()
+            with open(self.path, "a", encoding="utf-8") as f:
+                for record in batch:
+                    f.write(json.dumps(record, default=str) + "\n")
+            self.written += len(batch)
+        except Exception as e:
+            self.dropped += len(batch)
+            logger.debug(f"LLM trace write failed: {e}")
+
+    def _rotate(self) -> None:
+        """path -> path.1 -> ... -> path.N (oldest deleted)."""
+        if self.backup_count <= 0:
+            os.remove(self.path)
+            return
+        for i in range(self.backup_count - 1, 0, -1):
+            src = f"{self.path}.{i}"
+            if os.path.exists(src):
+                os.replace(src, f"{self.path}.{i + 1}")
+        os.replace(self.path, f"{self.path}.1")
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "sampleRate": self.sample_rate,
+            "queued": self._queue.qsize(),
+            "written": self.written,
+            "dropped": self.dropped,
+        }
+
+
+# Global trace sink
+llm_trace = LLMTraceSink(
+    path=settings.llm_trace_path,
+    enabled=settings.llm_trace_enabled,
+    sample_rate=settings.llm_trace_sample_rate,
+    max_bytes=settings.llm_trace_max_bytes,
+    backup_count=settings.llm_trace_backup_count,
+    queue_size=settings.llm_trace_queue_size,
+    include_prompts=settings.llm_trace_include_prompts,
+)
@@ -0,0 +1,144 @@
+"""
+Speculative onboarding prefetch: after saveUserHabitPreference, generate the options the next
+onboarding screen will ask for (short options, full options, obvious cues) in the background and
+store the raw LLM responses in the in-memory LLM cache, so the next screen's request is a cache hit.
+
+Each (user, habit, step) has at most one speculative task. When the inputs change again the old
+task is cancelled, and a result whose inputs are no longer current is discarded instead of cached.
+Speculative calls are bounded per user by a small semaphore so they never crowd out real requests.
+"""
+import asyncio
+import hashlib
+import logging
+from typing import Callable, Optional
+
+from app.core.config import settings
+from app.services.llm_gateway import PRIORITY_BACKGROUND
+from app.services.llm_service import llm_service
+from app.utils.prompts import (
+    get_short_habit_options_prompt,
+    get_full_habit_options_prompt,
+    get_obvious_cues_prompt,
+)
+
+logger = logging.getLogger(__name__)
+
+# step -> (fields that must be filled in, field the step produces, prompt builder)
+# A step is prefetched only when its inputs are known and its own output is still empty,
+# i.e. it is the screen the user is about to see.
+SPECULATIVE_STEPS: dict[str, tuple[tuple[str, ...], str, Callable[[dict], str]]] = {
+    "short_habit_options": (("starting_idea", "identity"), "starter_habit", get_short_habit_options_prompt),
+    "full_habit_options": (("starting_idea", "identity", "starter_habit"), "full_habit", get_full_habit_options_prompt),
+    "obvious_cues": (
+        ("starting_idea", "identity", "starter_habit", "full_habit", "habit_stack"),
+        "habit_environment",
+        get_obvious_cues_prompt,
+    ),
+}
+
+
+def _prompt_fingerprint(prompt: str) -> str:
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+
+
+class OnboardingPrefetchService:
+    """Schedules, cancels and de-duplicates speculative onboarding generations."""
+
+    def __init__(self):
+        # (user_id, habit_id, step) -> (prompt fingerprint, task)
+        self._inflight: dict[tuple[str, str, str], tuple[str, asyncio.Task]] = {}
+        # (user_id, habit_id, step) -> fingerprint of the inputs the user currently has
+        self._current: dict[tuple[str, str, str], str] = {}
+        # user_id -> (semaphore, number of tasks using it); dropped when no task uses it
+        self._user_semaphores: dict[str, tuple[asyncio.Semaphore, int]] = {}
+
+    def _acquire_semaphore(self, user_id: str) -> asyncio.Semaphore:
+        """The user's semaphore, counted as used until _release_semaphore."""
+        sem, users = self._user_semaphores.get(user_id, (None, 0))
+        if sem is None:
+            sem = asyncio.Semaphore(max(1, settings.onboarding_prefetch_max_concurrency_per_user))
+        self._user_semaphores[user_id] = (sem, users + 1)
+        return sem
+
+    def _release_semaphore(self, user_id: str) -> None:
+        sem, users = self._user_semaphores[user_id]
+        if users <= 1:
+            del self._user_semaphores[user_id]
+        else:
+            self._user_semaphores[user_id] = (sem, users - 1)
+
+    def schedule(self, user_id: str, habit_id: str, habit_context: dict) -> list[str]:
+        """
+        Start speculative generation for the next onboarding step(s) given the saved context.
+        Returns the list of steps newly scheduled. Never raises.
+        """
+        if not settings.onboarding_prefetch_enabled or not llm_service.api_key:
+            return []
+        scheduled = []
+        try:
+            for step, (required, output_field, build_prompt) in SPECULATIVE_STEPS.items():
+                key = (user_id, habit_id, step)
+                if not all(habit_context.get(f) for f in required) or habit_context.get(output_field):
+                    # Not the upcoming step (anymore): drop any pending speculation for it
+                    self._current.pop(key, None)
+                    self._cancel(key)
+                    continue
+
+                prompt = build_prompt(habit_context)
+                fingerprint = _prompt_fingerprint(prompt)
+                self._current[key] = fingerprint
+                existing = self._inflight.get(key)
+                if existing and existing[0] == fingerprint:
+                    continue  # same inputs already being generated
+                self._cancel(key)
+
+                task = asyncio.create_task(self._run(key, prompt, fingerprint))
+                self._inflight[key] = (fingerprint, task)
+                task.add_done_callback(lambda t, k=key, fp=fingerprint: self._on_done(k, fp))
+                scheduled.append(step)
+            if scheduled:
+                logger.info(f"Speculative prefetch scheduled {scheduled} for user={user_id}, habit={habit_id}")
+        except Exception as e:
+            logger.warning(f"Could not schedule speculative onboarding prefetch: {e}")
+        return scheduled
+
+    def _cancel(self, key: tuple[str, str, str]) -> None:
+        existing = self._inflight.pop(key, None)
+        if existing and not existing[1].done():
+            existing[1].cancel()
+            logger.debug(f"Cancelled speculative prefetch {key[2]} for user={key[0]}, habit={key[1]}")
+
+    def _on_done(self, key: tuple[str, str, str], fingerprint: str) -> None:
+        existing = self._inflight.get(key)
+        if existing and existing[0] == fingerprint:
+            del self._inflight[key]
+        # Finished (or cancelled) for the current inputs: nothing left to compare against
+        if self._current.get(key) == fingerprint and key not in self._inflight:
+            del self._current[key]
+
+    async def _run(self, key: tuple[str, str, str], prompt: str, fingerprint: str) -> Optional[str]:
+        user_id, habit_id, step = key
+        # Held until this task is done with it, so a replacement task shares it (per-user cap)
+        semaphore = self._acquire_semaphore(user_id)
+        try:
+            async with semaphore:
+                if self._current.get(key) != fingerprint:
+                    return None  # inputs changed while waiting for a slot
+                text = await llm_service.generate_text(prompt, priority=PRIORITY_BACKGROUND, prompt_name=step)
+            if self._current.get(key) != fingerprint:
+                logger.debug(f"Discarding stale speculative {step} for user={user_id}, habit={habit_id}")
+                return None
+            llm_service.store_cached_text(prompt, text)
+            logger.info(f"Speculative {step} cached for user={user_id}, habit={habit_id}")
+            return text
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Speculative {step} failed for user={user_id}, habit={habit_id}: {e}")
+            return None
+        finally:
+            self._release_semaphore(user_id)
+
+
+# Singleton instance
+onboarding_prefetch_service = OnboardingPrefetchService()
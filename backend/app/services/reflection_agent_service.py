@@ -1,14 +1,32 @@
 """
-Reflection agent service: LangChain ReAct agent with Tavily search for reflection items.
-Uses web search (e.g. James Clear / Atomic Habits) to enrich insights and experiment suggestions.
+Reflection agent service: LangChain ReAct agent for reflection items.
+Searches a local index of curated Atomic Habits snippets (and, if enabled, Tavily web search
+with results cached in MongoDB) to enrich insights and experiment suggestions.
+Runs are driven with ainvoke under a time budget (REFLECTION_AGENT_TIMEOUT_SECONDS) and a step
+budget (REFLECTION_AGENT_MAX_STEPS); synchronous setup runs on a small dedicated thread pool.
 """
+import asyncio
 import json
 import logging
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional
 
 from app.core.config import settings
-from app.utils.prompts import get_reflection_items_prompt
+from app.services.llm_gateway import llm_gateway, PRIORITY_BACKGROUND
+from app.utils.prompt_registry import estimate_tokens
+from app.services.circuit_breaker import (
+    CircuitOpenError,
+    llm_circuit_breaker,
+    reflection_agent_circuit_breaker,
+)
+from app.services.llm_metrics import llm_usage_metrics
+from app.services.web_search_cache import web_search_cache
+from app.utils.habit_snippets import format_snippets, search_habit_snippets
+from app.utils.json_parsing import parse_json_object
+from app.utils.prompts import REFLECTION_ITEMS_MAX_TOKENS, get_reflection_items_prompt
+from app.utils.reflection_format import expand_reflection_items
 
 logger = logging.getLogger(__name__)
 
@@ -18,6 +36,16 @@ _llm = None
 _tools = None
 _opik_tracer = None
 
+# Usage-metrics name for whole agent runs (their ChatOpenAI calls bypass LLMService)
+AGENT_PROMPT_NAME = "reflection_items_agent"
+
+# Small dedicated pool for the agent's synchronous work (LangChain imports, client setup, the
+# sync entry point), so slow agent runs cannot starve the event loop's default executor
+_agent_executor = ThreadPoolExecutor(
+    max_workers=max(1, settings.reflection_agent_max_threads),
+    thread_name_prefix="reflection-agent",
+)
+
 
 def _get_opik_tracer():
     """Get OpikTracer for LangChain if Opik is enabled, else None."""
@@ -64,30 +92,70 @@ def _tavily_configured() -> bool:
     return bool(os.environ.get("TAVILY_API_KEY") or getattr(settings, "tavily_api_key", None))
 
 
+def search_atomic_habits(query: str) -> str:
+    """Search curated James Clear / Atomic Habits principles (habit stacking, environment design, making habits enjoyable, identity, consistency). Input: a short topic query."""
+    return format_snippets(search_habit_snippets(query, k=settings.reflection_snippet_results))
+
+
+async def _search_atomic_habits_async(query: str) -> str:
+    # In-process index lookup (microseconds): no need for a thread
+    return search_atomic_habits(query)
+
+
+def _habit_snippets_tool():
+    """Local Atomic Habits snippet search as a LangChain tool."""
+    from langchain_core.tools import StructuredTool
+
+    return StructuredTool.from_function(
+        func=search_atomic_habits,
+        coroutine=_search_atomic_habits_async,
+        name="search_atomic_habits",
+    )
+
+
+def _web_search_tool():
+    """Live Tavily search behind the Mongo web search cache (optional, REFLECTION_AGENT_WEB_SEARCH_ENABLED)."""
+    from langchain_core.tools import StructuredTool
+    from langchain_tavily import TavilySearch
+
+    tavily = TavilySearch(
+        max_results=3,
+        topic="general",
+        search_depth="basic",
+        include_answer=True,
+    )
+
+    def web_search(query: str) -> str:
+        """Search the web for James Clear / Atomic Habits content not covered by search_atomic_habits. Input: a search query."""
+        result = tavily.invoke({"query": query})
+        return result if isinstance(result, str) else json.dumps(result, ensure_ascii=False)
+
+    async def _web_search_async(query: str) -> str:
+        cached = await web_search_cache.get(query)
+        if cached is not None:
+            return cached
+        result = await tavily.ainvoke({"query": query})
+        text = result if isinstance(result, str) else json.dumps(result, ensure_ascii=False)
+        await web_search_cache.set(query, text)
+        return text
+
+    return StructuredTool.from_function(func=web_search, coroutine=_web_search_async, name="web_search")
+
+
 def _get_tools():
-    """Build tools for the ReAct agent (Tavily search for James Clear / habit content)."""
+    """Build tools for the ReAct agent: local Atomic Habits snippets, plus cached Tavily search if enabled."""
     global _tools
     if _tools is not None:
         return _tools
-    if not _tavily_configured():
-        return []
-    try:
-        from langchain_tavily import TavilySearch
-
-        _tools = [
-            TavilySearch(
-                max_results=3,
-                topic="general",
-                search_depth="basic",
-                include_answer=True,
-            )
-        ]
-        logger.info("Tavily search tool initialized for reflection agent")
-        return _tools
-    except Exception as e:
-        logger.warning("Could not initialize Tavily tool: %s", e)
-        _tools = []
-        return _tools
+    tools = [_habit_snippets_tool()]
+    if settings.reflection_agent_web_search_enabled and _tavily_configured():
+        try:
+            tools.append(_web_search_tool())
+            logger.info("Tavily search tool initialized for reflection agent")
+        except Exception as e:
+            logger.warning("Could not initialize Tavily tool: %s", e)
+    _tools = tools
+    return _tools
 
 
 def _get_llm():
@@ -101,12 +169,12 @@ def _get_llm():
         api_key = settings.llm_api_key
         if not api_key:
             raise ValueError("LLM API key not configured")
-        # Reflection output (insights + questions + 3 experiments) is large; use higher limit to avoid truncation
-        reflection_max_tokens = 4096
+        # Final answer is the compact reflection JSON (tool-call turns are small too)
         _llm = ChatOpenAI(
             model=settings.llm_model,
             temperature=settings.llm_temperature,
-            max_tokens=reflection_max_tokens,
+            max_tokens=REFLECTION_ITEMS_MAX_TOKENS,
+            timeout=settings.llm_request_timeout_seconds,
             api_key=api_key,
             base_url=settings.llm_api_base_url or None,
         )
@@ -125,52 +193,82 @@ def _get_agent():
 
     llm = _get_llm()
     tools = _get_tools()
-    if not tools:
-        logger.warning("Reflection agent running without tools (no Tavily API key)")
-    _agent = create_agent(model=llm, tools=tools or None)
+    _agent = create_agent(model=llm, tools=tools)
     logger.info("Reflection agent initialized (tools=%s)", len(tools))
     return _agent
 
 
 def _extract_json_from_response(content: str) -> dict:
-    """Strip markdown code blocks and parse JSON from agent final response."""
-    text = (content or "").strip()
-    if not text:
-        raise ValueError("Empty agent response")
-    
-    original_text = text  # Keep for logging if parse fails
-    
-    # Strip markdown code blocks
-    if text.startswith("```"):
-        lines = text.split("\n")
-        if lines[0].startswith("```"):
-            lines = lines[1:]
-        if lines and lines[-1].strip() == "```":
-            lines = lines[:-1]
-        text = "\n".join(lines).strip()
-    
-    # Try to find JSON object in the response (handle text before/after JSON)
-    if not text.startswith("{"):
-        start = text.find("{")
-        if start != -1:
-            # Find matching closing brace
-            depth = 0
-            end = start
-            for i, c in enumerate(text[start:], start):
-                if c == "{":
-                    depth += 1
-                elif c == "}":
-                    depth -= 1
-                    if depth == 0:
-                        end = i + 1
-                        break
-            text = text[start:end]
-    
+    """Parse the JSON object from the agent's final response (same tolerant parser as LLMService)."""
     try:
-        return json.loads(text)
-    except json.JSONDecodeError as e:
-        logger.error("Failed to parse JSON from agent response. Original content: %s", original_text[:500])
+        return parse_json_object(content)
+    except ValueError:
+        logger.error("Failed to parse JSON from agent response. Original content: %s", (content or "")[:500])
+        raise
+
+
+AGENT_SYSTEM_PROMPT = "You are a supportive habit coach. Output only valid JSON as specified in the user message. You may use the search tools to find James Clear / Atomic Habits principles to enrich your response."
+
+
+def _build_messages(habit_context: dict, streak_data: dict) -> list:
+    """System + user messages for one agent run. Raises ModuleNotFoundError without LangChain."""
+    try:
+        from langchain_core.messages import HumanMessage, SystemMessage
+    except ModuleNotFoundError as e:
+        logger.debug("LangChain not available, use direct LLM fallback: %s", e)
         raise
+    return [
+        SystemMessage(content=AGENT_SYSTEM_PROMPT),
+        HumanMessage(content=get_reflection_items_prompt(habit_context, streak_data)),
+    ]
+
+
+def _invoke_config() -> dict:
+    """Per-run config: step budget (LangGraph recursion_limit) and the Opik callback if enabled."""
+    config = {"recursion_limit": settings.reflection_agent_max_steps}
+    opik_tracer = _get_opik_tracer()
+    if opik_tracer:
+        config["callbacks"] = [opik_tracer]
+    return config
+
+
+def _result_to_items(result: dict, habit_context: dict) -> dict:
+    """Final AI message of an agent run -> ReflectionItemsResponse-shaped dict. Raises ValueError."""
+    # Result is a dict with "messages" list; take the last AI message as final answer
+    out_messages = result.get("messages", [])
+    if not out_messages:
+        raise ValueError("Agent returned no messages")
+
+    logger.debug("Agent returned %d messages", len(out_messages))
+
+    # Final answer is the last AI message (after any tool calls)
+    content = None
+    for m in reversed(out_messages):
+        if getattr(m, "type", "") == "ai" or type(m).__name__ == "AIMessage":
+            c = getattr(m, "content", None)
+            # Handle content that may be a list (tool calls) vs string
+            if isinstance(c, list):
+                # Extract text content from list items
+                text_parts = [item.get("text", "") if isinstance(item, dict) else str(item) for item in c]
+                c = " ".join(text_parts).strip()
+            if c and isinstance(c, str) and c.strip():
+                content = c.strip()
+                logger.debug("Found AI message content: %s...", content[:100] if len(content) > 100 else content)
+                break
+
+    if not content:
+        last_msg = out_messages[-1]
+        last_content = getattr(last_msg, "content", None)
+        logger.warning("No AI message with content found. Last message type: %s, content type: %s, content: %s",
+                      type(last_msg).__name__, type(last_content).__name__ if last_content else None,
+                      str(last_content)[:200] if last_content else "None")
+        content = last_content if isinstance(last_content, str) else str(last_msg)
+
+    if not content:
+        raise ValueError("Agent final message has no content")
+
+    data = _extract_json_from_response(content)
+    return expand_reflection_items(data, habit_context)
 
 
 def generate_reflection_items_with_agent(
@@ -178,70 +276,21 @@ def generate_reflection_items_with_agent(
     streak_data: dict,
 ) -> dict:
     """
-    Run the ReAct agent to generate reflection items (insights, questions, experiment suggestions).
-    Agent may use Tavily to search for James Clear / Atomic Habits content.
-    Returns a dict matching ReflectionItemsResponse shape (insights, reflectionQuestions, experimentSuggestions).
+    Run the ReAct agent synchronously (scripts; the app uses generate_reflection_items_with_agent_async).
+    Agent may search the local Atomic Habits snippets (and Tavily, if enabled).
+    Returns a dict matching ReflectionItemsResponse shape (insights, reflectionQuestions, experimentSuggestions),
+    expanded from the compact JSON the prompt asks for.
     Raises ImportError/ModuleNotFoundError if langchain dependencies are missing (caller falls back to direct LLM).
     """
+    messages = _build_messages(habit_context, streak_data)
     try:
-        from langchain_core.messages import HumanMessage, SystemMessage
-    except ModuleNotFoundError as e:
-        logger.debug("LangChain not available, use direct LLM fallback: %s", e)
-        raise
-
-    try:
-        agent = _get_agent()
-        system_prompt = "You are a supportive habit coach. Output only valid JSON as specified in the user message. You may use the search tool to find James Clear / Atomic Habits content to enrich your response."
-        user_prompt = get_reflection_items_prompt(habit_context, streak_data)
-
-        messages = [
-            SystemMessage(content=system_prompt),
-            HumanMessage(content=user_prompt),
-        ]
-
-        # Agent expects input dict with "messages" key
-        # Add OpikTracer callback if enabled
-        opik_tracer = _get_opik_tracer()
-        invoke_config = {"callbacks": [opik_tracer]} if opik_tracer else None
-        result = agent.invoke({"messages": messages}, config=invoke_config)
-
-        # Result is a dict with "messages" list; take the last AI message as final answer
-        out_messages = result.get("messages", [])
-        if not out_messages:
-            raise ValueError("Agent returned no messages")
-        
-        logger.debug("Agent returned %d messages", len(out_messages))
-        
-        # Final answer is the last AI message (after any tool calls)
-        content = None
-        for m in reversed(out_messages):
-            if getattr(m, "type", "") == "ai" or type(m).__name__ == "AIMessage":
-                c = getattr(m, "content", None)
-                # Handle content that may be a list (tool calls) vs string
-                if isinstance(c, list):
-                    # Extract text content from list items
-                    text_parts = [item.get("text", "") if isinstance(item, dict) else str(item) for item in c]
-                    c = " ".join(text_parts).strip()
-                if c and isinstance(c, str) and c.strip():
-                    content = c.strip()
-                    logger.debug("Found AI message content: %s...", content[:100] if len(content) > 100 else content)
-                    break
-        
-        if not content:
-            last_msg = out_messages[-1]
-            last_content = getattr(last_msg, "content", None)
-            logger.warning("No AI message with content found. Last message type: %s, content type: %s, content: %s",
-                          type(last_msg).__name__, type(last_content).__name__ if last_content else None,
-                          str(last_content)[:200] if last_content else "None")
-            content = last_content if isinstance(last_content, str) else str(last_msg)
-        
-        if not content:
-            raise ValueError("Agent final message has no content")
-
-        data = _extract_json_from_response(content)
-        return data
-    except json.JSONDecodeError as e:
-        logger.warning("Reflection agent response was not valid JSON: %s", e)
+        result = _get_agent().invoke({"messages": messages}, config=_invoke_config())
+        return _result_to_items(result, habit_context)
+    except RecursionError as e:
+        # LangGraph GraphRecursionError: the run used up its step budget
+        raise ValueError(f"Reflection agent exceeded its step budget ({settings.reflection_agent_max_steps})") from e
+    except ValueError as e:
+        logger.warning("Reflection agent returned no usable JSON: %s", e)
         raise ValueError(f"Agent did not return valid JSON: {e}") from e
     except (ImportError, ModuleNotFoundError):
         raise
@@ -250,17 +299,65 @@ def generate_reflection_items_with_agent(
         raise
 
 
+async def _run_agent(habit_context: dict, streak_data: dict) -> dict:
+    """One agent run on the event loop via ainvoke (cancellable between steps)."""
+    messages = _build_messages(habit_context, streak_data)
+    # Building the agent imports LangChain and creates clients: sync, so on the agent executor
+    agent = await asyncio.get_running_loop().run_in_executor(_agent_executor, _get_agent)
+    try:
+        result = await agent.ainvoke({"messages": messages}, config=_invoke_config())
+        return _result_to_items(result, habit_context)
+    except RecursionError as e:
+        raise ValueError(f"Reflection agent exceeded its step budget ({settings.reflection_agent_max_steps})") from e
+    except ValueError as e:
+        logger.warning("Reflection agent returned no usable JSON: %s", e)
+        raise ValueError(f"Agent did not return valid JSON: {e}") from e
+
+
 async def generate_reflection_items_with_agent_async(
     habit_context: dict,
     streak_data: dict,
+    priority: str = PRIORITY_BACKGROUND,
 ) -> dict:
     """
-    Async wrapper: run the ReAct agent in a thread so we don't block the event loop.
+    Run the ReAct agent natively async (ainvoke) within its time budget; on timeout or
+    cancellation the run is cancelled, not left running in a thread.
+    The whole agent run holds one LLM gateway slot and counts as one call on its own circuit
+    breaker (its ChatOpenAI calls bypass LLMService), whose slow-call limit is the run's time
+    budget. It is also skipped while the shared LLM breaker rejects calls, without taking that
+    breaker's probe slot.
     """
-    import asyncio
+    if llm_circuit_breaker.is_open():
+        raise CircuitOpenError("LLM circuit is open; skipping reflection agent")
+    reflection_agent_circuit_breaker.before_call()
+    called_at = time.monotonic()
+    try:
+        async with llm_gateway.slot(priority, estimate_tokens(get_reflection_items_prompt(habit_context, streak_data)) + REFLECTION_ITEMS_MAX_TOKENS):
+            started = time.monotonic()
+            result = await asyncio.wait_for(
+                _run_agent(habit_context, streak_data),
+                timeout=settings.reflection_agent_timeout_seconds,
+            )
+    except (ValueError, ImportError, asyncio.CancelledError) as e:
+        # Bad JSON / step budget / missing LangChain / local queue timeout: not a provider health signal
+        reflection_agent_circuit_breaker.record_ignored()
+        if not isinstance(e, asyncio.CancelledError):
+            llm_usage_metrics.record_call(AGENT_PROMPT_NAME, time.monotonic() - called_at, ok=False)
+        raise
+    except asyncio.TimeoutError:
+        logger.warning(f"Reflection agent exceeded its {settings.reflection_agent_timeout_seconds:.0f}s time budget")
+        reflection_agent_circuit_breaker.record_failure()
+        llm_usage_metrics.record_call(AGENT_PROMPT_NAME, time.monotonic() - called_at, ok=False)
+        raise
+    except Exception:
+        reflection_agent_circuit_breaker.record_failure()
+        llm_usage_metrics.record_call(AGENT_PROMPT_NAME, time.monotonic() - called_at, ok=False)
+        raise
+    reflection_agent_circuit_breaker.record_success(time.monotonic() - started)
+    llm_usage_metrics.record_call(AGENT_PROMPT_NAME, time.monotonic() - called_at, ok=True)
+    return result
 
-    loop = asyncio.get_event_loop()
-    return await loop.run_in_executor(
-        None,
-        lambda: generate_reflection_items_with_agent(habit_context, streak_data),
-    )
+
+def shutdown_agent_executor() -> None:
+    """Stop the agent's worker threads (app shutdown)."""
+    _agent_executor.shutdown(wait=False, cancel_futures=True)
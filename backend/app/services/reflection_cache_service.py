@@ -1,24 +1,85 @@
 """
 Reflection cache service: caches LLM-generated reflection items in MongoDB.
-Background generation runs after check-in so data is ready when user opens Reflection page.
+Background generation runs as durable jobs (job_queue.py) after check-in so data is ready when
+user opens Reflection page.
+Each entry is stamped with a fingerprint of its inputs (habit context, streak fields and the
+reflection prompt version) and is only reused while the fingerprint matches, so a preference
+edit or check-in makes it a miss while an unchanged habit keeps its entry for days.
+Reads are stale-while-revalidate: matching entries older than the soft TTL are still served (and
+a deduplicated background refresh is scheduled) until the hard TTL; only a miss blocks on the LLM.
+Generated items are validated against the reflection models before caching; experiments missing
+from an otherwise valid payload are filled in by a small repair call for just those levers, and a
+payload still incomplete after that is cached with complete=False: served, but always stale.
+Each entry records its source (agent / llm / default) and an expiresAt (cachedAt + hard TTL,
+shorter for defaults) that a TTL index removes it at; reads exclude defaults and expired entries
+in the query itself.
+Generation for a habit holds a cross-worker lease (generation_lease.py): a background refresh
+skips habits another worker is already generating, and a request that misses the cache waits
+for that worker's result (polling the cache) or takes over once the lease expires.
+Generation is hedged: if the agent is still running after REFLECTION_HEDGE_DELAY_SECONDS the
+direct LLM call starts too, the first valid result wins and the other call is cancelled.
+Entries are also kept in a small in-process L1 (TTLCache bounded by entries and bytes) so the
+repeated reads of one Reflection flow skip Mongo; it is filled on read and save and emptied by
+invalidation. With REFLECTION_L1_CHANGE_STREAM (replica set), a change stream on reflection_cache
+refreshes or drops L1 entries written by other workers; otherwise REFLECTION_L1_TTL_SECONDS bounds
+how long another worker's update can go unseen. Reads around a generation lease, and L1 entries
+for other inputs, always go to Mongo, so a worker never regenerates what another just saved.
+Prefetch warms a user's stale habits in batches (generate_reflections_batch): one direct LLM call
+per REFLECTION_BATCH_MAX_HABITS habits sends the shared instructions once, and each habit whose
+section of the answer is missing or invalid falls back to its own generation job. Each batch job
+makes one call, so its job and generation leases only have to outlast that call.
 """
 import asyncio
+import hashlib
+import json
 import logging
-from datetime import datetime, timezone
+import time
+from datetime import datetime, timedelta, timezone
 from typing import Optional
 
 from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ReturnDocument
+from pymongo.errors import OperationFailure
 
+from app.core.config import settings
+from app.models.reflection import CompactExperiments, CompactReflectionBatch, CompactReflectionItems
+from app.services.generation_lease import generation_lease
 from app.services.habit_service import habit_service
+from app.services.job_queue import job_queue
+from app.services.llm_gateway import PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE
 from app.services.streak_service import streak_service
+from app.utils.prompt_registry import prompt_registry
+from app.utils.prompts import (
+    REFLECTION_EXPERIMENT_REPAIR_MAX_TOKENS,
+    REFLECTION_ITEMS_MAX_TOKENS,
+    get_reflection_experiment_repair_prompt,
+    get_reflection_items_batch_prompt,
+    get_reflection_items_prompt,
+)
+from app.utils.reflection_format import add_experiments, check_reflection_items, expand_reflection_items
+from app.utils.ttl_cache import TTLCache
 
 logger = logging.getLogger(__name__)
 
 # Collection name for cached reflection items
 CACHE_COLLECTION = "reflection_cache"
 
-# Cache TTL in seconds (1 hour - refresh if older)
-CACHE_TTL_SECONDS = 3600
+# Where a cache entry came from (source field)
+SOURCE_AGENT = "agent"
+SOURCE_LLM = "llm"
+SOURCE_DEFAULT = "default"
+
+# Cached defaults are never served; they are kept this long for inspection, then the TTL index drops them
+DEFAULT_ENTRY_TTL_SECONDS = 3600
+
+# Fields of a cache document used on reads (kept in the L1)
+_CACHE_DOC_FIELDS = {
+    "userId": 1, "habitId": 1, "data": 1, "inputFingerprint": 1, "cachedAt": 1, "source": 1, "expiresAt": 1,
+    "complete": 1,
+}
+
+# Mongo error code: change streams need a replica set
+_CHANGE_STREAM_UNSUPPORTED = 40573
 
 # Fallback when both agent and direct LLM fail (e.g. empty response). Keeps Reflection UI working.
 DEFAULT_REFLECTION_DATA = {
@@ -59,9 +120,205 @@ DEFAULT_REFLECTION_DATA = {
 }
 
 
+def reflection_input_fingerprint(habit_context: dict, streak_data: dict) -> str:
+    """Hash of everything the reflection items are generated from (inputs and prompt version)."""
+    payload = {
+        "habit": habit_context,
+        "streak": streak_data,
+        "prompt": prompt_registry.version("reflection_items"),
+    }
+    canonical = json.dumps(payload, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:16]
+
+
+def _lease_key(user_id: str, habit_id: str) -> str:
+    return f"reflection:{user_id}:{habit_id}"
+
+
+def _servable(now: datetime) -> dict:
+    """Query filter for cache entries that may be served: not a default, not expired."""
+    return {"source": {"$ne": SOURCE_DEFAULT}, "expiresAt": {"$gt": now}}
+
+
+def _aware(value: Optional[datetime]) -> Optional[datetime]:
+    """MongoDB may return naive datetimes (UTC)."""
+    if value is not None and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+def _doc_size(doc: dict) -> int:
+    """Approximate memory of a cached document (its JSON size) for the L1 byte budget."""
+    return len(json.dumps(doc, default=str, ensure_ascii=False))
+
+
 class ReflectionCacheService:
     """Service for caching and retrieving reflection items."""
 
+    def __init__(self):
+        self._generation_stats = {
+            "agent": 0, "llm": 0, "failed": 0, "hedged": 0, "cancelled": 0,
+            "servedFresh": 0, "servedStale": 0, "servedMiss": 0, "inputsChanged": 0,
+            "leaseWaitHits": 0, "leaseWaitTimeouts": 0, "leaseSkipped": 0,
+            "batchCalls": 0, "batchHabits": 0, "batchFallbacks": 0,
+            "repaired": 0, "repairFailed": 0, "invalid": 0,
+        }
+        # In-process L1 of cache documents, keyed by (userId, habitId)
+        self._l1 = TTLCache(
+            max_entries=settings.reflection_l1_max_entries,
+            ttl_seconds=settings.reflection_l1_ttl_seconds,
+            max_bytes=settings.reflection_l1_max_bytes,
+            sizeof=_doc_size,
+        )
+        self._l1_watch_task: Optional[asyncio.Task] = None
+
+    async def _find_cache_doc(
+        self,
+        db: AsyncIOMotorDatabase,
+        user_id: str,
+        habit_id: str,
+        fresh: bool = False,
+    ) -> Optional[dict]:
+        """
+        Servable cache document for a habit (not a default, not expired): from the L1, else from
+        Mongo (and then kept in the L1). With fresh, always from Mongo: for reads that must see
+        other workers' saves, which may not have reached this worker's L1 yet.
+        """
+        now = datetime.now(timezone.utc)
+        if settings.reflection_l1_enabled and not fresh:
+            cache_doc = self._l1.get((user_id, habit_id))
+            if cache_doc is not None:
+                expires_at = _aware(cache_doc.get("expiresAt"))
+                if expires_at is not None and expires_at > now:
+                    return cache_doc
+                self._l1.pop((user_id, habit_id))
+        cache_doc = await db[CACHE_COLLECTION].find_one(
+            {"userId": user_id, "habitId": habit_id, **_servable(now)}, _CACHE_DOC_FIELDS
+        )
+        if cache_doc is not None and settings.reflection_l1_enabled:
+            self._l1.set((user_id, habit_id), cache_doc)
+        return cache_doc
+
+    def l1_stats(self) -> dict:
+        """Size, memory and hit counters of the in-process L1, and whether the change stream runs."""
+        return {
+            "enabled": settings.reflection_l1_enabled,
+            "changeStream": self._l1_watch_task is not None and not self._l1_watch_task.done(),
+            **self._l1.stats(),
+        }
+
+    def _apply_change(self, change: dict) -> None:
+        """Keep the L1 coherent with a reflection_cache change event (from any worker)."""
+        operation = change.get("operationType")
+        if operation in ("insert", "update", "replace"):
+            doc = change.get("fullDocument")
+            if doc is None:
+                # Deleted again before the lookup; the delete event follows
+                return
+            key = (doc.get("userId"), doc.get("habitId"))
+            if doc.get("source") == SOURCE_DEFAULT:
+                self._l1.pop(key)
+            # Refresh entries this worker holds; don't fill the L1 with other users' writes
+            elif key in self._l1:
+                self._l1.set(key, {field: doc.get(field) for field in ("_id", *_CACHE_DOC_FIELDS)})
+        elif operation == "delete":
+            doc_id = (change.get("documentKey") or {}).get("_id")
+            self._l1.pop_matching(lambda cache_doc: cache_doc.get("_id") == doc_id)
+        elif operation in ("drop", "rename", "dropDatabase", "invalidate"):
+            self._l1.clear()
+
+    async def _watch_changes(self, get_db) -> None:
+        """Apply reflection_cache change events to the L1; restarts (with an empty L1) after errors."""
+        while True:
+            try:
+                async with get_db()[CACHE_COLLECTION].watch(full_document="updateLookup") as stream:
+                    # Events missed while (re)connecting are unknown: start from an empty L1
+                    self._l1.clear()
+                    logger.info("Reflection L1 change stream started")
+                    async for change in stream:
+                        self._apply_change(change)
+            except asyncio.CancelledError:
+                raise
+            except OperationFailure as e:
+                if e.code == _CHANGE_STREAM_UNSUPPORTED:
+                    logger.warning("Reflection L1 change stream needs a replica set; relying on REFLECTION_L1_TTL_SECONDS")
+                    return
+                logger.warning(f"Reflection L1 change stream failed, restarting: {e}")
+            except Exception as e:
+                logger.warning(f"Reflection L1 change stream failed, restarting: {e}")
+            self._l1.clear()
+            await asyncio.sleep(5.0)
+
+    def start_l1_invalidation(self, get_db) -> None:
+        """Start the change stream that keeps this worker's L1 coherent (app startup)."""
+        if not (settings.reflection_l1_enabled and settings.reflection_l1_change_stream):
+            return
+        if self._l1_watch_task is None:
+            self._l1_watch_task = asyncio.create_task(self._watch_changes(get_db))
+
+    async def stop_l1_invalidation(self) -> None:
+        """Stop the change stream task (app shutdown)."""
+        if self._l1_watch_task is not None:
+            self._l1_watch_task.cancel()
+            try:
+                await self._l1_watch_task
+            except asyncio.CancelledError:
+                pass
+            self._l1_watch_task = None
+
+    async def _read_cache(
+        self,
+        db: AsyncIOMotorDatabase,
+        user_id: str,
+        habit_id: str,
+        fingerprint: str,
+        fresh: bool = False,
+    ) -> Optional[tuple[dict, bool]]:
+        """
+        Cached reflection items and whether they are stale, or None if there is no usable entry
+        (missing, generated from different inputs, expired or a cached default; the last two are
+        excluded by the query). Stale: older than the soft TTL, incomplete (complete=False), or
+        written before fingerprints existed. With fresh, the entry is read from Mongo
+        (_find_cache_doc); an L1 entry for other inputs is also re-checked there, since another
+        worker may already have saved the entry for the current ones.
+        """
+        from_l1 = settings.reflection_l1_enabled and not fresh and (user_id, habit_id) in self._l1
+        cache_doc = await self._find_cache_doc(db, user_id, habit_id, fresh)
+
+        if not cache_doc:
+            logger.debug(f"No cache found for user={user_id}, habit={habit_id}")
+            return None
+
+        stored_fingerprint = cache_doc.get("inputFingerprint")
+        if stored_fingerprint is not None and stored_fingerprint != fingerprint:
+            if from_l1:
+                return await self._read_cache(db, user_id, habit_id, fingerprint, fresh=True)
+            self._generation_stats["inputsChanged"] += 1
+            logger.debug(f"Cache inputs changed for user={user_id}, habit={habit_id}")
+            return None
+
+        age_seconds = 0.0
+        cached_at = _aware(cache_doc.get("cachedAt"))
+        if cached_at:
+            age_seconds = (datetime.now(timezone.utc) - cached_at).total_seconds()
+
+        cached_data = cache_doc.get("data")
+        if not cached_data:
+            return None
+        stale = (
+            stored_fingerprint is None
+            or cache_doc.get("complete") is False
+            or age_seconds > settings.reflection_cache_soft_ttl_seconds
+        )
+        return cached_data, stale
+
+    async def _inputs(self, db: AsyncIOMotorDatabase, user_id: str, habit_id: str) -> tuple[dict, dict]:
+        """Habit context and streak data the reflection prompt is built from."""
+        return await asyncio.gather(
+            habit_service.get_habit_context(db, user_id, habit_id),
+            self._streak_data(db, user_id, habit_id),
+        )
+
     async def get_cached_reflection(
         self,
         db: AsyncIOMotorDatabase,
@@ -69,77 +326,317 @@ class ReflectionCacheService:
         habit_id: str,
     ) -> Optional[dict]:
         """
-        Get cached reflection items if available and not expired.
-        Returns None if no cache or cache is stale.
+        Get cached reflection items if available, generated from the current inputs and fresh
+        (within the soft TTL). Returns None if no cache or cache is stale.
         """
         try:
-            cache_doc = await db[CACHE_COLLECTION].find_one({
-                "userId": user_id,
-                "habitId": habit_id,
-            })
-            
-            if not cache_doc:
-                logger.debug(f"No cache found for user={user_id}, habit={habit_id}")
+            habit_context, streak_data = await self._inputs(db, user_id, habit_id)
+            fingerprint = reflection_input_fingerprint(habit_context, streak_data)
+            cached = await self._read_cache(db, user_id, habit_id, fingerprint)
+            if not cached:
+                return None
+            cached_data, stale = cached
+            if stale:
+                logger.debug(f"Cache stale for user={user_id}, habit={habit_id}")
                 return None
-            
-            # Check if cache is still fresh
-            cached_at = cache_doc.get("cachedAt")
-            if cached_at:
-                # Ensure cached_at is timezone-aware (MongoDB may return naive datetime)
-                if cached_at.tzinfo is None:
-                    cached_at = cached_at.replace(tzinfo=timezone.utc)
-                age_seconds = (datetime.now(timezone.utc) - cached_at).total_seconds()
-                if age_seconds > CACHE_TTL_SECONDS:
-                    logger.debug(f"Cache expired (age={age_seconds:.0f}s) for user={user_id}, habit={habit_id}")
-                    return None
-            
-            # Skip cached defaults (from previous failures) - detect by known default text
-            cached_data = cache_doc.get("data")
-            if cached_data:
-                insights = cached_data.get("insights", [])
-                if insights and len(insights) == 1 and insights[0].get("text") == "Small steps add up. Keep showing up.":
-                    logger.debug(f"Cache contains default data, treating as miss for user={user_id}, habit={habit_id}")
-                    # Delete stale default from cache
-                    await db[CACHE_COLLECTION].delete_one({"userId": user_id, "habitId": habit_id})
-                    return None
-            
             logger.info(f"Cache hit for reflection items: user={user_id}, habit={habit_id}")
             return cached_data
-            
+
         except Exception as e:
             logger.warning(f"Error reading reflection cache: {e}")
             return None
 
+    async def get_reflection_items(
+        self,
+        db: AsyncIOMotorDatabase,
+        user_id: str,
+        habit_id: str,
+    ) -> Optional[dict]:
+        """
+        Reflection items for the Reflection page (stale-while-revalidate).
+
+        Entries are only used if generated from the current habit context and streak. Fresh:
+        returned as is. Stale but within the hard TTL: returned immediately and a background
+        refresh is scheduled (one per habit at a time). Nothing usable cached: generated now with
+        the direct LLM at interactive priority.
+        Returns None if the habit does not exist.
+        """
+        habit_context, streak_data = await self._inputs(db, user_id, habit_id)
+        if not habit_context:
+            return None
+        fingerprint = reflection_input_fingerprint(habit_context, streak_data)
+
+        try:
+            cached = await self._read_cache(db, user_id, habit_id, fingerprint)
+        except Exception as e:
+            logger.warning(f"Error reading reflection cache: {e}")
+            cached = None
+
+        if cached:
+            cached_data, stale = cached
+            if not stale:
+                self._generation_stats["servedFresh"] += 1
+                logger.info(f"Cache hit for reflection items: user={user_id}, habit={habit_id}")
+                return cached_data
+            self._generation_stats["servedStale"] += 1
+            logger.info(f"Serving stale reflection items, refreshing: user={user_id}, habit={habit_id}")
+            await trigger_background_reflection_generation(db, user_id, habit_id)
+            return cached_data
+
+        self._generation_stats["servedMiss"] += 1
+        return await self._generate_for_request(db, user_id, habit_id, habit_context, streak_data, fingerprint)
+
+    async def _streak_data(self, db: AsyncIOMotorDatabase, user_id: str, habit_id: str) -> dict:
+        """Streak fields used by the reflection prompt."""
+        return self._streak_fields(await streak_service.get_streak_by_id(db, user_id, habit_id))
+
+    @staticmethod
+    def _streak_fields(streak) -> dict:
+        """Prompt fields of a StreakResponse."""
+        return {
+            "currentStreak": streak.currentStreak,
+            "longestStreak": streak.longestStreak,
+            "totalStones": getattr(streak, "totalStones", streak.longestStreak),
+            "lastCheckInDate": str(streak.lastCheckInDate) if streak.lastCheckInDate else None,
+        }
+
+    async def _generate_for_request(
+        self,
+        db: AsyncIOMotorDatabase,
+        user_id: str,
+        habit_id: str,
+        habit_context: dict,
+        streak_data: dict,
+        fingerprint: str,
+    ) -> dict:
+        """
+        Cache miss while the user waits. Takes the habit's generation lease; if another worker
+        holds it, polls the cache for that worker's result and retries the lease (free again
+        once released or expired). Waits at most REFLECTION_LEASE_WAIT_SECONDS: the holder may
+        have crashed, or be refreshing for other inputs than this request's; after that, and
+        without Mongo leases working, generates directly.
+        """
+        key = _lease_key(user_id, habit_id)
+        deadline = time.monotonic() + settings.reflection_lease_wait_seconds
+        while True:
+            try:
+                token = await generation_lease.acquire(db, key, settings.reflection_lease_ttl_seconds)
+            except Exception as e:
+                logger.warning(f"Generation lease unavailable, generating without it: {e}")
+                return await self._generate_and_save_for_request(
+                    db, user_id, habit_id, habit_context, streak_data, fingerprint
+                )
+
+            if token is not None:
+                try:
+                    # Another worker may have finished between our cache read and the lease
+                    try:
+                        cached = await self._read_cache(db, user_id, habit_id, fingerprint, fresh=True)
+                    except Exception as e:
+                        logger.warning(f"Error reading reflection cache: {e}")
+                        cached = None
+                    if cached:
+                        self._generation_stats["leaseWaitHits"] += 1
+                        return cached[0]
+                    return await self._generate_and_save_for_request(
+                        db, user_id, habit_id, habit_context, streak_data, fingerprint
+                    )
+                finally:
+                    await generation_lease.release(db, key, token)
+
+            # Someone else is generating: wait for their result
+            await asyncio.sleep(settings.reflection_lease_poll_interval_seconds)
+            try:
+                cached = await self._read_cache(db, user_id, habit_id, fingerprint, fresh=True)
+            except Exception as e:
+                logger.warning(f"Error reading reflection cache: {e}")
+                cached = None
+            if cached:
+                self._generation_stats["leaseWaitHits"] += 1
+                logger.info(f"Served reflection items generated by another worker: user={user_id}, habit={habit_id}")
+                return cached[0]
+            if time.monotonic() >= deadline:
+                self._generation_stats["leaseWaitTimeouts"] += 1
+                logger.warning(
+                    f"Gave up waiting for another worker's reflection generation, generating without the lease: "
+                    f"user={user_id}, habit={habit_id}"
+                )
+                return await self._generate_and_save_for_request(
+                    db, user_id, habit_id, habit_context, streak_data, fingerprint
+                )
+
+    async def _generate_and_save_for_request(
+        self,
+        db: AsyncIOMotorDatabase,
+        user_id: str,
+        habit_id: str,
+        habit_context: dict,
+        streak_data: dict,
+        fingerprint: str,
+    ) -> dict:
+        """Direct LLM (no agent), default payload on failure; result is validated and cached."""
+        try:
+            # Compact wire format from the LLM, expanded to the response shape
+            from app.services.llm_service import llm_service
+            raw = await llm_service.generate_json(
+                get_reflection_items_prompt(habit_context, streak_data),
+                max_tokens=REFLECTION_ITEMS_MAX_TOKENS,
+                schema=CompactReflectionItems,
+                prompt_name="reflection_items",
+            )
+            data = expand_reflection_items(raw, habit_context)
+            return await self._validate_and_save(
+                db, user_id, habit_id, data, habit_context, streak_data, fingerprint, SOURCE_LLM,
+                priority=PRIORITY_INTERACTIVE,
+            )
+        except Exception as llm_err:
+            logger.warning(
+                "LLM reflection failed (%s); using default reflection payload",
+                llm_err,
+            )
+            data = DEFAULT_REFLECTION_DATA.copy()
+
+        # Record the default (never served, so the next request retries the LLM)
+        await self.save_cached_reflection(db, user_id, habit_id, data, fingerprint, SOURCE_DEFAULT)
+        return data
+
+    async def _complete_items(
+        self,
+        data: dict,
+        habit_context: dict,
+        streak_data: dict,
+        priority: str = PRIORITY_BACKGROUND,
+    ) -> tuple[dict, bool]:
+        """
+        Validated items and whether they are complete (all three experiment levers). Missing or
+        invalid experiments are generated by one small repair call for just those levers rather
+        than regenerating the whole payload. Raises ValueError if the items do not validate at all.
+        """
+        items, missing = check_reflection_items(data)
+        if not missing:
+            return items, True
+        logger.info(f"Reflection items lack experiments {missing}; repairing")
+        try:
+            from app.services.llm_service import llm_service
+            raw = await llm_service.generate_json(
+                get_reflection_experiment_repair_prompt(
+                    habit_context, streak_data, missing, items["experimentSuggestions"]
+                ),
+                max_tokens=REFLECTION_EXPERIMENT_REPAIR_MAX_TOKENS,
+                priority=priority,
+                schema=CompactExperiments,
+                prompt_name="reflection_experiment_repair",
+            )
+            items, missing = check_reflection_items(add_experiments(items, raw, habit_context))
+        except Exception as e:
+            logger.warning(f"Reflection experiment repair failed: {e}")
+        if missing:
+            self._generation_stats["repairFailed"] += 1
+            return items, False
+        self._generation_stats["repaired"] += 1
+        return items, True
+
+    async def _validate_and_save(
+        self,
+        db: AsyncIOMotorDatabase,
+        user_id: str,
+        habit_id: str,
+        data: dict,
+        habit_context: dict,
+        streak_data: dict,
+        fingerprint: str,
+        source: str,
+        priority: str = PRIORITY_BACKGROUND,
+    ) -> dict:
+        """
+        Validate (and if needed repair) generated items, then cache them; items still incomplete
+        are cached with complete=False. Returns the saved items. Raises ValueError, caching
+        nothing, if the items do not validate at all.
+        """
+        try:
+            items, complete = await self._complete_items(data, habit_context, streak_data, priority)
+        except ValueError:
+            self._generation_stats["invalid"] += 1
+            raise
+        await self.save_cached_reflection(db, user_id, habit_id, items, fingerprint, source, complete)
+        return items
+
     async def save_cached_reflection(
         self,
         db: AsyncIOMotorDatabase,
         user_id: str,
         habit_id: str,
         data: dict,
+        fingerprint: Optional[str] = None,
+        source: str = SOURCE_LLM,
+        complete: bool = True,
     ) -> bool:
         """
-        Save reflection items to cache.
+        Save reflection items to cache, stamped with the fingerprint of the inputs they were
+        generated from (reflection_input_fingerprint) and their source (agent / llm / default).
+        expiresAt is cachedAt + the hard TTL (DEFAULT_ENTRY_TTL_SECONDS for defaults). Incomplete
+        items (complete=False, see _complete_items) are served but always refreshed.
         Returns True if saved successfully.
         """
+        now = datetime.now(timezone.utc)
+        ttl = DEFAULT_ENTRY_TTL_SECONDS if source == SOURCE_DEFAULT else settings.reflection_cache_hard_ttl_seconds
         try:
-            await db[CACHE_COLLECTION].update_one(
+            cache_doc = await db[CACHE_COLLECTION].find_one_and_update(
                 {"userId": user_id, "habitId": habit_id},
                 {
                     "$set": {
                         "userId": user_id,
                         "habitId": habit_id,
                         "data": data,
-                        "cachedAt": datetime.now(timezone.utc),
+                        "inputFingerprint": fingerprint,
+                        "source": source,
+                        "complete": complete,
+                        "cachedAt": now,
+                        "expiresAt": now + timedelta(seconds=ttl),
                     }
                 },
+                projection=_CACHE_DOC_FIELDS,
                 upsert=True,
+                return_document=ReturnDocument.AFTER,
             )
+            if source == SOURCE_DEFAULT:
+                self._l1.pop((user_id, habit_id))
+            elif settings.reflection_l1_enabled:
+                self._l1.set((user_id, habit_id), cache_doc)
             logger.info(f"Cached reflection items for user={user_id}, habit={habit_id}")
             return True
         except Exception as e:
             logger.error(f"Error saving reflection cache: {e}")
             return False
 
+    async def backfill_entry_metadata(self, db: AsyncIOMotorDatabase) -> None:
+        """
+        Give entries written before source/expiresAt existed both fields, so the TTL index and the
+        read filter cover them: old cached defaults (recognised by their text) become
+        source=default and expire now, other entries expire at cachedAt + the hard TTL.
+        Idempotent; run at startup.
+        """
+        now = datetime.now(timezone.utc)
+        collection = db[CACHE_COLLECTION]
+        defaults = await collection.update_many(
+            {
+                "source": {"$exists": False},
+                "data.insights": {"$size": 1},
+                "data.insights.0.text": DEFAULT_REFLECTION_DATA["insights"][0]["text"],
+            },
+            {"$set": {"source": SOURCE_DEFAULT, "expiresAt": now}},
+        )
+        dated = await collection.update_many(
+            {"expiresAt": {"$exists": False}, "cachedAt": {"$type": "date"}},
+            [{"$set": {"expiresAt": {"$add": ["$cachedAt", settings.reflection_cache_hard_ttl_seconds * 1000]}}}],
+        )
+        undated = await collection.update_many({"expiresAt": {"$exists": False}}, {"$set": {"expiresAt": now}})
+        if defaults.modified_count or dated.modified_count or undated.modified_count:
+            logger.info(
+                f"Backfilled reflection cache metadata: {defaults.modified_count} default(s), "
+                f"{dated.modified_count + undated.modified_count} expiry date(s)"
+            )
+
     async def invalidate_cache(
         self,
         db: AsyncIOMotorDatabase,
@@ -150,6 +647,7 @@ class ReflectionCacheService:
         Invalidate (delete) cached reflection for a habit.
         Called before generating new reflection data.
         """
+        self._l1.pop((user_id, habit_id))
         try:
             result = await db[CACHE_COLLECTION].delete_one({
                 "userId": user_id,
@@ -162,71 +660,195 @@ class ReflectionCacheService:
             logger.warning(f"Error invalidating reflection cache: {e}")
             return False
 
+    async def _generate_with_agent(self, habit_context: dict, streak_data: dict) -> dict:
+        """Reflection items from the LangChain ReAct agent (raises on failure)."""
+        from app.services.reflection_agent_service import (
+            generate_reflection_items_with_agent_async,
+        )
+        return await generate_reflection_items_with_agent_async(habit_context, streak_data)
+
+    async def _generate_with_llm(self, habit_context: dict, streak_data: dict) -> dict:
+        """Reflection items from a direct LLM call (raises on failure)."""
+        from app.services.llm_service import llm_service
+        prompt = get_reflection_items_prompt(habit_context, streak_data)
+        raw = await llm_service.generate_json(
+            prompt,
+            max_tokens=REFLECTION_ITEMS_MAX_TOKENS,
+            priority=PRIORITY_BACKGROUND,
+            schema=CompactReflectionItems,
+            prompt_name="reflection_items",
+        )
+        return expand_reflection_items(raw, habit_context)
+
+    @staticmethod
+    def _task_result(task: asyncio.Task, source: str) -> Optional[dict]:
+        """Result of a finished generation task, or None (logged) if it failed or returned nothing."""
+        if task.cancelled():
+            return None
+        err = task.exception()
+        if err is not None:
+            log = logger.debug if source == "agent" else logger.warning
+            log(f"Reflection generation via {source} failed: {err}")
+            return None
+        return task.result() or None
+
+    async def generate_reflection_items(
+        self,
+        habit_context: dict,
+        streak_data: dict,
+    ) -> tuple[Optional[dict], Optional[str]]:
+        """
+        Reflection items from the agent or the direct LLM, as (data, source) with source
+        "agent" or "llm"; (None, None) if both fail.
+
+        Hedged (default): the agent starts first; if it has not returned valid items after
+        REFLECTION_HEDGE_DELAY_SECONDS, the direct LLM call starts alongside it. The first valid
+        result wins and the other call is cancelled. Otherwise agent, then LLM, one after the other.
+        """
+        if not settings.reflection_hedge_enabled:
+            try:
+                data = await self._generate_with_agent(habit_context, streak_data)
+                if data:
+                    self._generation_stats["agent"] += 1
+                    return data, "agent"
+            except Exception as agent_err:
+                logger.debug(f"Agent unavailable in background task: {agent_err}")
+            try:
+                data = await self._generate_with_llm(habit_context, streak_data)
+                if data:
+                    self._generation_stats["llm"] += 1
+                    return data, "llm"
+            except Exception as llm_err:
+                logger.warning("LLM reflection failed in background: %s", llm_err)
+            self._generation_stats["failed"] += 1
+            return None, None
+
+        sources: dict[asyncio.Task, str] = {}
+        agent_task = asyncio.create_task(self._generate_with_agent(habit_context, streak_data))
+        sources[agent_task] = "agent"
+        try:
+            done, _ = await asyncio.wait({agent_task}, timeout=max(0.0, settings.reflection_hedge_delay_seconds))
+            if agent_task in done:
+                data = self._task_result(agent_task, "agent")
+                if data:
+                    self._generation_stats["agent"] += 1
+                    return data, "agent"
+            else:
+                self._generation_stats["hedged"] += 1
+            llm_task = asyncio.create_task(self._generate_with_llm(habit_context, streak_data))
+            sources[llm_task] = "llm"
+            pending = {task for task in sources if not task.done()}
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    data = self._task_result(task, sources[task])
+                    if data:
+                        self._generation_stats[sources[task]] += 1
+                        return data, sources[task]
+            self._generation_stats["failed"] += 1
+            return None, None
+        finally:
+            # Cancel the loser (or both, if we were cancelled ourselves)
+            for task in sources:
+                if not task.done():
+                    task.cancel()
+                    self._generation_stats["cancelled"] += 1
+
+    def generation_stats(self) -> dict:
+        """
+        Winner counts of reflection generation (agent / llm / failed), hedges started, losers
+        cancelled, Reflection page reads by cache state, background refreshes skipped because another
+        worker held the lease, misses served by another worker (and those that stopped waiting for
+        it), and multi-habit calls with the habits they covered and the habits queued for their own
+        generation after them.
+        """
+        return dict(self._generation_stats)
+
     async def generate_and_cache_reflection(
         self,
         db: AsyncIOMotorDatabase,
         user_id: str,
         habit_id: str,
+        raise_errors: bool = False,
     ) -> Optional[dict]:
         """
         Generate reflection items via LLM and cache them.
-        This is the main background task entry point.
-        Returns the generated data or None on failure.
+        This is the main background job entry point (REFLECTION_JOB).
+        Returns the generated data or None on failure; with raise_errors, a failed generation
+        raises instead (so the job queue retries it).
         """
         try:
-            # Get habit context
-            habit_context = await habit_service.get_habit_context(db, user_id, habit_id)
+            # Get habit context and streak data
+            habit_context, streak_data = await self._inputs(db, user_id, habit_id)
             if not habit_context:
                 logger.warning(f"Cannot generate reflection: habit not found for user={user_id}, habit={habit_id}")
                 return None
+            fingerprint = reflection_input_fingerprint(habit_context, streak_data)
 
-            # Get streak data
-            streak = await streak_service.get_streak_by_id(db, user_id, habit_id)
-            streak_data = {
-                "currentStreak": streak.currentStreak,
-                "longestStreak": streak.longestStreak,
-                "totalStones": getattr(streak, "totalStones", streak.longestStreak),
-                "lastCheckInDate": str(streak.lastCheckInDate) if streak.lastCheckInDate else None,
-            }
-
-            # Try agent first, then direct LLM, then default (don't cache default)
-            data = None
-            
-            # Attempt 1: LangChain ReAct agent
+            # One generation per habit across workers: skip if another worker holds the lease
+            key = _lease_key(user_id, habit_id)
             try:
-                from app.services.reflection_agent_service import (
-                    generate_reflection_items_with_agent_async,
-                )
-                data = await generate_reflection_items_with_agent_async(habit_context, streak_data)
-                logger.info(f"Background reflection generated via agent for user={user_id}, habit={habit_id}")
-            except Exception as agent_err:
-                logger.debug(f"Agent unavailable in background task: {agent_err}")
-            
-            # Attempt 2: Direct LLM
-            if not data:
-                try:
-                    from app.services.llm_service import llm_service
-                    from app.utils.prompts import get_reflection_items_prompt
-                    prompt = get_reflection_items_prompt(habit_context, streak_data)
-                    data = await llm_service.generate_json(prompt, max_tokens=4096)
-                    logger.info(f"Background reflection generated via direct LLM for user={user_id}, habit={habit_id}")
-                except Exception as llm_err:
-                    logger.warning("LLM reflection failed in background: %s", llm_err)
-            
-            # Only cache real LLM data (not defaults)
+                token = await generation_lease.acquire(db, key, settings.reflection_lease_ttl_seconds)
+            except Exception as e:
+                logger.warning(f"Generation lease unavailable, generating without it: {e}")
+                token = ""
+            if token is None:
+                self._generation_stats["leaseSkipped"] += 1
+                logger.info(f"Reflection generation already running on another worker: user={user_id}, habit={habit_id}")
+                return None
+
+            try:
+                # Another worker may have just refreshed it for the same inputs
+                cached = await self._read_cache(db, user_id, habit_id, fingerprint, fresh=True)
+                if cached and not cached[1]:
+                    self._generation_stats["leaseSkipped"] += 1
+                    return cached[0]
+                # Agent and direct LLM (hedged or sequential), then default (don't cache default)
+                data, source = await self.generate_reflection_items(habit_context, streak_data)
+                # Only cache real LLM data (not defaults), validated and repaired
+                if data:
+                    try:
+                        data = await self._validate_and_save(
+                            db, user_id, habit_id, data, habit_context, streak_data, fingerprint, source
+                        )
+                    except ValueError as e:
+                        logger.warning(f"Generated reflection items invalid, not cached: {e}")
+                        data = None
+            finally:
+                if token:
+                    await generation_lease.release(db, key, token)
+
             if data:
-                await self.save_cached_reflection(db, user_id, habit_id, data)
+                logger.info(f"Background reflection generated via {source} for user={user_id}, habit={habit_id}")
                 return data
             
             # Return default but do NOT cache it (so next request retries LLM)
             logger.warning("Both agent and LLM failed; returning default (not cached)")
+            if raise_errors:
+                raise RuntimeError("Both agent and LLM failed")
             return DEFAULT_REFLECTION_DATA.copy()
 
         except Exception as e:
+            if raise_errors:
+                raise
             logger.error(f"Background reflection generation failed: {e}", exc_info=True)
             return None
 
 
+    @staticmethod
+    def _is_fresh_doc(cache_doc: Optional[dict], fingerprint: str) -> bool:
+        """
+        Cache document (cachedAt, inputFingerprint, complete) matches the inputs, is complete and
+        is within the soft TTL.
+        """
+        if not cache_doc or cache_doc.get("complete") is False:
+            return False
+        cached_at = cache_doc.get("cachedAt")
+        if not cached_at or cache_doc.get("inputFingerprint") != fingerprint:
+            return False
+        age_seconds = (datetime.now(timezone.utc) - _aware(cached_at)).total_seconds()
+        return age_seconds <= settings.reflection_cache_soft_ttl_seconds
+
     async def is_cache_fresh(
         self,
         db: AsyncIOMotorDatabase,
@@ -234,29 +856,203 @@ class ReflectionCacheService:
         habit_id: str,
     ) -> bool:
         """
-        Check if cache exists and is fresh (not expired).
-        Used to skip prefetch if cache is already good.
+        Check if cache exists, matches the current inputs and is fresh (within the soft TTL).
         """
         try:
             cache_doc = await db[CACHE_COLLECTION].find_one(
-                {"userId": user_id, "habitId": habit_id},
-                {"cachedAt": 1}
+                {"userId": user_id, "habitId": habit_id, **_servable(datetime.now(timezone.utc))},
+                {"cachedAt": 1, "inputFingerprint": 1, "complete": 1}
             )
             if not cache_doc:
                 return False
-            
-            cached_at = cache_doc.get("cachedAt")
-            if not cached_at:
-                return False
-            
-            if cached_at.tzinfo is None:
-                cached_at = cached_at.replace(tzinfo=timezone.utc)
-            
-            age_seconds = (datetime.now(timezone.utc) - cached_at).total_seconds()
-            return age_seconds <= CACHE_TTL_SECONDS
+            habit_context, streak_data = await self._inputs(db, user_id, habit_id)
+            return self._is_fresh_doc(cache_doc, reflection_input_fingerprint(habit_context, streak_data))
         except Exception:
             return False
 
+    async def _load_user_inputs(
+        self,
+        db: AsyncIOMotorDatabase,
+        user_id: str,
+        habit_ids: Optional[list[str]] = None,
+    ) -> tuple[int, list[tuple[str, dict, dict, str, Optional[dict]]]]:
+        """
+        Prompt inputs of a user's habits (all, or habit_ids) with one query each on habits,
+        streaks and reflection_cache. Returns the number of habits found and, per habit,
+        (habitId, habit context, streak data, input fingerprint, servable cache doc or None);
+        cache docs only carry cachedAt, inputFingerprint and complete.
+        """
+        query = {"userId": user_id}
+        if habit_ids is not None:
+            query["habitId"] = {"$in": habit_ids}
+        # Preferences are the prompt inputs
+        habits = await db.habits.find(query, {"habitId": 1, "preferences": 1}).to_list(length=None)
+        found_ids = [h["habitId"] for h in habits if h.get("habitId")]
+        if not found_ids:
+            return len(habits), []
+
+        streak_docs, cache_docs = await asyncio.gather(
+            db.streaks.find({"userId": user_id, "habitId": {"$in": found_ids}}).to_list(length=None),
+            db[CACHE_COLLECTION].find(
+                {"userId": user_id, "habitId": {"$in": found_ids}, **_servable(datetime.now(timezone.utc))},
+                {"habitId": 1, "cachedAt": 1, "inputFingerprint": 1, "complete": 1},
+            ).to_list(length=None),
+        )
+        streaks = {doc["habitId"]: doc for doc in streak_docs}
+        caches = {doc["habitId"]: doc for doc in cache_docs}
+
+        inputs = []
+        for habit_doc in habits:
+            habit_id = habit_doc.get("habitId")
+            if not habit_id:
+                continue
+            habit_context = habit_service.build_habit_context(habit_doc.get("preferences", {}))
+            streak_data = self._streak_fields(streak_service.build_streak_response(streaks.get(habit_id)))
+            fingerprint = reflection_input_fingerprint(habit_context, streak_data)
+            inputs.append((habit_id, habit_context, streak_data, fingerprint, caches.get(habit_id)))
+        return len(habits), inputs
+
+    async def _generate_batch_with_llm(self, entries: list[tuple[str, dict, dict]]) -> dict[str, dict]:
+        """
+        Reflection items for several habits, as (habitId, habit context, streak data), from one
+        direct LLM call. Returns habitId -> expanded items for the sections that are present and
+        valid (possibly none); raises if the call itself fails.
+        """
+        from app.services.llm_service import llm_service
+        raw = await llm_service.generate_json(
+            get_reflection_items_batch_prompt([(ctx, streak) for _, ctx, streak in entries]),
+            max_tokens=REFLECTION_ITEMS_MAX_TOKENS * len(entries),
+            priority=PRIORITY_BACKGROUND,
+            schema=CompactReflectionBatch,
+            prompt_name="reflection_items_batch",
+            # Answer length scales with the habits in the call: learn the budget per batch size
+            budget_key=f"reflection_items_batch:{len(entries)}",
+        )
+        self._generation_stats["batchCalls"] += 1
+
+        results: dict[str, dict] = {}
+        sections = raw.get("r") if isinstance(raw, dict) else None
+        for section in sections if isinstance(sections, list) else []:
+            if not isinstance(section, dict):
+                continue
+            n = section.get("n")
+            if not isinstance(n, int) or not 1 <= n <= len(entries):
+                continue
+            habit_id, habit_context, _ = entries[n - 1]
+            if habit_id in results:
+                continue
+            try:
+                results[habit_id] = expand_reflection_items(section, habit_context)
+            except ValueError as e:
+                logger.warning(f"Invalid section {n} in multi-habit reflection response: {e}")
+        return results
+
+    async def generate_reflections_batch(
+        self,
+        db: AsyncIOMotorDatabase,
+        user_id: str,
+        habit_ids: Optional[list[str]] = None,
+        raise_errors: bool = False,
+    ) -> dict:
+        """
+        Generate and cache reflection items for a user's habits (all, or habit_ids) that have no
+        fresh cache entry, with one multi-habit LLM call for the first REFLECTION_BATCH_MAX_HABITS
+        of them. This is the REFLECTION_BATCH_JOB entry point, and each job run stays within one
+        LLM call: further habits are queued as batch jobs of their own, and habits whose
+        section is missing or invalid (or whose batch call failed) are queued as per-habit
+        REFLECTION_JOBs, which take their own generation lease and retry on their own.
+        Generation leases are held only around the batch call; habits whose lease is held by
+        another worker are skipped. Each habit is saved as its own cache entry.
+        Returns counts of generated/fallback/deferred/skipped habits; with raise_errors, raises
+        if the follow-up jobs could not be queued (so the job queue retries this one).
+        """
+        counts = {"generated": 0, "fallback": 0, "deferred": 0, "skipped": 0}
+        _, inputs = await self._load_user_inputs(db, user_id, habit_ids)
+        stale = []
+        for habit_id, habit_context, streak_data, fingerprint, cache_doc in inputs:
+            if self._is_fresh_doc(cache_doc, fingerprint):
+                counts["skipped"] += 1
+            else:
+                stale.append((habit_id, habit_context, streak_data, fingerprint))
+
+        size = max(1, settings.reflection_batch_max_habits) if settings.reflection_batch_enabled else 1
+        if size == 1:
+            # Nothing to batch: every habit goes straight to its own job
+            chunk, rest = [], []
+            fallback_ids = [habit_id for habit_id, _, _, _ in stale]
+        else:
+            chunk, rest = stale[:size], stale[size:]
+            fallback_ids = [habit_id for habit_id, _, _, _ in chunk] if len(chunk) == 1 else []
+
+        # One generation per habit across workers, as in generate_and_cache_reflection
+        leased = []
+        if len(chunk) > 1:
+            for habit_id, habit_context, streak_data, fingerprint in chunk:
+                try:
+                    token = await generation_lease.acquire(
+                        db, _lease_key(user_id, habit_id), settings.reflection_lease_ttl_seconds
+                    )
+                except Exception as e:
+                    logger.warning(f"Generation lease unavailable, generating without it: {e}")
+                    token = ""
+                if token is None:
+                    self._generation_stats["leaseSkipped"] += 1
+                    counts["skipped"] += 1
+                    continue
+                leased.append((habit_id, habit_context, streak_data, fingerprint, token))
+
+        try:
+            results: dict[str, dict] = {}
+            if len(leased) > 1:
+                try:
+                    results = await self._generate_batch_with_llm(
+                        [(habit_id, ctx, streak) for habit_id, ctx, streak, _, _ in leased]
+                    )
+                except Exception as e:
+                    logger.warning(f"Multi-habit reflection generation failed, queueing per-habit jobs: {e}")
+                self._generation_stats["batchHabits"] += len(results)
+
+            for habit_id, habit_context, streak_data, fingerprint, _ in leased:
+                data = results.get(habit_id)
+                if data:
+                    try:
+                        await self._validate_and_save(
+                            db, user_id, habit_id, data, habit_context, streak_data, fingerprint, SOURCE_LLM
+                        )
+                        counts["generated"] += 1
+                        continue
+                    except ValueError as e:
+                        logger.warning(f"Generated reflection items invalid, not cached: {e}")
+                if len(leased) > 1:
+                    self._generation_stats["batchFallbacks"] += 1
+                fallback_ids.append(habit_id)
+        finally:
+            for habit_id, _, _, _, token in leased:
+                if token:
+                    await generation_lease.release(db, _lease_key(user_id, habit_id), token)
+
+        # Queued after the leases are released, so the per-habit jobs can take them
+        jobs = [
+            ({"userId": user_id, "habitId": habit_id}, f"{REFLECTION_JOB}:{user_id}:{habit_id}")
+            for habit_id in fallback_ids
+        ]
+        follow_ups = []
+        for i in range(0, len(rest), size):
+            ids = [habit_id for habit_id, _, _, _ in rest[i:i + size]]
+            follow_ups.append(({"userId": user_id, "habitIds": ids}, f"{REFLECTION_BATCH_JOB}:{user_id}:{ids[0]}"))
+        try:
+            await job_queue.enqueue_many(db, REFLECTION_JOB, jobs, delay_seconds=0.5)
+            await job_queue.enqueue_many(db, REFLECTION_BATCH_JOB, follow_ups, delay_seconds=0.5)
+        except Exception as e:
+            if raise_errors:
+                raise
+            logger.warning(f"Could not queue follow-up reflection generation: {e}")
+        counts["fallback"] += len(fallback_ids)
+        counts["deferred"] += len(rest)
+
+        logger.info(f"Batch reflection generation for user={user_id}: {counts}")
+        return counts
+
     async def prefetch_all_user_reflections(
         self,
         db: AsyncIOMotorDatabase,
@@ -265,33 +1061,35 @@ class ReflectionCacheService:
         """
         Prefetch reflections for all user habits that don't have fresh cache.
         Called on Home page load to warm up cache.
+        Freshness of all habits is resolved with one query each on habits, streaks and
+        reflection_cache (_load_user_inputs). With REFLECTION_BATCH_ENABLED and more than one
+        stale habit, a single per-user batch job generates them a few habits per LLM call;
+        otherwise stale habits are queued as per-habit jobs in one bulk write.
         Returns dict with counts of triggered/skipped habits.
         """
         triggered = 0
         skipped = 0
         
         try:
-            # Get all habits for user
-            habits_cursor = db.habits.find({"userId": user_id}, {"habitId": 1})
-            habits = await habits_cursor.to_list(length=None)
-            
-            for habit_doc in habits:
-                habit_id = habit_doc.get("habitId")
-                if not habit_id:
-                    continue
-                
-                # Check if cache is fresh
-                is_fresh = await self.is_cache_fresh(db, user_id, habit_id)
-                if is_fresh:
+            total, inputs = await self._load_user_inputs(db, user_id)
+            stale_ids = []
+            for habit_id, _, _, fingerprint, cache_doc in inputs:
+                if self._is_fresh_doc(cache_doc, fingerprint):
                     skipped += 1
                     logger.debug(f"Prefetch skipped (fresh cache): user={user_id}, habit={habit_id}")
                 else:
-                    # Trigger background generation
-                    trigger_background_reflection_generation(db, user_id, habit_id)
-                    triggered += 1
-                    logger.info(f"Prefetch triggered: user={user_id}, habit={habit_id}")
+                    stale_ids.append(habit_id)
+
+            # Trigger background generation for all stale habits at once
+            if stale_ids:
+                if settings.reflection_batch_enabled and len(stale_ids) > 1:
+                    await trigger_background_reflection_batch(db, user_id)
+                else:
+                    await trigger_background_reflection_generation_many(db, user_id, stale_ids)
+                triggered = len(stale_ids)
+                logger.info(f"Prefetch triggered: user={user_id}, habits={stale_ids}")
             
-            return {"triggered": triggered, "skipped": skipped, "total": len(habits)}
+            return {"triggered": triggered, "skipped": skipped, "total": total}
         except Exception as e:
             logger.error(f"Error prefetching reflections: {e}")
             return {"triggered": triggered, "skipped": skipped, "error": str(e)}
@@ -300,31 +1098,93 @@ class ReflectionCacheService:
 # Singleton instance
 reflection_cache_service = ReflectionCacheService()
 
+# Job type for background reflection generation (payload: userId, habitId)
+REFLECTION_JOB = "reflection_generation"
+
+
+async def _run_reflection_job(db: AsyncIOMotorDatabase, payload: dict) -> None:
+    await reflection_cache_service.generate_and_cache_reflection(
+        db, payload["userId"], payload["habitId"], raise_errors=True
+    )
+
+
+job_queue.register(REFLECTION_JOB, _run_reflection_job)
 
-def trigger_background_reflection_generation(
+# Job type for multi-habit generation (payload: userId, optional habitIds; stale habits are
+# resolved when it runs)
+REFLECTION_BATCH_JOB = "reflection_batch"
+
+
+async def _run_reflection_batch_job(db: AsyncIOMotorDatabase, payload: dict) -> None:
+    await reflection_cache_service.generate_reflections_batch(
+        db, payload["userId"], payload.get("habitIds"), raise_errors=True
+    )
+
+
+job_queue.register(REFLECTION_BATCH_JOB, _run_reflection_batch_job)
+
+
+async def trigger_background_reflection_generation(
     db: AsyncIOMotorDatabase,
     user_id: str,
     habit_id: str,
+    debounce: bool = False,
 ) -> None:
     """
-    Fire-and-forget background task to generate and cache reflection items.
-    Called after successful check-in.
+    Queue a background job to generate and cache reflection items.
+    Called after successful check-in, on prefetch and when a stale entry is served.
+    A job already queued for the habit absorbs the trigger. With debounce (check-ins and
+    backfills), each trigger also resets that job's timer to REFLECTION_CHECKIN_DEBOUNCE_SECONDS,
+    so a burst of check-ins runs one generation, on the latest data, after the burst.
+    Never raises.
     """
-    async def _run():
-        try:
-            # Small delay to let the check-in transaction complete
-            await asyncio.sleep(0.5)
-            await reflection_cache_service.generate_and_cache_reflection(db, user_id, habit_id)
-        except Exception as e:
-            logger.error(f"Background reflection task error: {e}")
+    try:
+        await job_queue.enqueue(
+            db,
+            REFLECTION_JOB,
+            {"userId": user_id, "habitId": habit_id},
+            dedupe_key=f"{REFLECTION_JOB}:{user_id}:{habit_id}",
+            # Debounce check-in bursts; otherwise a small delay to let the check-in transaction complete
+            delay_seconds=settings.reflection_checkin_debounce_seconds if debounce else 0.5,
+            debounce=debounce,
+        )
+    except Exception as e:
+        logger.warning(f"Could not queue background reflection generation: {e}")
+
+
+async def trigger_background_reflection_generation_many(
+    db: AsyncIOMotorDatabase,
+    user_id: str,
+    habit_ids: list[str],
+) -> None:
+    """Queue background generation for several habits of a user in one bulk write. Never raises."""
+    try:
+        await job_queue.enqueue_many(
+            db,
+            REFLECTION_JOB,
+            [
+                ({"userId": user_id, "habitId": habit_id}, f"{REFLECTION_JOB}:{user_id}:{habit_id}")
+                for habit_id in habit_ids
+            ],
+            delay_seconds=0.5,
+        )
+    except Exception as e:
+        logger.warning(f"Could not queue background reflection generation: {e}")
+
 
-    # Schedule the coroutine to run in the background
+async def trigger_background_reflection_batch(db: AsyncIOMotorDatabase, user_id: str) -> None:
+    """
+    Queue one job generating all of a user's stale habits (generate_reflections_batch, which
+    queues follow-up jobs for habits beyond its first call).
+    A batch job already queued for the user absorbs the trigger. Never raises.
+    """
     try:
-        loop = asyncio.get_event_loop()
-        if loop.is_running():
-            asyncio.create_task(_run())
-        else:
-            # Fallback if no running loop (shouldn't happen in FastAPI)
-            loop.run_until_complete(_run())
+        await job_queue.enqueue(
+            db,
+            REFLECTION_BATCH_JOB,
+            {"userId": user_id},
+            dedupe_key=f"{REFLECTION_BATCH_JOB}:{user_id}",
+            delay_seconds=0.5,
+        )
     except Exception as e:
-        logger.warning(f"Could not schedule background reflection generation: {e}")
+        logger.warning(f"Could not queue background reflection generation: {e}")
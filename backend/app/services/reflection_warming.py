@@ -0,0 +1,242 @@
+"""
+Nightly, activity-aware warming of the reflection cache.
+
+Once a night, at the start of the off-peak window (REFLECTION_WARMING_START_HOUR, UTC), a
+durable planning job predicts when each recently active user will next open the Reflection page
+and queues batch generations (REFLECTION_BATCH_JOB) for everyone expected within the next day.
+The budget counts the habits that will actually be generated: every habit of the user (active
+or not) without a recent complete cache entry. Each job carries its habits explicitly, at most
+REFLECTION_BATCH_MAX_HABITS of them, so it makes one call and queues no follow-up chunks. Jobs
+are ordered by predicted visit and spread over the window at no more than
+REFLECTION_WARMING_MAX_HABITS_PER_HOUR habits, so the provider sees a steady trickle instead of
+a spike; users beyond the budget are left to the reactive paths (check-in, prefetch).
+
+Visit prediction: reflections are weekly, so the weekday is the most common weekday of the
+user's past reflections; the hour is the most common hour of past reflections, else of recent
+check-ins (checkInTimes). Without reflection history the visit is assumed within the day.
+The planning job re-queues itself for the next night; the dedupe key keeps one plan queued
+across all processes.
+"""
+import logging
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, Optional
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+from app.core.config import settings
+from app.services.job_queue import job_queue
+from app.services.reflection_cache_service import CACHE_COLLECTION, REFLECTION_BATCH_JOB, SOURCE_DEFAULT
+
+logger = logging.getLogger(__name__)
+
+# Job type of the nightly planning run (no payload)
+WARMING_PLAN_JOB = "reflection_warming_plan"
+
+# Past reflections considered per user (about half a year of weekly reflections)
+_REFLECTIONS_PER_USER = 26
+
+
+def _as_datetime(value) -> Optional[datetime]:
+    """UTC-aware datetime from a Mongo datetime or an ISO string (reflections store createdAt as ISO)."""
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            return None
+    if not isinstance(value, datetime):
+        return None
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def _most_common(values: Iterable[int]) -> Optional[int]:
+    """Most frequent value; ties go to the one seen first (callers pass most recent first)."""
+    counts = Counter(values)
+    return counts.most_common(1)[0][0] if counts else None
+
+
+def predict_next_visit(
+    check_in_times: list[datetime],
+    reflection_times: list[datetime],
+    now: datetime,
+) -> Optional[datetime]:
+    """
+    Start of the hour (UTC) the user is expected to next open the Reflection page, after now.
+    None without any activity to go on.
+    """
+    recent_first = sorted(reflection_times, reverse=True)
+    hour = _most_common(t.hour for t in recent_first)
+    if hour is None:
+        hour = _most_common(t.hour for t in sorted(check_in_times, reverse=True))
+    if hour is None:
+        return None
+    weekday = _most_common(t.weekday() for t in recent_first)
+
+    visit = now.replace(hour=hour, minute=0, second=0, microsecond=0)
+    if visit <= now:
+        visit += timedelta(days=1)
+    if weekday is not None:
+        visit += timedelta(days=(weekday - visit.weekday()) % 7)
+    return visit
+
+
+def next_window_start(now: datetime) -> datetime:
+    """Next start of the off-peak warming window."""
+    start = now.replace(hour=settings.reflection_warming_start_hour % 24, minute=0, second=0, microsecond=0)
+    return start if start > now else start + timedelta(days=1)
+
+
+class ReflectionWarmingScheduler:
+    """Plans the nightly warming run; keeps the last plan's counts for the metrics endpoint."""
+
+    def __init__(self):
+        self.last_plan: dict = {}
+
+    async def _activity(self, db: AsyncIOMotorDatabase, now: datetime) -> dict[str, dict]:
+        """
+        Recently active users (a check-in within REFLECTION_WARMING_ACTIVE_DAYS) with all their
+        habit ids, check-in times and past reflection times.
+        """
+        cutoff = now - timedelta(days=settings.reflection_warming_active_days)
+        users: dict[str, dict] = {}
+        async for streak in db.streaks.find(
+            {"lastCheckInDate": {"$gte": cutoff}},
+            {"userId": 1, "lastCheckInDate": 1, "checkInTimes": 1},
+        ):
+            user = users.setdefault(streak["userId"], {"habitIds": [], "checkIns": [], "reflections": []})
+            times = streak.get("checkInTimes") or [streak.get("lastCheckInDate")]
+            user["checkIns"].extend(t for t in map(_as_datetime, times) if t)
+        if not users:
+            return users
+
+        # All habits, not just those checked into recently: the batch job generates every stale one
+        async for habit in db.habits.find({"userId": {"$in": list(users)}}, {"userId": 1, "habitId": 1}):
+            if habit.get("habitId"):
+                users[habit["userId"]]["habitIds"].append(habit["habitId"])
+
+        async for reflection in db.reflections.find(
+            {"userId": {"$in": list(users)}}, {"userId": 1, "createdAt": 1}
+        ).sort("createdAt", -1):
+            user = users[reflection["userId"]]
+            created = _as_datetime(reflection.get("createdAt"))
+            if created and len(user["reflections"]) < _REFLECTIONS_PER_USER:
+                user["reflections"].append(created)
+        return users
+
+    async def _recently_cached(self, db: AsyncIOMotorDatabase, user_ids: list[str], now: datetime) -> set:
+        """
+        (userId, habitId) of complete cache entries within the soft TTL, which warming leaves alone
+        (entries whose inputs changed since were already refreshed by the check-in or edit).
+        """
+        cached = set()
+        if not user_ids:
+            return cached
+        async for entry in db[CACHE_COLLECTION].find(
+            {
+                "userId": {"$in": user_ids},
+                "source": {"$ne": SOURCE_DEFAULT},
+                "complete": {"$ne": False},
+                "cachedAt": {"$gt": now - timedelta(seconds=settings.reflection_cache_soft_ttl_seconds)},
+            },
+            {"userId": 1, "habitId": 1},
+        ):
+            cached.add((entry["userId"], entry["habitId"]))
+        return cached
+
+    async def plan(self, db: AsyncIOMotorDatabase, now: Optional[datetime] = None) -> dict:
+        """
+        Queue tonight's warming jobs: users whose predicted visit falls within the next day,
+        earliest visit first, one job per batch of their habits to generate, spread over the
+        window under the hourly habit budget.
+        """
+        now = now or datetime.now(timezone.utc)
+        window_end = now + timedelta(hours=settings.reflection_warming_window_hours)
+        horizon = now + timedelta(hours=24)
+
+        users = await self._activity(db, now)
+        due = []
+        for user_id, activity in users.items():
+            visit = predict_next_visit(activity["checkIns"], activity["reflections"], now)
+            if visit is not None and visit <= horizon:
+                due.append((visit, user_id, activity["habitIds"]))
+        due.sort()
+        cached = await self._recently_cached(db, [user_id for _, user_id, _ in due], now)
+
+        # Budget: each job is placed after the habits queued before it have used their share of the hour
+        size = max(1, settings.reflection_batch_max_habits) if settings.reflection_batch_enabled else 1
+        rate = max(1, settings.reflection_warming_max_habits_per_hour)
+        habits_before = 0
+        jobs = []
+        planned_users = 0
+        for visit, user_id, habit_ids in due:
+            stale = [habit_id for habit_id in habit_ids if (user_id, habit_id) not in cached]
+            user_jobs = []
+            offset = habits_before
+            for i in range(0, len(stale), size):
+                chunk = stale[i:i + size]
+                user_jobs.append((user_id, chunk, now + timedelta(hours=offset / rate)))
+                offset += len(chunk)
+            # Whole users only: a half-warmed user still waits on the Reflection page
+            if user_jobs and user_jobs[-1][2] >= window_end:
+                break
+            jobs.extend(user_jobs)
+            habits_before = offset
+            planned_users += 1
+
+        queued = 0
+        for user_id, habit_ids, run_at in jobs:
+            # Own dedupe key, so a queued warm-up does not absorb (and delay) a daytime prefetch
+            queued += await job_queue.enqueue(
+                db,
+                REFLECTION_BATCH_JOB,
+                {"userId": user_id, "habitIds": habit_ids},
+                dedupe_key=f"{REFLECTION_BATCH_JOB}:warm:{user_id}:{habit_ids[0]}",
+                delay_seconds=(run_at - now).total_seconds(),
+            )
+
+        self.last_plan = {
+            "plannedAt": now.isoformat(),
+            "activeUsers": len(users),
+            "dueUsers": len(due),
+            "queued": queued,
+            "overBudget": len(due) - planned_users,
+            "habits": habits_before,
+        }
+        logger.info(f"Reflection warming planned: {self.last_plan}")
+        return self.last_plan
+
+    def stats(self) -> dict:
+        return {"enabled": settings.reflection_warming_enabled, "lastPlan": self.last_plan}
+
+
+# Global scheduler
+reflection_warming_scheduler = ReflectionWarmingScheduler()
+
+
+async def schedule_reflection_warming(db: AsyncIOMotorDatabase, now: Optional[datetime] = None) -> None:
+    """Queue the planning job for the next off-peak window (absorbed if already queued). Never raises."""
+    if not settings.reflection_warming_enabled:
+        return
+    now = now or datetime.now(timezone.utc)
+    try:
+        await job_queue.enqueue(
+            db,
+            WARMING_PLAN_JOB,
+            {},
+            dedupe_key=WARMING_PLAN_JOB,
+            delay_seconds=(next_window_start(now) - now).total_seconds(),
+        )
+    except Exception as e:
+        logger.warning(f"Could not schedule reflection warming: {e}")
+
+
+async def _run_warming_plan_job(db: AsyncIOMotorDatabase, payload: dict) -> None:
+    # Next night first, so a failing plan (retried by the queue) never stops the schedule
+    await schedule_reflection_warming(db)
+    if settings.reflection_warming_enabled:
+        await reflection_warming_scheduler.plan(db)
+
+
+job_queue.register(WARMING_PLAN_JOB, _run_warming_plan_job)
@@ -11,6 +11,9 @@ from app.models.streak import StreakResponse, StreakUpdateRequest
 
 logger = logging.getLogger(__name__)
 
+# Recent check-in timestamps kept per streak (checkInTimes), for visit-time prediction
+CHECK_IN_TIMES_KEPT = 30
+
 
 def _ensure_utc(dt):
     """Ensure datetime is timezone-aware UTC so Pydantic serializes with 'Z' (works in production)."""
@@ -54,6 +57,40 @@ def _recalculate_streak_from_history(check_in_history: list[str]) -> tuple[int,
 
 class StreakService:
     """Service for streak-related operations."""
+
+    @staticmethod
+    def build_streak_response(streak: Optional[dict]) -> StreakResponse:
+        """
+        StreakResponse from a streaks document (default values if None).
+        Shared by get_streak_by_id and callers that already hold the documents (batch reads).
+        """
+        if not streak:
+            return StreakResponse(
+                currentStreak=0,
+                longestStreak=0,
+                totalStones=0,
+                lastCheckInDate=None,
+                checkInHistory=[]
+            )
+
+        # Extract data - normalize to UTC-aware so JSON has "Z" (fixes Vercel/Railway display)
+        last_check_in_date = _ensure_utc(streak.get("lastCheckInDate"))
+        check_in_history = streak.get("checkInHistory", [])
+
+        # Recalculate streak from checkInHistory so direct DB edits are reflected
+        if check_in_history:
+            current_streak, longest_streak = _recalculate_streak_from_history(check_in_history)
+        else:
+            current_streak = streak.get("currentStreak", 0)
+            longest_streak = streak.get("longestStreak", 0)
+
+        return StreakResponse(
+            currentStreak=current_streak,
+            longestStreak=max(longest_streak, streak.get("longestStreak", 0)),
+            totalStones=streak.get("totalStones", 0),
+            lastCheckInDate=last_check_in_date,
+            checkInHistory=check_in_history,
+        )
     
     @staticmethod
     async def get_streak_by_id(
@@ -84,32 +121,8 @@ class StreakService:
             
             if not streak:
                 logger.info(f"Streak not found - returning default values for userId: {userId}, habitId: {habitId}")
-                return StreakResponse(
-                    currentStreak=0,
-                    longestStreak=0,
-                    totalStones=0,
-                    lastCheckInDate=None,
-                    checkInHistory=[]
-                )
-            
-            # Extract data - normalize to UTC-aware so JSON has "Z" (fixes Vercel/Railway display)
-            last_check_in_date = _ensure_utc(streak.get("lastCheckInDate"))
-            check_in_history = streak.get("checkInHistory", [])
 
-            # Recalculate streak from checkInHistory so direct DB edits are reflected
-            if check_in_history:
-                current_streak, longest_streak = _recalculate_streak_from_history(check_in_history)
-            else:
-                current_streak = streak.get("currentStreak", 0)
-                longest_streak = streak.get("longestStreak", 0)
-
-            result = StreakResponse(
-                currentStreak=current_streak,
-                longestStreak=max(longest_streak, streak.get("longestStreak", 0)),
-                totalStones=streak.get("totalStones", 0),
-                lastCheckInDate=last_check_in_date,
-                checkInHistory=check_in_history,
-            )
+            result = StreakService.build_streak_response(streak)
             
             logger.debug(f"Successfully retrieved streak for userId: {userId}, habitId: {habitId}")
             return result
@@ -153,6 +166,7 @@ class StreakService:
             # IMPORTANT: Use checkInDate (local date) for history/streak, not date extracted from checkInDateTime (UTC)
             try:
                 check_in_date = datetime.strptime(request.checkInDate, "%Y-%m-%d").date()
+                has_check_in_time = False
                 if request.checkInDateTime:
                     try:
                         check_in_datetime = datetime.fromisoformat(
@@ -160,6 +174,7 @@ class StreakService:
                         )
                         if check_in_datetime.tzinfo is None:
                             check_in_datetime = check_in_datetime.replace(tzinfo=timezone.utc)
+                        has_check_in_time = True
                         # NOTE: Do NOT override check_in_date from datetime - keep user's local date
                     except (ValueError, TypeError):
                         check_in_datetime = datetime.combine(
@@ -233,14 +248,17 @@ class StreakService:
                 
                 # Add check-in date to history (YYYY-MM-DD format, avoid duplicates with $addToSet)
                 check_in_date_str = check_in_date.isoformat()
-                
-                await db.streaks.update_one(
-                    {"_id": existing["_id"]},
-                    {
-                        "$set": update_data,
-                        "$addToSet": {"checkInHistory": check_in_date_str}
+                update = {
+                    "$set": update_data,
+                    "$addToSet": {"checkInHistory": check_in_date_str}
+                }
+                # Actual check-in time (not the midnight fallback), capped to the most recent ones
+                if has_check_in_time:
+                    update["$push"] = {
+                        "checkInTimes": {"$each": [check_in_datetime], "$slice": -CHECK_IN_TIMES_KEPT}
                     }
-                )
+                
+                await db.streaks.update_one({"_id": existing["_id"]}, update)
                 
                 updated_doc = await db.streaks.find_one({"_id": existing["_id"]})
                 logger.info(f"Successfully updated streak - _id: {updated_doc['_id']}")
@@ -256,6 +274,7 @@ class StreakService:
                     "totalStones": 1,
                     "lastCheckInDate": check_in_datetime,  # Store as datetime for MongoDB
                     "checkInHistory": [check_in_date_str],  # Initialize with first check-in date
+                    "checkInTimes": [check_in_datetime] if has_check_in_time else [],
                     "createdAt": now,
                     "updatedAt": now
                 }
@@ -0,0 +1,122 @@
+"""
+Adaptive max_tokens per prompt name.
+
+Callers pass a generous max_tokens (4096 for reflections, the 2048 default, ...) that is mostly
+unused but still reserved by the provider and by the gateway's token bucket. For each prompt name
+this tracker keeps recent completion_tokens from `usage`; once enough samples exist, calls reserve
+p99 * (1 + headroom) instead, never below the floor and never above what the caller asked for.
+A response cut off with finish_reason=length is retried once with a larger budget.
+Prompts whose answer length varies by design (multi-habit reflections) are tracked under a
+budget key per variant instead (e.g. reflection_items_batch:4), so one variant's samples never
+cap another's.
+"""
+import logging
+from collections import deque
+from typing import Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class _PromptTokenStats:
+    """Completion-token samples and truncation counters of one prompt name."""
+
+    def __init__(self, window: int):
+        self.samples: deque = deque(maxlen=window)  # completion_tokens of non-truncated answers
+        self.calls = 0
+        self.truncated = 0
+        self.retried = 0
+
+    def percentile(self, q: float) -> Optional[int]:
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class TokenBudgetTracker:
+    """Per-prompt completion-length statistics and the max_tokens derived from them."""
+
+    def __init__(
+        self,
+        enabled: bool = True,
+        window: int = 500,
+        min_samples: int = 20,
+        percentile: float = 0.99,
+        headroom: float = 0.2,
+        floor: int = 256,
+        cap: int = 8192,
+    ):
+        self.enabled = enabled
+        self.window = window
+        self.min_samples = min_samples
+        self.percentile = percentile
+        self.headroom = headroom
+        self.floor = floor
+        self.cap = cap
+        self._stats: dict[str, _PromptTokenStats] = {}
+
+    def _get(self, prompt_name: str) -> _PromptTokenStats:
+        stats = self._stats.get(prompt_name)
+        if stats is None:
+            stats = _PromptTokenStats(self.window)
+            self._stats[prompt_name] = stats
+        return stats
+
+    def budget_for(self, prompt_name: Optional[str], requested: int) -> int:
+        """max_tokens to send: the adaptive budget when known, else what the caller requested."""
+        if not self.enabled or not prompt_name:
+            return requested
+        stats = self._stats.get(prompt_name)
+        if stats is None or len(stats.samples) < self.min_samples:
+            return requested
+        observed = stats.percentile(self.percentile)
+        adaptive = int(observed * (1 + self.headroom))
+        return min(requested, max(self.floor, adaptive))
+
+    def retry_budget(self, used: int, requested: int) -> Optional[int]:
+        """Larger max_tokens after finish_reason=length, or None if there is no room to grow."""
+        larger = min(self.cap, max(used * 2, requested))
+        return larger if larger > used else None
+
+    def record(self, prompt_name: Optional[str], completion_tokens: Optional[int], truncated: bool) -> None:
+        """Record one provider response (truncated answers are counted, not sampled)."""
+        if not prompt_name:
+            return
+        stats = self._get(prompt_name)
+        stats.calls += 1
+        if truncated:
+            stats.truncated += 1
+        elif isinstance(completion_tokens, int) and completion_tokens > 0:
+            stats.samples.append(completion_tokens)
+
+    def record_retry(self, prompt_name: Optional[str]) -> None:
+        if prompt_name:
+            self._get(prompt_name).retried += 1
+
+    def snapshot(self) -> dict:
+        result = {}
+        for name, stats in self._stats.items():
+            result[name] = {
+                "calls": stats.calls,
+                "samples": len(stats.samples),
+                "p50": stats.percentile(0.5),
+                "p99": stats.percentile(self.percentile),
+                "max": max(stats.samples) if stats.samples else None,
+                "truncated": stats.truncated,
+                "retried": stats.retried,
+                "maxTokens": self.budget_for(name, self.cap),
+            }
+        return {"enabled": self.enabled, "prompts": result}
+
+
+# Global tracker used by LLMService
+token_budget_tracker = TokenBudgetTracker(
+    enabled=settings.llm_adaptive_max_tokens_enabled,
+    min_samples=settings.llm_adaptive_max_tokens_min_samples,
+    percentile=settings.llm_adaptive_max_tokens_percentile,
+    headroom=settings.llm_adaptive_max_tokens_headroom,
+    floor=settings.llm_adaptive_max_tokens_floor,
+    cap=settings.llm_max_tokens_cap,
+)
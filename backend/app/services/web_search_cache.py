@@ -0,0 +1,89 @@
+"""
+MongoDB cache of live web search results (the reflection agent's optional Tavily tool).
+
+Keyed by the normalized query (lowercased, stemmed terms without stopwords, sorted), so
+"James Clear habit stacking" and "habit stacking james clear" share an entry. Entries expire
+through a TTL index on expiresAt (created in database.py).
+"""
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from app.core.config import settings
+from app.utils.snippet_index import normalize_query
+
+logger = logging.getLogger(__name__)
+
+SEARCH_CACHE_COLLECTION = "web_search_cache"
+
+
+class WebSearchCache:
+    """Read-through cache for search tool results. Cache errors never fail the search."""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    @staticmethod
+    def _collection():
+        from app.database import get_database
+        return get_database()[SEARCH_CACHE_COLLECTION]
+
+    async def get(self, query: str) -> Optional[str]:
+        """Cached result text for the query, or None."""
+        if not settings.web_search_cache_enabled:
+            return None
+        key = normalize_query(query)
+        if not key:
+            return None
+        try:
+            doc = await self._collection().find_one(
+                {"_id": key, "expiresAt": {"$gt": datetime.now(timezone.utc)}},
+                {"result": 1},
+            )
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"Web search cache read failed: {e}")
+            return None
+        if doc is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return doc.get("result")
+
+    async def set(self, query: str, result: str) -> None:
+        if not settings.web_search_cache_enabled:
+            return
+        key = normalize_query(query)
+        if not key:
+            return
+        now = datetime.now(timezone.utc)
+        try:
+            await self._collection().update_one(
+                {"_id": key},
+                {
+                    "$set": {
+                        "query": query,
+                        "result": result,
+                        "cachedAt": now,
+                        "expiresAt": now + timedelta(seconds=settings.web_search_cache_ttl_seconds),
+                    }
+                },
+                upsert=True,
+            )
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"Web search cache write failed: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "enabled": settings.web_search_cache_enabled,
+            "hits": self.hits,
+            "misses": self.misses,
+            "errors": self.errors,
+        }
+
+
+# Global web search cache
+web_search_cache = WebSearchCache()
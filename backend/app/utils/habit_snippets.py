@@ -0,0 +1,205 @@
+"""
+Curated Atomic Habits (James Clear) snippets for the reflection agent's local search tool.
+
+Short paraphrases of the book's core ideas, tagged with the lever they support (anchor,
+environment, enjoyment, identity, consistency). search_habit_snippets() looks them up through
+an in-process BM25 index, replacing a live web search for the same small body of material.
+"""
+from app.utils.snippet_index import BM25Index
+
+HABIT_SNIPPETS = [
+    {
+        "id": "systems-over-goals",
+        "topic": "consistency",
+        "text": "You do not rise to the level of your goals; you fall to the level of your systems. "
+                "Focus on the daily process that produces results rather than the outcome itself.",
+    },
+    {
+        "id": "one-percent-better",
+        "topic": "consistency",
+        "text": "Small improvements compound. Getting 1% better each day adds up to remarkable results over "
+                "a year, while tiny slips compound the other way. Judge a habit by its trajectory, not today's result.",
+    },
+    {
+        "id": "plateau-of-latent-potential",
+        "topic": "consistency",
+        "text": "Habits often seem to make no difference until you cross a critical threshold. Progress is "
+                "stored up like ice warming from 25 to 31 degrees before it finally melts at 32.",
+    },
+    {
+        "id": "identity-based-habits",
+        "topic": "identity",
+        "text": "The most lasting change starts with identity, not outcomes. Decide the type of person you "
+                "want to be, then prove it to yourself with small wins.",
+    },
+    {
+        "id": "votes-for-identity",
+        "topic": "identity",
+        "text": "Every action is a vote for the type of person you wish to become. You do not need a unanimous "
+                "vote, just a majority: each repetition adds evidence for the new identity.",
+    },
+    {
+        "id": "four-laws",
+        "topic": "consistency",
+        "text": "The four laws of behavior change: make it obvious (cue), make it attractive (craving), make it "
+                "easy (response) and make it satisfying (reward). Invert them to break a bad habit.",
+    },
+    {
+        "id": "implementation-intention",
+        "topic": "anchor",
+        "text": "An implementation intention names when and where you will act: I will [behavior] at [time] in "
+                "[location]. People who make a specific plan are far more likely to follow through.",
+    },
+    {
+        "id": "habit-stacking",
+        "topic": "anchor",
+        "text": "Habit stacking pairs a new habit with a current one: After I [current habit], I will [new habit]. "
+                "The existing routine becomes the cue and the reminder for the new behavior.",
+    },
+    {
+        "id": "anchor-specific-cue",
+        "topic": "anchor",
+        "text": "Pick an anchor that happens at the right time and at the same frequency as the new habit, and "
+                "make the cue highly specific. 'After I pour my morning coffee' beats 'in the morning'.",
+    },
+    {
+        "id": "habits-scorecard",
+        "topic": "anchor",
+        "text": "Write down your daily routine to become aware of existing habits. Noticing what you already "
+                "do reveals reliable moments to anchor a new habit to.",
+    },
+    {
+        "id": "environment-design",
+        "topic": "environment",
+        "text": "Environment is the invisible hand that shapes behavior. Make the cues of good habits obvious "
+                "and visible: put the book on your pillow, the water bottle on your desk.",
+    },
+    {
+        "id": "one-space-one-use",
+        "topic": "environment",
+        "text": "Habits are easier to build in a context that is linked to them. One space, one use: a chair "
+                "for reading, a desk for work. A new environment makes a fresh start easier.",
+    },
+    {
+        "id": "prime-the-environment",
+        "topic": "environment",
+        "text": "Prime your environment so the next action is easy: lay out workout clothes the night before, "
+                "prep ingredients, open the document you will write in. Reduce friction for good habits.",
+    },
+    {
+        "id": "increase-friction-bad-habits",
+        "topic": "environment",
+        "text": "Make bad habits invisible and difficult. Unplug the TV, keep the phone in another room, do not "
+                "keep snacks in sight. Self-control is a short-term strategy, not a long-term one.",
+    },
+    {
+        "id": "law-of-least-effort",
+        "topic": "environment",
+        "text": "People naturally gravitate toward the option that requires the least work. Reduce the number "
+                "of steps between you and your good habits.",
+    },
+    {
+        "id": "two-minute-rule",
+        "topic": "consistency",
+        "text": "The two-minute rule: scale a new habit down until it takes two minutes or less. 'Read before "
+                "bed' becomes 'read one page'. Master the habit of showing up before optimizing it.",
+    },
+    {
+        "id": "gateway-habit",
+        "topic": "consistency",
+        "text": "A habit must be established before it can be improved. Make the starting ritual easy, a "
+                "gateway habit that naturally leads you toward the more productive path.",
+    },
+    {
+        "id": "never-miss-twice",
+        "topic": "consistency",
+        "text": "Never miss twice. Missing once is an accident; missing twice is the start of a new habit. "
+                "Get back on track quickly, even with a smaller version of the habit.",
+    },
+    {
+        "id": "bad-days-count",
+        "topic": "consistency",
+        "text": "Showing up on bad days matters most. Doing a tiny version when you do not feel like it "
+                "maintains the compound gains and reinforces your identity.",
+    },
+    {
+        "id": "temptation-bundling",
+        "topic": "enjoyment",
+        "text": "Temptation bundling links an action you want to do with one you need to do: only listen to "
+                "your favorite podcast while exercising, only watch the show while folding laundry.",
+    },
+    {
+        "id": "make-it-attractive",
+        "topic": "enjoyment",
+        "text": "The more attractive an opportunity is, the more likely it becomes habit-forming. Anticipation "
+                "of a reward drives action, so link habits to something you look forward to.",
+    },
+    {
+        "id": "reframe-mindset",
+        "topic": "enjoyment",
+        "text": "Reframe habits to highlight their benefits: you do not have to, you get to. Exercise builds "
+                "strength and energy; the nervous feeling before a presentation means you care.",
+    },
+    {
+        "id": "join-a-culture",
+        "topic": "enjoyment",
+        "text": "Join a group where your desired behavior is the normal behavior. We imitate the close, the "
+                "many and the powerful, and shared identity makes habits more attractive.",
+    },
+    {
+        "id": "motivation-ritual",
+        "topic": "enjoyment",
+        "text": "Create a motivation ritual: do something you enjoy immediately before a difficult habit, so "
+                "the pleasant feeling becomes associated with starting.",
+    },
+    {
+        "id": "make-it-satisfying",
+        "topic": "enjoyment",
+        "text": "What is immediately rewarded is repeated. Add a small, immediate reward when you finish a "
+                "habit so the brain has a reason to repeat it; long-term benefits feel too distant.",
+    },
+    {
+        "id": "habit-tracking",
+        "topic": "consistency",
+        "text": "Habit tracking makes progress visible and satisfying. Marking each day, don't break the chain, "
+                "is a cue, a motivation and a reward in one.",
+    },
+    {
+        "id": "accountability-partner",
+        "topic": "consistency",
+        "text": "An accountability partner or habit contract adds an immediate social cost to skipping, which "
+                "makes not doing the habit painful and visible.",
+    },
+    {
+        "id": "goldilocks-rule",
+        "topic": "enjoyment",
+        "text": "The Goldilocks Rule: people stay motivated working on tasks of just manageable difficulty, "
+                "not too hard and not too easy. Adjust the habit as it starts to feel boring.",
+    },
+    {
+        "id": "boredom",
+        "topic": "consistency",
+        "text": "The greatest threat to success is not failure but boredom. Professionals stick to the schedule; "
+                "amateurs let life get in the way. Fall in love with the repetition.",
+    },
+    {
+        "id": "reflection-review",
+        "topic": "identity",
+        "text": "Reflection and review keep habits aligned with who you want to be. Regularly ask what went "
+                "well, what did not, and what you learned, and adjust the plan instead of the identity.",
+    },
+]
+
+_INDEX = BM25Index([f"{s['topic']} {s['id'].replace('-', ' ')} {s['text']}" for s in HABIT_SNIPPETS])
+
+
+def search_habit_snippets(query: str, k: int = 3) -> list[dict]:
+    """Best-matching snippets for a query, best first (empty if nothing matches)."""
+    return [HABIT_SNIPPETS[doc_id] for doc_id, _ in _INDEX.search(query, k)]
+
+
+def format_snippets(snippets: list[dict]) -> str:
+    """Snippets as tool output text for the agent."""
+    if not snippets:
+        return "No matching Atomic Habits material found."
+    return "\n".join(f"- [{s['topic']}] {s['text']} (James Clear, Atomic Habits)" for s in snippets)
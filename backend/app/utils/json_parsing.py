@@ -0,0 +1,31 @@
+"""
+Tolerant JSON extraction for LLM responses (shared by LLMService and the reflection agent).
+"""
+import json
+
+_decoder = json.JSONDecoder()
+
+
+def parse_json_object(text: str) -> dict:
+    """
+    Parse the first JSON object in an LLM response.
+
+    Handles pure JSON, markdown fences (```json ... ```) and reasoning text before/after the
+    object: raw_decode starts at a '{' and stops at the end of the first complete value, so
+    trailing text and braces inside strings need no special casing. After a failed attempt the
+    search resumes past the error position, so a truncated object never yields one of its
+    nested fragments.
+    Raises ValueError if no JSON object can be decoded.
+    """
+    text = (text or "").strip()
+    if not text:
+        raise ValueError("Empty response; cannot parse as JSON")
+
+    start = text.find("{")
+    while start != -1:
+        try:
+            value, _ = _decoder.raw_decode(text, start)
+            return value
+        except json.JSONDecodeError as e:
+            start = text.find("{", max(start + 1, e.pos))
+    raise ValueError(f"No JSON object found. Raw start: {text[:200]}")
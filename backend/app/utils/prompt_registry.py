@@ -0,0 +1,132 @@
+"""
+Prompt template registry: the one place the app's prompt templates live.
+
+Templates use Mustache-style {{variable}} placeholders, so the exact text used for LLM calls is
+also what gets registered with Comet Opik (opik_prompts.py). Each template is compiled once at
+import into alternating literal chunks and variable slots; rendering is a single str.join.
+The content hash of a template identifies its version in Opik metadata, LLM traces and
+/api/v1/metrics/llm.
+"""
+import hashlib
+import logging
+import re
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# Prompt keys -> names used in the Comet project (must be unique in the workspace).
+# The keys double as prompt_name for LLMService calls (adaptive max_tokens, usage metrics).
+PROMPT_NAMES = {
+    "identity_generation": "chlapp-identity-generation",
+    "short_habit_options": "chlapp-short-habit-options",
+    "full_habit_options": "chlapp-full-habit-options",
+    "obvious_cues": "chlapp-obvious-cues",
+    "preference_edit_options": "chlapp-preference-edit-options",
+    "reflection_items": "chlapp-reflection-items",
+    "reflection_items_batch": "chlapp-reflection-items-batch",
+    "reflection_experiment_repair": "chlapp-reflection-experiment-repair",
+    "reflection_suggestion": "chlapp-reflection-suggestion",
+}
+
+_PLACEHOLDER = re.compile(r"\{\{\s*(\w+)\s*\}\}")
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token estimate (~4 characters per token for English prompts)."""
+    return max(1, len(text or "") // 4)
+
+
+class PromptTemplate:
+    """A compiled {{variable}} template."""
+
+    def __init__(self, key: str, template: str, token_budget: Optional[int] = None):
+        self.key = key
+        self.opik_name = PROMPT_NAMES.get(key, key)
+        self.template = template
+        self.token_budget = token_budget
+        self.content_hash = hashlib.sha256(template.encode("utf-8")).hexdigest()[:12]
+        parts = _PLACEHOLDER.split(template)
+        # parts = [literal, var, literal, var, ..., literal]
+        self._head = parts[0]
+        self._slots = list(zip(parts[1::2], parts[2::2]))
+        self.variables = tuple(dict.fromkeys(parts[1::2]))
+        self.static_tokens = estimate_tokens("".join(parts[0::2]))
+        # Literal text before the first variable: the part shared verbatim by every render
+        self.prefix_tokens = estimate_tokens(self._head)
+        self.over_budget = 0
+
+    def render(self, values: dict) -> str:
+        """Fill the placeholders (missing values render as empty strings)."""
+        out = [self._head]
+        for name, literal in self._slots:
+            value = values.get(name)
+            out.append("" if value is None else str(value))
+            out.append(literal)
+        return "".join(out)
+
+    def check_budget(self, text: str) -> bool:
+        """False (and a warning) when a rendered prompt exceeds the template's token budget."""
+        if self.token_budget is None:
+            return True
+        tokens = estimate_tokens(text)
+        if tokens <= self.token_budget:
+            return True
+        self.over_budget += 1
+        logger.warning(
+            f"Prompt {self.key} is ~{tokens} tokens, over its budget of {self.token_budget} "
+            f"(static part ~{self.static_tokens})"
+        )
+        return False
+
+    def info(self) -> dict:
+        return {
+            "opikName": self.opik_name,
+            "contentHash": self.content_hash,
+            "variables": list(self.variables),
+            "staticTokens": self.static_tokens,
+            "prefixTokens": self.prefix_tokens,
+            "tokenBudget": self.token_budget,
+            "overBudget": self.over_budget,
+        }
+
+
+class PromptRegistry:
+    """Named prompt templates, compiled at registration."""
+
+    def __init__(self):
+        self._templates: dict[str, PromptTemplate] = {}
+
+    def register(self, key: str, template: str, token_budget: Optional[int] = None) -> PromptTemplate:
+        existing = self._templates.get(key)
+        if existing is not None and existing.template != template:
+            raise ValueError(f"Prompt {key} is already registered with different content")
+        compiled = PromptTemplate(key, template, token_budget)
+        if token_budget is not None and compiled.static_tokens > token_budget:
+            logger.warning(f"Prompt {key}: static text (~{compiled.static_tokens} tokens) exceeds budget {token_budget}")
+        self._templates[key] = compiled
+        return compiled
+
+    def get(self, key: str) -> PromptTemplate:
+        return self._templates[key]
+
+    def render(self, key: str, **values) -> str:
+        """Render a registered prompt and check it against the template's token budget."""
+        compiled = self._templates[key]
+        text = compiled.render(values)
+        compiled.check_budget(text)
+        return text
+
+    def version(self, key: Optional[str]) -> Optional[str]:
+        """Content hash of a registered prompt, or None for unknown keys."""
+        compiled = self._templates.get(key) if key else None
+        return compiled.content_hash if compiled else None
+
+    def templates(self) -> list[PromptTemplate]:
+        return list(self._templates.values())
+
+    def snapshot(self) -> dict:
+        return {key: compiled.info() for key, compiled in self._templates.items()}
+
+
+# Global registry (populated by app.utils.prompts at import)
+prompt_registry = PromptRegistry()
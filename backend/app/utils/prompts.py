@@ -1,23 +1,32 @@
 """
 Prompt templates for LLM interactions.
+
+Templates are registered once in the prompt registry (app/utils/prompt_registry.py), which
+compiles them and also registers the same text with Opik. The builder functions below only
+derive template values from the habit context.
+
+Each prompt is laid out static-instructions-first, user data last: the long instruction and
+example blocks are then a byte-identical prefix across users, which provider-side prompt
+caching (OpenAI, OpenRouter, ...) can reuse. Keep per-user values out of the prefix.
 """
+from app.utils.prompt_registry import PromptTemplate, prompt_registry
 
 
+# Prompt-token budgets for the large reflection prompts (static text + user data, ~4 chars/token)
+REFLECTION_ITEMS_TOKEN_BUDGET = 2500
+REFLECTION_ITEMS_BATCH_TOKEN_BUDGET = 4000
+REFLECTION_SUGGESTION_TOKEN_BUDGET = 1500
+REFLECTION_EXPERIMENT_REPAIR_TOKEN_BUDGET = 900
 
+# Output ceiling for reflection items: the compact wire format (CompactReflectionItems) is
+# ~300-400 tokens; the verbose ReflectionItemsResponse shape used to need 4096
+REFLECTION_ITEMS_MAX_TOKENS = 1200
 
-def get_identity_generation_prompt(habit_context: dict) -> str:
-   """
-   Generate prompt for identity generation based on habit context.
-  
-   Args:
-       habit_context: Dictionary containing habit preferences and context
-      
-   Returns:
-       Formatted prompt string
-   """
-   starting_idea = habit_context.get("starting_idea", "")
-  
-   prompt = f"""Generate 3 identity statements based on the provided habit context {starting_idea}, following James Clear’s recommendations in his book "Atomic Habits" for creating effective identity-based habits.
+# Output ceiling for the experiment repair prompt (at most three short experiments)
+REFLECTION_EXPERIMENT_REPAIR_MAX_TOKENS = 400
+
+
+IDENTITY_GENERATION_TEMPLATE = """Generate 3 identity statements based on the habit context given at the end of this prompt, following James Clear’s recommendations in his book "Atomic Habits" for creating effective identity-based habits.
 
 
 An identity statement, as described by James Clear, should:
@@ -74,38 +83,20 @@ I am someone who feeds my curiosity through books.
 - Do not include explanation, formatting, or output labels—just the identity statements, line by line.
 
 
-Remember: Ground each identity statement in James Clear’s guidance that lasting change comes from reinforcing the identity behind the habit, not just the outcomes."""
+Remember: Ground each identity statement in James Clear’s guidance that lasting change comes from reinforcing the identity behind the habit, not just the outcomes.
 
 
-   return prompt
+# Habit Context
 
 
+- Habit context: "{{starting_idea}}\""""
 
-
-def get_short_habit_options_prompt(habit_context: dict) -> str:
-   """
-   Generate prompt for short habit options (starter habits).
-  
-   Args:
-       habit_context: Dictionary containing habit preferences and context
-      
-   Returns:
-       Formatted prompt string
-   """
-   starting_idea = habit_context.get("starting_idea", "")
-   identity = habit_context.get("identity", "")
-  
-   prompt = f"""Generate 3 "Nucleus Habit" options based on the following context. A Nucleus Habit is the smallest daily action that still reinforces a person's chosen identity — the version of the habit they can do on their worst day and still say "I showed up."
+SHORT_HABIT_OPTIONS_TEMPLATE = """Generate 3 "Nucleus Habit" options based on the habit context given at the end of this prompt. A Nucleus Habit is the smallest daily action that still reinforces a person's chosen identity — the version of the habit they can do on their worst day and still say "I showed up."
 
 
 Follow James Clear's two-minute rule from Atomic Habits: scale the habit down to something that takes roughly 2 minutes. The key insight is "a habit must be established before it can be improved." The Nucleus Habit is about mastering the art of showing up, not achieving a result.
 
 
-Habit Context:
-- Starting Idea: {starting_idea}
-- Identity: {identity}
-
-
 Guidelines:
 - Each option must be a repeatable daily action — something that makes sense to do on day 1 AND day 100 without feeling stale or "done."
 - Each option should take roughly 2 minutes (no more than 5).
@@ -178,39 +169,23 @@ Write one sentence capturing something you learned at work today
 Every option should be something the user actively does (reads, writes, moves, practices, reflects) — not a one-time planning or brainstorming task.
 - Prioritize options that are the smallest recognizable version of the full habit — like James Clear's example of "read one page" instead of "read 30 books a year."
 - Each option should feel like a vote for the user's chosen identity when completed.
-"""
-
 
-   return prompt
 
+# Habit Context
 
 
+- Starting Idea: {{starting_idea}}
+- Identity: {{identity}}
+"""
 
-def get_full_habit_options_prompt(habit_context: dict) -> str:
-   """
-   Generate prompt for full habit options.
-  
-   Args:
-       habit_context: Dictionary containing habit preferences and context
-      
-   Returns:
-       Formatted prompt string
-   """
-   starting_idea = habit_context.get("starting_idea", "")
-   identity = habit_context.get("identity", "")
-   starter_habit = habit_context.get("starter_habit", "")
-  
-   prompt = f"""Generate 3 "Supernova Habit" options based on the following context. A Supernova Habit is the expanded version of the user's Nucleus Habit — what the same core behavior looks like when they have more time and energy. It is NOT a separate activity or project. It's the Nucleus Habit with the volume turned up.
+FULL_HABIT_OPTIONS_TEMPLATE = """Generate 3 "Supernova Habit" options based on the habit context given at the end of this prompt. A Supernova Habit is the expanded version of the user's Nucleus Habit — what the same core behavior looks like when they have more time and energy. It is NOT a separate activity or project. It's the Nucleus Habit with the volume turned up.
 
 
 Follow James Clear's principle from Atomic Habits: "reduce the scope but stick to the schedule." The Nucleus Habit is the reduced scope. The Supernova Habit is the full scope — the version the user does on a good day when they have more time and energy.
 
 
 Each habit option must:
-- Align tightly with the user's context:
-   - Starting Idea: {starting_idea}
-   - Identity: {identity}
-   - Nucleus Habit: {starter_habit}
+- Align tightly with the user's context (Starting Idea, Identity and Nucleus Habit under "Habit Context" below).
 - Be a scaled-up version of the Nucleus Habit — the same core behavior, with more depth, duration, or intensity.
 - Be specific, realistic, actionable, and concise.
 - Directly support the user's stated identity and habit goals.
@@ -283,28 +258,17 @@ Read an in-depth article and write a short summary of your takeaways.
 - The Supernova Habit must be recognizably the same behavior as the Nucleus Habit, just with more time or depth. If the Nucleus Habit is "read one page," the Supernova should be "read a full chapter" — not "create a reading list" or "join a book club."
 - Every option should be something the user can do independently, without relying on other people or external circumstances.
 - Each option should feel like a natural expansion — the user should think "that's just more of what I already do on easy days."
-- Make habit options as brief as possible—ideal for quick reading and action on a mobile device."""
+- Make habit options as brief as possible—ideal for quick reading and action on a mobile device.
 
 
-   return prompt
+# Habit Context
 
 
+- Starting Idea: {{starting_idea}}
+- Identity: {{identity}}
+- Nucleus Habit: {{starter_habit}}"""
 
-
-def get_obvious_cues_prompt(habit_context: dict) -> str:
-   """
-   Generate prompt for obvious cues (environmental triggers).
-   Uses all preferences collected up to and including the cue step in onboarding.
-   """
-   starting_idea = habit_context.get("starting_idea", "")
-   identity = habit_context.get("identity", "")
-   enjoyment = habit_context.get("enjoyment", "")
-   starter_habit = habit_context.get("starter_habit", "")
-   full_habit = habit_context.get("full_habit", "")
-   habit_stack = habit_context.get("habit_stack", "")
-
-
-   prompt = f"""Generate 3 practical environment design tips that will make the user's habit the path of least resistance.
+OBVIOUS_CUES_TEMPLATE = """Generate 3 practical environment design tips that will make the user's habit the path of least resistance. The user's habit context is given at the end of this prompt.
 
 This combines two of James Clear's laws of behavior change from Atomic Habits:
 - "Make it obvious" — prime your environment so the good habit is the easiest, most visible thing to do.
@@ -312,14 +276,6 @@ This combines two of James Clear's laws of behavior change from Atomic Habits:
 
 As Clear says: "Walk into the rooms where you spend most of your time and ask yourself, what is this space designed to encourage?"
 
-Habit Context:
-- Starting Idea: {starting_idea}
-- Identity: {identity}
-- Nucleus Habit: {starter_habit}
-- Supernova Habit: {full_habit}
-- Habit Stack (cue): {habit_stack}
-- What makes it fun: {enjoyment}
-
 Guidelines:
 - Follow this pattern for the 3 tips:
   1. Make it obvious — put the thing the user needs in sight, right where the habit happens.
@@ -399,72 +355,17 @@ Keep a notes doc open alongside your reading (challenge yourself to pull out one
 - Tip 1 is about visibility — put the habit in the user's path. Tip 2 is about creating a dedicated space — framed positively. Tip 3 is about making it attractive — weaving in the enjoyment factor where it fits.
 - The bracket pattern lets you acknowledge the user's enjoyment factor without forcing it. The tip must stand alone as a practical environment change — the bracket is a bonus, not the main point.
 - If the enjoyment factor doesn't naturally connect to the physical environment, skip the bracket entirely. A practical tip is better than a contrived fun tip.
-- Tips should feel practical and doable — not aspirational or requiring a major life change."""
-
-
-   return prompt
-
-
-
-
-# Human-readable labels for preference keys (for LLM prompt)
-PREFERENCE_KEY_LABELS = {
-   "identity": "Identity statement (who you're becoming)",
-   "starter_habit": "Nucleus habit (minimal showing-up action)",
-   "full_habit": "Supernova habit",
-   "habit_stack": "Cue or anchor (when/after what)",
-   "enjoyment": "Enjoyment or fun elements",
-   "habit_environment": "Environment support / setup",
-}
+- Tips should feel practical and doable — not aspirational or requiring a major life change.
 
+# Habit Context
+- Starting Idea: {{starting_idea}}
+- Identity: {{identity}}
+- Nucleus Habit: {{starter_habit}}
+- Supernova Habit: {{full_habit}}
+- Habit Stack (cue): {{habit_stack}}
+- What makes it fun: {{enjoyment}}"""
 
-
-
-def get_preference_edit_options_prompt(
-   habit_context: dict,
-   preference_key: str,
-   current_value: str,
-   reflection_context: dict | None = None,
-) -> str:
-   """
-   Generate prompt for 3 alternative phrasings of a single habit preference.
-   Used in Reflection flow when user taps pencil to edit a preference.
-   If reflection_context is provided (Screen 1 answers), options take those into account.
-   """
-   label = PREFERENCE_KEY_LABELS.get(
-       preference_key,
-       preference_key.replace("_", " ").title(),
-   )
-   context_lines = []
-   for k, v in habit_context.items():
-       if v:
-           context_lines.append(f"- {k}: {v}")
-   context_block = "\n".join(context_lines) if context_lines else "(No context yet)"
-
-
-   reflection_block = ""
-   if reflection_context:
-       parts = []
-       if reflection_context.get("reflectionQ1"):
-           parts.append(f"What helped them show up: \"{reflection_context['reflectionQ1']}\"")
-       if reflection_context.get("reflectionQ2"):
-           parts.append(f"What made starting harder on skip days: \"{reflection_context['reflectionQ2']}\"")
-       if reflection_context.get("identityReflection"):
-           parts.append(f"Other reflection (I'm noticing that...): \"{reflection_context['identityReflection']}\"")
-       if reflection_context.get("identityAlignmentValue") is not None:
-           val = reflection_context["identityAlignmentValue"]
-           if val <= 33:
-               alignment_note = "they didn't feel very aligned with their identity this week"
-           elif val <= 66:
-               alignment_note = "they felt somewhat aligned with their identity this week"
-           else:
-               alignment_note = "they felt well aligned with their identity this week"
-           parts.append(f"Identity alignment: {alignment_note} (slider {val}/100)")
-       if parts:
-           reflection_block = "\n\nREFLECTION FROM THIS WEEK (use this to tailor suggestions):\n" + "\n".join(f"- {p}" for p in parts)
-
-
-   prompt = f"""You are a supportive habit coach helping a user edit one part of their habit plan. Your task is to generate exactly 3 alternative phrasings for their current preference for the specified habit element.
+PREFERENCE_EDIT_OPTIONS_TEMPLATE = """You are a supportive habit coach helping a user edit one part of their habit plan. Your task is to generate exactly 3 alternative phrasings for their current preference for the specified habit element.
 
 
 Incorporate the following requirements:
@@ -475,16 +376,7 @@ Incorporate the following requirements:
 - Each alternative must be specific and actionable.
 - Alternatives should draw on James Clear’s "Atomic Habits" framework: each suggestion should embody at least one of the Four Laws of Behavior Change ("Make it Obvious," "Make it Attractive," "Make it Easy," or "Make it Satisfying"). State briefly (in brackets at the end of each alternative) which law(s) the alternative exemplifies.
 - When the user provides reflection from this week, use it to inform your options (e.g., address obstacles mentioned, build on what helped, or reflect what they noticed).
-
-
-HABIT CONTEXT:
-{context_block}
-
-
-Label being edited: {label}
-Current value: "{current_value or '(empty)'}"
-User Reflection (if provided):
-{reflection_block}
+- The habit context, the element being edited, its current value and any reflection are given at the end of this prompt.
 
 
 # Steps
@@ -510,55 +402,23 @@ User Reflection (if provided):
 - Consider both positive reflection (build on strengths) and obstacles (offer solutions).
 
 
-(Reminder: Generate 3 actionable alternatives for the user’s habit preference, making sure each option is different from the current value, explicitly inspired by Atomic Habits, and includes the relevant law(s) in brackets.)"""
-
-
-   return prompt
-
-
-
-
-def get_reflection_items_prompt(habit_context: dict, streak_data: dict) -> str:
-   """
-   Generate prompt for reflection flow items (Screen 1 & 2) from habit plan + streak.
-   LLM should return valid JSON matching ReflectionItemsResponse shape.
-   """
-   identity = habit_context.get("identity", "")
-   starting_idea = habit_context.get("starting_idea", "")
-   starter_habit = habit_context.get("starter_habit", "")
-   full_habit = habit_context.get("full_habit", "")
-   habit_stack = habit_context.get("habit_stack", "")
-   habit_environment = habit_context.get("habit_environment", "")
-   enjoyment = habit_context.get("enjoyment", "")
+(Reminder: Generate 3 actionable alternatives for the user’s habit preference, making sure each option is different from the current value, explicitly inspired by Atomic Habits, and includes the relevant law(s) in brackets.)
 
 
-   current_streak = streak_data.get("currentStreak", 0)
-   longest_streak = streak_data.get("longestStreak", 0)
-   total_stones = streak_data.get("totalStones", 0)
-   last_check_in = streak_data.get("lastCheckInDate")
-
-
-   prompt = f"""Reflect on the user's habit plan and streak data using James Clear's Atomic Habits framework. Generate a supportive weekly reflection with personalized insights, questions, and habit experiments rooted in Atomic Habits principles (identity, cues, habit stacking, the four laws: make it obvious, attractive, easy, and satisfying).
-
+HABIT CONTEXT:
+{{context_block}}
 
-Draw on the following input:
 
+Label being edited: {{label}}
+Current value: "{{current_value}}"
+User Reflection (if provided):
+{{reflection_block}}"""
 
-HABIT PLAN:
-- Identity: "{identity}"
-- Starting idea: {starting_idea}
-- Nucleus habit: {starter_habit}
-- Supernova habit: {full_habit}
-- Anchor/cue: {habit_stack or "Not set"}
-- Environment setup: {habit_environment or "Not set"}
-- Enjoyment/fun elements: {enjoyment or "Not set"}
+# Shared by the single- and multi-habit reflection prompts (identical static prefix)
+REFLECTION_ITEMS_INSTRUCTIONS = """Reflect on the user's habit plan and streak data using James Clear's Atomic Habits framework. Generate a supportive weekly reflection with personalized insights, questions, and habit experiments rooted in Atomic Habits principles (identity, cues, habit stacking, the four laws: make it obvious, attractive, easy, and satisfying).
 
 
-STREAK DATA:
-- Current streak: {current_streak} days
-- Longest streak: {longest_streak} days
-- Total stones (check-ins): {total_stones}
-- Last check-in: {last_check_in or "None yet"}
+Draw on the user's HABIT PLAN and STREAK DATA, given at the end of this prompt.
 
 
 Follow these instructions:
@@ -587,41 +447,17 @@ Follow these instructions:
 # Output Format
 
 
-Return a single JSON object with exactly this structure and field names (do not add markdown or any extra text):
-
-
-{{
- "insights": [
-   {{ "emoji": "💪", "text": "[Short, warm observation about their week or resilience rooted in Atomic Habits ideas]", "highlight": "[Optional one-sentence Atomic Habits takeaway, such as 'Your streak shows how identity-driven habits stick.']" }}
- ],
- "reflectionQuestions": {{
-   "question1": "[Rephrased: What subtle cues or routines helped you show up this week? (or similar, tied to cues/identity)]",
-   "question2": "[Rephrased: When it was tough to start, what got in the way? How might you tweak your environment or routine? (tie to habit friction or cue)]"
- }},
- "experimentSuggestions": [
-   {{
-     "type": "anchor",
-     "title": "Strengthen your anchor",
-     "currentValue": "[Short summary of their current anchor/cue]",
-     "suggestedText": "[Concrete, specific experiment based on cue stacking or making the trigger more obvious]",
-     "why": "[One sentence on why this helps, referencing Atomic Habits concepts or laws]"
-   }},
-   {{
-     "type": "environment",
-     "title": "Prep your environment",
-     "currentValue": "[Short summary of their current environment setup]",
-     "suggestedText": "[Concrete, specific experiment to make the environment more supportive]",
-     "why": "[One sentence: why this works, referencing reducing friction or making habits easier]"
-   }},
-   {{
-     "type": "enjoyment",
-     "title": "Make it more enjoyable",
-     "currentValue": "[Short summary of their enjoyment or reward aspect]",
-     "suggestedText": "[Concrete, specific experiment adding a reward or pairing with something enjoyable]",
-     "why": "[One sentence: why this builds positive associations, referencing making habits satisfying]"
-   }}
- ]
-}}
+Return a single compact JSON object with exactly these short keys (do not add markdown or any extra text). Titles and the user's current values are added by the app, so do not repeat them:
+
+
+{"i":[{"e":"💪","t":"[Short, warm observation about their week or resilience rooted in Atomic Habits ideas]","h":"[Optional one-sentence Atomic Habits takeaway]"}],
+"q":["[Rephrased: What subtle cues or routines helped you show up this week? (tied to cues/identity)]","[Rephrased: When it was tough to start, what got in the way? How might you tweak your environment or routine?]"],
+"x":{"anchor":{"s":"[Concrete, specific experiment based on cue stacking or making the trigger more obvious]","w":"[One sentence on why this helps, referencing Atomic Habits concepts or laws]"},
+"environment":{"s":"[Concrete, specific experiment to make the environment more supportive]","w":"[One sentence: why this works, referencing reducing friction or making habits easier]"},
+"enjoyment":{"s":"[Concrete, specific experiment adding a reward or pairing with something enjoyable]","w":"[One sentence: why this builds positive associations, referencing making habits satisfying]"}}}
+
+
+Keys: i = insights (0-2; e = emoji, t = text, h = highlight), q = the two reflection questions, x = the three experiments (s = suggested text, w = why).
 
 
 # Examples
@@ -646,48 +482,17 @@ Last check-in: "Yesterday"
 Example output:
 
 
-{{
- "insights": [
-   {{
-     "emoji": "💪",
-     "text": "You kept your new habit alive four days in a row. Starting your morning with a simple action shows strong identity-based consistency.",
-     "highlight": "Small actions stacked on a reliable cue build lasting routines."
-   }}
- ],
- "reflectionQuestions": {{
-   "question1": "What made it easier to notice your 6am cue this week?",
-   "question2": "When you skipped your habit, did anything in your morning routine throw you off? How could you tweak your setup?"
- }},
- "experimentSuggestions": [
-   {{
-     "type": "anchor",
-     "title": "Strengthen your anchor",
-     "currentValue": "Alarm at 6am",
-     "suggestedText": "Try placing your alarm on the other side of the room to ensure you get out of bed right away.",
-     "why": "Moving the cue into your physical environment makes the habit more obvious and harder to ignore."
-   }},
-   {{
-     "type": "environment",
-     "title": "Prep your environment",
-     "currentValue": "Glass and running shoes by the bed",
-     "suggestedText": "Lay out your workout clothes on top of your shoes the night before.",
-     "why": "Minimizing friction in your environment makes it easier to start your habit immediately."
-   }},
-   {{
-     "type": "enjoyment",
-     "title": "Make it more enjoyable",
-     "currentValue": "Listening to favorite music",
-     "suggestedText": "Create a special morning playlist you only play during your jog.",
-     "why": "Pairing your habit with a reward makes it more satisfying and enjoyable."
-   }}
- ]
-}}
+{"i":[{"e":"💪","t":"You kept your new habit alive four days in a row. Starting your morning with a simple action shows strong identity-based consistency.","h":"Small actions stacked on a reliable cue build lasting routines."}],
+"q":["What made it easier to notice your 6am cue this week?","When you skipped your habit, did anything in your morning routine throw you off? How could you tweak your setup?"],
+"x":{"anchor":{"s":"Try placing your alarm on the other side of the room to ensure you get out of bed right away.","w":"Moving the cue into your physical environment makes the habit more obvious and harder to ignore."},
+"environment":{"s":"Lay out your workout clothes on top of your shoes the night before.","w":"Minimizing friction in your environment makes it easier to start your habit immediately."},
+"enjoyment":{"s":"Create a special morning playlist you only play during your jog.","w":"Pairing your habit with a reward makes it more satisfying and enjoyable."}}}
 
 
 # Notes
 
 
-- Strictly follow the exact JSON field names and structure—no additional fields or commentary.
+- Strictly follow the exact short JSON keys and structure—no additional fields or commentary.
 - Every insight and suggestion should directly reflect or leverage at least one Atomic Habits principle.
 - Use placeholders for long user content if examples are abbreviated.
 - Remain warm and supportive while prioritizing habit science over general advice.
@@ -695,42 +500,72 @@ Example output:
 - Always return ONLY the JSON object, no surrounding markdown!
 
 
-Remember: Use the Atomic Habits framework for all analysis and suggestions, focus on the science of habit formation, and only output the required structured JSON."""
+Remember: Use the Atomic Habits framework for all analysis and suggestions, focus on the science of habit formation, and only output the required compact JSON."""
+
+# One habit's data: the end of the single-habit prompt, one block per habit in the batch prompt
+REFLECTION_HABIT_DATA_TEMPLATE = """HABIT PLAN:
+- Identity: "{{identity}}"
+- Starting idea: {{starting_idea}}
+- Nucleus habit: {{starter_habit}}
+- Supernova habit: {{full_habit}}
+- Anchor/cue: {{habit_stack}}
+- Environment setup: {{habit_environment}}
+- Enjoyment/fun elements: {{enjoyment}}
 
 
-   return prompt
+STREAK DATA:
+- Current streak: {{current_streak}} days
+- Longest streak: {{longest_streak}} days
+- Total stones (check-ins): {{total_stones}}
+- Last check-in: {{last_check_in}}"""
 
+REFLECTION_ITEMS_TEMPLATE = REFLECTION_ITEMS_INSTRUCTIONS + "\n\n\n" + REFLECTION_HABIT_DATA_TEMPLATE
 
+REFLECTION_ITEMS_BATCH_TEMPLATE = REFLECTION_ITEMS_INSTRUCTIONS + """
 
 
-def get_reflection_suggestion_prompt(
-   habit_context: dict,
-   reflection_q1: str,
-   reflection_q2: str,
-   identity_reflection: str,
-   identity_alignment_value: int | None,
-) -> str:
-   """
-   Generate prompt for one LLM suggestion based on user's Screen 1 reflection.
-   Kept short to minimize tokens and speed up the API response.
-   """
-   context_lines = [f"{k}: {str(v)[:100]}" for k, v in (habit_context or {}).items() if v]
-   context_block = "\n".join(context_lines) if context_lines else "No habit context"
+# Several habits
 
 
-   reflection_parts = []
-   if (reflection_q1 or "").strip():
-       reflection_parts.append("What helped: " + (reflection_q1.strip()[:150]))
-   if (reflection_q2 or "").strip():
-       reflection_parts.append("What made it harder: " + (reflection_q2.strip()[:150]))
-   if (identity_reflection or "").strip():
-       reflection_parts.append("Noting: " + (identity_reflection.strip()[:100]))
-   if identity_alignment_value is not None:
-       reflection_parts.append("Alignment: " + ("low" if identity_alignment_value <= 33 else "mid" if identity_alignment_value <= 66 else "high"))
-   reflection_block = "\n".join(reflection_parts) if reflection_parts else "No reflection"
+This request covers several habits of the same user, given below as HABIT 1, HABIT 2, and so on. Reflect on each habit on its own, following all of the instructions above for each one, and never mix details between habits. Return ONE JSON object whose "r" list holds one compact object (as described above) per habit, with "n" set to the habit number:
 
 
-   return f"""Suggest ONE habit change, tailored to the user's unique context and reflection, using only James Clear's Atomic Habits framework. Make sure your suggestion is specific to their situation, not general or random. Reason step-by-step about how the user's reflection and context inform your choice of change and framework element. Your final suggestion must be strictly aligned with one of the Atomic Habits concepts listed below.
+{"r":[{"n":1,"i":[...],"q":["...","..."],"x":{"anchor":{...},"environment":{...},"enjoyment":{...}}},{"n":2,"i":[...],"q":["...","..."],"x":{...}}]}
+
+
+Include every habit number exactly once and return ONLY the JSON object.
+
+
+{{habits_block}}"""
+
+# Repair of a reflection payload missing some experiments: only the missing levers are generated
+REFLECTION_EXPERIMENT_REPAIR_TEMPLATE = """Suggest habit "experiments" for the user's weekly reflection, using James Clear's Atomic Habits framework. Each experiment is one concrete, specific change the user can try this week, tailored to their habit plan and streak below, with one sentence on why it helps that references an Atomic Habits law or technique.
+
+
+Experiment types:
+   - anchor: enhance their anchor/cue (habit stacking or making the cue more obvious).
+   - environment: optimize their environment (removing friction or preparing tools).
+   - enjoyment: add fun/reward (increasing enjoyment, making it satisfying).
+
+
+Return ONLY a JSON object with one key per requested type (s = suggested text, w = why), for example:
+{"environment":{"s":"[Concrete, specific experiment to make the environment more supportive]","w":"[One sentence: why this works, referencing reducing friction or making habits easier]"}}
+
+
+{{habit_data}}
+
+
+Experiments the user already has (do not repeat them):
+{{existing_experiments}}
+
+
+Requested types: {{experiment_types}}
+"""
+
+
+
+
+REFLECTION_SUGGESTION_TEMPLATE = """Suggest ONE habit change, tailored to the user's unique context and reflection, using only James Clear's Atomic Habits framework. Make sure your suggestion is specific to their situation, not general or random. Reason step-by-step about how the user's reflection and context inform your choice of change and framework element. Your final suggestion must be strictly aligned with one of the Atomic Habits concepts listed below.
 
 
 Atomic Habits concepts to use:
@@ -742,13 +577,7 @@ Atomic Habits concepts to use:
 - habit_environment: Environment design — "make it obvious." Change the context (visibility, friction, cues in the space).
 
 
-Details provided:
-Habit Context:
-{context_block}
-
-
-User Reflection:
-{reflection_block}
+The user's habit context and reflection are provided at the end of this prompt.
 
 
 # Steps
@@ -764,12 +593,12 @@ User Reflection:
 Return only the following JSON object (no markdown, no commentary):
 
 
-{{
+{
  "type": "identity|starter_habit|full_habit|habit_stack|enjoyment|habit_environment",
  "title": "Short title (use product term if appropriate)",
  "suggestedText": "Exact new text for this user's situation",
  "why": "One concise sentence referencing the exact Atomic Habits principle and the user's context"
-}}
+}
 
 
 # Example
@@ -781,12 +610,12 @@ Example (for context_block: "Wants to read more books at night, but often too ti
 Reasoning: The user struggles to start reading because they are tired at night. A "Nucleus habit" fits best, as it focuses on making the habit so easy they can't say no. Scaling the action to a two-minute starter lowers the barrier.
 
 
-{{
+{
  "type": "starter_habit",
  "title": "Nucleus habit: Open the book before bed",
  "suggestedText": "After I get into bed, I will open a book and read one page.",
  "why": "This uses the 2-minute rule from Atomic Habits to create an easy gateway for reading, tailored to the user's end-of-day fatigue."
-}}
+}
 
 
 # Notes
@@ -798,4 +627,279 @@ Reasoning: The user struggles to start reading because they are tired at night.
 - No additional commentary or explanation outside of the reasoning and JSON.
 
 
-Remember: Your objective is to produce one highly tailored, evidence-backed suggestion in Atomic Habits style, with a reasoning step preceding your structured output."""
+Remember: Your objective is to produce one highly tailored, evidence-backed suggestion in Atomic Habits style, with a reasoning step preceding your structured output.
+
+
+Details provided:
+Habit Context:
+{{context_block}}
+
+
+User Reflection:
+{{reflection_block}}"""
+
+
+prompt_registry.register("identity_generation", IDENTITY_GENERATION_TEMPLATE)
+prompt_registry.register("short_habit_options", SHORT_HABIT_OPTIONS_TEMPLATE)
+prompt_registry.register("full_habit_options", FULL_HABIT_OPTIONS_TEMPLATE)
+prompt_registry.register("obvious_cues", OBVIOUS_CUES_TEMPLATE)
+prompt_registry.register("preference_edit_options", PREFERENCE_EDIT_OPTIONS_TEMPLATE)
+prompt_registry.register("reflection_items", REFLECTION_ITEMS_TEMPLATE, token_budget=REFLECTION_ITEMS_TOKEN_BUDGET)
+prompt_registry.register(
+   "reflection_items_batch", REFLECTION_ITEMS_BATCH_TEMPLATE, token_budget=REFLECTION_ITEMS_BATCH_TOKEN_BUDGET
+)
+prompt_registry.register("reflection_suggestion", REFLECTION_SUGGESTION_TEMPLATE, token_budget=REFLECTION_SUGGESTION_TOKEN_BUDGET)
+prompt_registry.register(
+   "reflection_experiment_repair",
+   REFLECTION_EXPERIMENT_REPAIR_TEMPLATE,
+   token_budget=REFLECTION_EXPERIMENT_REPAIR_TOKEN_BUDGET,
+)
+
+
+
+
+def get_identity_generation_prompt(habit_context: dict) -> str:
+   """
+   Generate prompt for identity generation based on habit context.
+  
+   Args:
+       habit_context: Dictionary containing habit preferences and context
+      
+   Returns:
+       Formatted prompt string
+   """
+   return prompt_registry.render(
+       "identity_generation",
+       starting_idea=habit_context.get("starting_idea", ""),
+   )
+
+
+
+
+def get_short_habit_options_prompt(habit_context: dict) -> str:
+   """
+   Generate prompt for short habit options (starter habits).
+  
+   Args:
+       habit_context: Dictionary containing habit preferences and context
+      
+   Returns:
+       Formatted prompt string
+   """
+   return prompt_registry.render(
+       "short_habit_options",
+       starting_idea=habit_context.get("starting_idea", ""),
+       identity=habit_context.get("identity", ""),
+   )
+
+
+
+
+def get_full_habit_options_prompt(habit_context: dict) -> str:
+   """
+   Generate prompt for full habit options.
+  
+   Args:
+       habit_context: Dictionary containing habit preferences and context
+      
+   Returns:
+       Formatted prompt string
+   """
+   return prompt_registry.render(
+       "full_habit_options",
+       starting_idea=habit_context.get("starting_idea", ""),
+       identity=habit_context.get("identity", ""),
+       starter_habit=habit_context.get("starter_habit", ""),
+   )
+
+
+
+
+def get_obvious_cues_prompt(habit_context: dict) -> str:
+   """
+   Generate prompt for obvious cues (environmental triggers).
+   Uses all preferences collected up to and including the cue step in onboarding.
+   """
+   return prompt_registry.render(
+       "obvious_cues",
+       starting_idea=habit_context.get("starting_idea", ""),
+       identity=habit_context.get("identity", ""),
+       enjoyment=habit_context.get("enjoyment", ""),
+       starter_habit=habit_context.get("starter_habit", ""),
+       full_habit=habit_context.get("full_habit", ""),
+       habit_stack=habit_context.get("habit_stack", ""),
+   )
+
+
+
+
+# Human-readable labels for preference keys (for LLM prompt)
+PREFERENCE_KEY_LABELS = {
+   "identity": "Identity statement (who you're becoming)",
+   "starter_habit": "Nucleus habit (minimal showing-up action)",
+   "full_habit": "Supernova habit",
+   "habit_stack": "Cue or anchor (when/after what)",
+   "enjoyment": "Enjoyment or fun elements",
+   "habit_environment": "Environment support / setup",
+}
+
+
+
+
+def get_preference_edit_options_prompt(
+   habit_context: dict,
+   preference_key: str,
+   current_value: str,
+   reflection_context: dict | None = None,
+) -> str:
+   """
+   Generate prompt for 3 alternative phrasings of a single habit preference.
+   Used in Reflection flow when user taps pencil to edit a preference.
+   If reflection_context is provided (Screen 1 answers), options take those into account.
+   """
+   label = PREFERENCE_KEY_LABELS.get(
+       preference_key,
+       preference_key.replace("_", " ").title(),
+   )
+   context_lines = []
+   for k, v in habit_context.items():
+       if v:
+           context_lines.append(f"- {k}: {v}")
+   context_block = "\n".join(context_lines) if context_lines else "(No context yet)"
+
+
+   reflection_block = ""
+   if reflection_context:
+       parts = []
+       if reflection_context.get("reflectionQ1"):
+           parts.append(f"What helped them show up: \"{reflection_context['reflectionQ1']}\"")
+       if reflection_context.get("reflectionQ2"):
+           parts.append(f"What made starting harder on skip days: \"{reflection_context['reflectionQ2']}\"")
+       if reflection_context.get("identityReflection"):
+           parts.append(f"Other reflection (I'm noticing that...): \"{reflection_context['identityReflection']}\"")
+       if reflection_context.get("identityAlignmentValue") is not None:
+           val = reflection_context["identityAlignmentValue"]
+           if val <= 33:
+               alignment_note = "they didn't feel very aligned with their identity this week"
+           elif val <= 66:
+               alignment_note = "they felt somewhat aligned with their identity this week"
+           else:
+               alignment_note = "they felt well aligned with their identity this week"
+           parts.append(f"Identity alignment: {alignment_note} (slider {val}/100)")
+       if parts:
+           reflection_block = "\n\nREFLECTION FROM THIS WEEK (use this to tailor suggestions):\n" + "\n".join(f"- {p}" for p in parts)
+
+
+   return prompt_registry.render(
+       "preference_edit_options",
+       context_block=context_block,
+       label=label,
+       current_value=current_value or "(empty)",
+       reflection_block=reflection_block,
+   )
+
+
+
+
+# Compiled once; not registered (it is a fragment of the two reflection items prompts)
+_REFLECTION_HABIT_DATA = PromptTemplate("reflection_habit_data", REFLECTION_HABIT_DATA_TEMPLATE)
+
+
+def _reflection_habit_values(habit_context: dict, streak_data: dict) -> dict:
+   """Template values of REFLECTION_HABIT_DATA_TEMPLATE for one habit."""
+   return {
+       "identity": habit_context.get("identity", ""),
+       "starting_idea": habit_context.get("starting_idea", ""),
+       "starter_habit": habit_context.get("starter_habit", ""),
+       "full_habit": habit_context.get("full_habit", ""),
+       "habit_stack": habit_context.get("habit_stack", "") or "Not set",
+       "habit_environment": habit_context.get("habit_environment", "") or "Not set",
+       "enjoyment": habit_context.get("enjoyment", "") or "Not set",
+       "current_streak": streak_data.get("currentStreak", 0),
+       "longest_streak": streak_data.get("longestStreak", 0),
+       "total_stones": streak_data.get("totalStones", 0),
+       "last_check_in": streak_data.get("lastCheckInDate") or "None yet",
+   }
+
+
+def get_reflection_items_prompt(habit_context: dict, streak_data: dict) -> str:
+   """
+   Generate prompt for reflection flow items (Screen 1 & 2) from habit plan + streak.
+   LLM returns the compact CompactReflectionItems JSON; expand_reflection_items turns it
+   into the ReflectionItemsResponse shape.
+   """
+   return prompt_registry.render("reflection_items", **_reflection_habit_values(habit_context, streak_data))
+
+
+
+
+def get_reflection_items_batch_prompt(habits: list[tuple[dict, dict]]) -> str:
+   """
+   Reflection items prompt for several habits of one user, as (habit_context, streak_data)
+   pairs. The instructions are sent once; LLM returns CompactReflectionBatch with one section
+   per habit, numbered from 1 in the given order.
+   """
+   blocks = [
+       f"HABIT {n}:\n" + _REFLECTION_HABIT_DATA.render(_reflection_habit_values(habit_context, streak_data))
+       for n, (habit_context, streak_data) in enumerate(habits, start=1)
+   ]
+   return prompt_registry.render("reflection_items_batch", habits_block="\n\n\n".join(blocks))
+
+
+
+
+def get_reflection_experiment_repair_prompt(
+   habit_context: dict,
+   streak_data: dict,
+   experiment_types: list[str],
+   existing_experiments: list[dict],
+) -> str:
+   """
+   Prompt for only the experiment types (anchor / environment / enjoyment) missing from a
+   generated reflection payload. LLM returns CompactExperiments with just those keys.
+   """
+   existing = "\n".join(
+       f"- {item.get('type')}: {item.get('suggestedText')}" for item in existing_experiments
+   ) or "- None"
+   return prompt_registry.render(
+       "reflection_experiment_repair",
+       habit_data=_REFLECTION_HABIT_DATA.render(_reflection_habit_values(habit_context, streak_data)),
+       existing_experiments=existing,
+       experiment_types=", ".join(experiment_types),
+   )
+
+
+
+
+def get_reflection_suggestion_prompt(
+   habit_context: dict,
+   reflection_q1: str,
+   reflection_q2: str,
+   identity_reflection: str,
+   identity_alignment_value: int | None,
+) -> str:
+   """
+   Generate prompt for one LLM suggestion based on user's Screen 1 reflection.
+   Kept short to minimize tokens and speed up the API response.
+   """
+   context_lines = [f"{k}: {str(v)[:100]}" for k, v in (habit_context or {}).items() if v]
+   context_block = "\n".join(context_lines) if context_lines else "No habit context"
+
+
+   reflection_parts = []
+   if (reflection_q1 or "").strip():
+       reflection_parts.append("What helped: " + (reflection_q1.strip()[:150]))
+   if (reflection_q2 or "").strip():
+       reflection_parts.append("What made it harder: " + (reflection_q2.strip()[:150]))
+   if (identity_reflection or "").strip():
+       reflection_parts.append("Noting: " + (identity_reflection.strip()[:100]))
+   if identity_alignment_value is not None:
+       reflection_parts.append("Alignment: " + ("low" if identity_alignment_value <= 33 else "mid" if identity_alignment_value <= 66 else "high"))
+   reflection_block = "\n".join(reflection_parts) if reflection_parts else "No reflection"
+
+
+   return prompt_registry.render(
+       "reflection_suggestion",
+       context_block=context_block,
+       reflection_block=reflection_block,
+   )
@@ -0,0 +1,111 @@
+"""
+Expansion of the compact reflection items wire format into ReflectionItemsResponse.
+
+The LLM returns CompactReflectionItems (short keys, no titles or current values) to keep its
+output small; experiment titles are fixed and current values come from the habit context.
+check_reflection_items validates a payload before it is cached and reports the experiment
+levers it lacks, which add_experiments fills in from a repair call (CompactExperiments).
+"""
+from pydantic import ValidationError
+
+from app.models.reflection import (
+    CompactExperiments,
+    CompactReflectionItems,
+    ExperimentSuggestion,
+    ReflectionItemsResponse,
+)
+
+# Fixed experiment titles, in display order
+EXPERIMENT_TITLES = {
+    "anchor": "Strengthen your anchor",
+    "environment": "Prep your environment",
+    "enjoyment": "Make it more enjoyable",
+}
+
+# Habit context field shown as each experiment's current value
+EXPERIMENT_CONTEXT_FIELDS = {
+    "anchor": "habit_stack",
+    "environment": "habit_environment",
+    "enjoyment": "enjoyment",
+}
+
+CURRENT_VALUE_NOT_SET = "Not set yet"
+
+
+def _expand_experiments(experiments: CompactExperiments, habit_context: dict) -> list[dict]:
+    """ExperimentSuggestion dicts for the levers present in compact experiments, in display order."""
+    expanded = []
+    for lever, title in EXPERIMENT_TITLES.items():
+        item = getattr(experiments, lever)
+        if item is None:
+            continue
+        expanded.append({
+            "type": lever,
+            "title": title,
+            "currentValue": habit_context.get(EXPERIMENT_CONTEXT_FIELDS[lever]) or CURRENT_VALUE_NOT_SET,
+            "suggestedText": item.s,
+            "why": item.w,
+        })
+    return expanded
+
+
+def expand_reflection_items(data: dict, habit_context: dict) -> dict:
+    """
+    ReflectionItemsResponse-shaped dict from LLM output.
+
+    Accepts the compact format, and the verbose shape (older prompt versions, cached data)
+    which is returned unchanged. Raises ValueError if the data matches neither.
+    """
+    if "experimentSuggestions" in data or "reflectionQuestions" in data:
+        return data
+    try:
+        compact = CompactReflectionItems.model_validate(data)
+    except ValidationError as e:
+        raise ValueError(f"Reflection items did not match the compact format: {e.error_count()} error(s)") from e
+
+    return ReflectionItemsResponse.model_validate({
+        "insights": [{"emoji": i.e, "text": i.t, "highlight": i.h} for i in compact.i],
+        "reflectionQuestions": {"question1": compact.q[0], "question2": compact.q[1]},
+        "experimentSuggestions": _expand_experiments(compact.x, habit_context),
+    }).model_dump()
+
+
+def check_reflection_items(data: dict) -> tuple[dict, list[str]]:
+    """
+    Validate ReflectionItemsResponse-shaped data before caching.
+
+    Returns the normalized items (at most one experiment per lever, in display order) and the
+    levers without a usable experiment; experiments of unknown type, failing validation or with
+    blank text are dropped and count as missing. Raises ValueError if the rest does not
+    validate (e.g. no reflection questions).
+    """
+    experiments: dict[str, dict] = {}
+    for item in data.get("experimentSuggestions") or []:
+        try:
+            experiment = ExperimentSuggestion.model_validate(item)
+        except ValidationError:
+            continue
+        if experiment.suggestedText.strip() and experiment.why.strip():
+            experiments.setdefault(experiment.type, experiment.model_dump())
+    try:
+        items = ReflectionItemsResponse.model_validate({
+            **data,
+            "experimentSuggestions": [experiments[lever] for lever in EXPERIMENT_TITLES if lever in experiments],
+        }).model_dump()
+    except ValidationError as e:
+        raise ValueError(f"Reflection items did not validate: {e.error_count()} error(s)") from e
+    return items, [lever for lever in EXPERIMENT_TITLES if lever not in experiments]
+
+
+def add_experiments(items: dict, data: dict, habit_context: dict) -> dict:
+    """
+    Items with the experiments from a repair response (CompactExperiments) added for levers
+    they lack; levers already present are kept. Raises ValueError if data does not validate.
+    """
+    try:
+        repair = CompactExperiments.model_validate(data)
+    except ValidationError as e:
+        raise ValueError(f"Experiment repair did not match the compact format: {e.error_count()} error(s)") from e
+    present = {item.get("type") for item in items.get("experimentSuggestions", [])}
+    added = [item for item in _expand_experiments(repair, habit_context) if item["type"] not in present]
+    return {**items, "experimentSuggestions": [*items.get("experimentSuggestions", []), *added]}
@@ -0,0 +1,73 @@
+"""
+In-process BM25 index over a small, static set of text snippets.
+
+Built once at import of the corpus (habit_snippets.py). Document-length normalization is
+applied at build time, so each posting carries its final per-term weight and a lookup is a
+dict walk over the query terms plus a top-k selection: microseconds for a few hundred snippets.
+"""
+import heapq
+import math
+import re
+from collections import Counter
+from operator import itemgetter
+from typing import Sequence
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = frozenset(
+    "a about after an and are as at be been but by can do does for from has have how i if in into is "
+    "it its just me more most my not of on or so than that the their them then there these they this "
+    "to too up was we were what when where which who why will with you your".split()
+)
+
+
+def _stem(token: str) -> str:
+    """Very light suffix stripping so habit/habits, stack/stacking and enjoyable/enjoyment match."""
+    if len(token) > 6 and token.endswith(("able", "ment")):
+        return token[:-4]
+    if len(token) > 5 and token.endswith("ing"):
+        return token[:-3]
+    if len(token) > 4 and token.endswith("ies"):
+        return token[:-3] + "y"
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+
+def tokenize(text: str) -> list[str]:
+    """Lowercased, stemmed terms without stopwords."""
+    return [_stem(t) for t in _TOKEN.findall((text or "").lower()) if t not in STOPWORDS]
+
+
+def normalize_query(query: str) -> str:
+    """Order- and case-insensitive form of a search query (cache key for live search results)."""
+    return " ".join(sorted(set(tokenize(query))))
+
+
+class BM25Index:
+    """Okapi BM25 over a fixed list of documents; search returns (document index, score)."""
+
+    def __init__(self, documents: Sequence[str], k1: float = 1.5, b: float = 0.75):
+        self.size = len(documents)
+        term_counts = [Counter(tokenize(doc)) for doc in documents]
+        lengths = [sum(counts.values()) for counts in term_counts]
+        avg_length = (sum(lengths) / self.size) if self.size else 0.0
+        document_frequency = Counter(term for counts in term_counts for term in counts)
+
+        # term -> [(document index, BM25 weight of the term in that document)]
+        self._postings: dict[str, list[tuple[int, float]]] = {}
+        for doc_id, counts in enumerate(term_counts):
+            norm = k1 * (1 - b + b * lengths[doc_id] / avg_length) if avg_length else k1
+            for term, tf in counts.items():
+                df = document_frequency[term]
+                idf = math.log(1 + (self.size - df + 0.5) / (df + 0.5))
+                weight = idf * tf * (k1 + 1) / (tf + norm)
+                self._postings.setdefault(term, []).append((doc_id, weight))
+
+    def search(self, query: str, k: int = 3) -> list[tuple[int, float]]:
+        """Top k documents for the query, best first (documents without a query term are skipped)."""
+        scores: dict[int, float] = {}
+        for term in set(tokenize(query)):
+            for doc_id, weight in self._postings.get(term, ()):
+                scores[doc_id] = scores.get(doc_id, 0.0) + weight
+        return heapq.nlargest(k, scores.items(), key=itemgetter(1))
@@ -0,0 +1,105 @@
+"""
+Small in-process cache with a size bound and per-entry TTL.
+Used for LLM responses (speculative onboarding prefetch) and other hot, short-lived data.
+Optionally bounded by memory too: with max_bytes and a sizeof function, each entry's size is
+measured once when stored and least recently used entries are evicted past the byte budget.
+"""
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+
+class TTLCache:
+    """LRU cache where entries also expire after ttl_seconds. Not thread-safe (event loop only)."""
+
+    def __init__(
+        self,
+        max_entries: int = 512,
+        ttl_seconds: float = 900,
+        max_bytes: Optional[int] = None,
+        sizeof: Optional[Callable[[Any], int]] = None,
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self._sizeof = sizeof
+        # key -> (expires_at, value, size in bytes; 0 without sizeof)
+        self._data: "OrderedDict[Hashable, tuple[float, Any, int]]" = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Return the cached value, or None if missing or expired."""
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, value, _ = entry
+        if expires_at < time.monotonic():
+            self._remove(key)
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl_seconds: Optional[float] = None) -> None:
+        """Store a value, evicting the least recently used entries past max_entries / max_bytes."""
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        size = self._sizeof(value) if self._sizeof else 0
+        if self.max_bytes is not None and size > self.max_bytes:
+            # Would evict everything else and still not fit
+            self._remove(key)
+            return
+        self._remove(key)
+        self._data[key] = (time.monotonic() + ttl, value, size)
+        self.bytes += size
+        while len(self._data) > self.max_entries or (self.max_bytes is not None and self.bytes > self.max_bytes):
+            _, (_, _, evicted_size) = self._data.popitem(last=False)
+            self.bytes -= evicted_size
+            self.evictions += 1
+
+    def _remove(self, key: Hashable) -> Optional[tuple[float, Any, int]]:
+        entry = self._data.pop(key, None)
+        if entry is not None:
+            self.bytes -= entry[2]
+        return entry
+
+    def pop(self, key: Hashable) -> Optional[Any]:
+        """Remove and return a value (None if missing)."""
+        entry = self._remove(key)
+        return entry[1] if entry else None
+
+    def pop_matching(self, predicate: Callable[[Any], bool]) -> int:
+        """Remove every entry whose value matches predicate; returns how many were removed."""
+        keys = [key for key, (_, value, _) in self._data.items() if predicate(value)]
+        for key in keys:
+            self._remove(key)
+        return len(keys)
+
+    def clear(self) -> None:
+        self._data.clear()
+        self.bytes = 0
+
+    def __contains__(self, key: Hashable) -> bool:
+        """Key is stored (possibly expired); does not count as a hit or miss."""
+        return key in self._data
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict:
+        """Counters for the metrics endpoint."""
+        stats = {
+            "entries": len(self._data),
+            "maxEntries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+        if self._sizeof is not None:
+            stats["bytes"] = self.bytes
+            stats["maxBytes"] = self.max_bytes
+        return stats
@@ -0,0 +1,3 @@
+"""
+Standalone background job workers (python -m app.workers).
+"""
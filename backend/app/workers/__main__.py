@@ -0,0 +1,58 @@
+"""
+Run the background job worker pool as its own process.
+
+Usage:
+    python -m app.workers [--concurrency N]
+
+Use with JOB_WORKERS_IN_PROCESS=false on the API so jobs only run here. SIGTERM / SIGINT stop
+claiming new jobs and drain in-flight ones (up to JOB_DRAIN_TIMEOUT_SECONDS) before exiting.
+"""
+import argparse
+import asyncio
+import signal
+
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Initialize logging before importing other modules
+from app.core.logging_config import setup_logging
+logger = setup_logging()
+
+from app.core.config import settings
+from app.database import close_mongo_connection, connect_to_mongo, get_database
+from app.services.job_queue import job_worker_pool
+from app.services.llm_service import llm_service
+from app.services.llm_metrics import llm_usage_metrics
+from app.services.llm_trace import llm_trace
+from app.services.reflection_agent_service import shutdown_agent_executor
+# Job handlers register on import
+from app.services import reflection_cache_service, reflection_warming  # noqa: F401
+
+
+async def main(concurrency: int) -> None:
+    await connect_to_mongo()
+    llm_usage_metrics.start_flusher(get_database)
+    job_worker_pool.start(get_database, concurrency)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+    await stop.wait()
+
+    logger.info("Stopping job workers...")
+    await job_worker_pool.stop()
+    await llm_usage_metrics.stop_flusher(get_database)
+    await llm_service.close()
+    shutdown_agent_executor()
+    llm_trace.stop()
+    await close_mongo_connection()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run background job workers")
+    parser.add_argument("--concurrency", type=int, default=settings.job_worker_concurrency)
+    args = parser.parse_args()
+    asyncio.run(main(args.concurrency))
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Benchmark prompt rendering and check prompt sizes against their token budgets.
+
+Compares the registry's precompiled renderers with rendering the same {{variable}} template
+by regex substitution on every call, then renders every prompt with long (worst-case) user
+inputs and reports the estimated token count, the static prefix shared by all users, and
+whether prompts with a budget (the reflection prompts) stay within it.
+
+Usage:
+    python benchmark_prompts.py [--iterations N]
+
+Exits with status 1 if a prompt with a token budget exceeds it.
+"""
+import argparse
+import re
+import sys
+import timeit
+from pathlib import Path
+
+# Add parent directory to path for imports
+sys.path.insert(0, str(Path(__file__).parent))
+
+from app.utils import prompts
+from app.utils.prompt_registry import estimate_tokens, prompt_registry
+
+_PLACEHOLDER = re.compile(r"\{\{\s*(\w+)\s*\}\}")
+
+# Long but plausible user inputs (a user pasting a paragraph into every onboarding field)
+LONG_TEXT = "I want to build a calmer, more focused morning routine before work and family time. " * 3
+HABIT_CONTEXT = {
+    key: LONG_TEXT
+    for key in (
+        "starting_idea", "identity", "starter_habit", "full_habit",
+        "habit_stack", "habit_environment", "enjoyment",
+    )
+}
+STREAK_DATA = {"currentStreak": 120, "longestStreak": 365, "totalStones": 1000, "lastCheckInDate": "2026-01-31"}
+# Habits per multi-habit reflection prompt (default REFLECTION_BATCH_MAX_HABITS)
+BATCH_HABITS = 4
+# Experiments already present when one is repaired
+REPAIR_EXISTING = [
+    {"type": "anchor", "suggestedText": "Put your shoes by the door the night before."},
+    {"type": "enjoyment", "suggestedText": "Save a favourite podcast for the walk."},
+]
+
+BUILDERS = {
+    "identity_generation": lambda: prompts.get_identity_generation_prompt(HABIT_CONTEXT),
+    "short_habit_options": lambda: prompts.get_short_habit_options_prompt(HABIT_CONTEXT),
+    "full_habit_options": lambda: prompts.get_full_habit_options_prompt(HABIT_CONTEXT),
+    "obvious_cues": lambda: prompts.get_obvious_cues_prompt(HABIT_CONTEXT),
+    "preference_edit_options": lambda: prompts.get_preference_edit_options_prompt(
+        HABIT_CONTEXT, "habit_stack", LONG_TEXT,
+        {"reflectionQ1": LONG_TEXT, "reflectionQ2": LONG_TEXT, "identityReflection": LONG_TEXT,
+         "identityAlignmentValue": 40},
+    ),
+    "reflection_items": lambda: prompts.get_reflection_items_prompt(HABIT_CONTEXT, STREAK_DATA),
+    "reflection_items_batch": lambda: prompts.get_reflection_items_batch_prompt(
+        [(HABIT_CONTEXT, STREAK_DATA)] * BATCH_HABITS
+    ),
+    "reflection_experiment_repair": lambda: prompts.get_reflection_experiment_repair_prompt(
+        HABIT_CONTEXT, STREAK_DATA, ["environment"], REPAIR_EXISTING
+    ),
+    "reflection_suggestion": lambda: prompts.get_reflection_suggestion_prompt(
+        HABIT_CONTEXT, LONG_TEXT, LONG_TEXT, LONG_TEXT, 40,
+    ),
+}
+
+
+def _regex_render(template: str, values: dict) -> str:
+    """Baseline: parse the template on every call."""
+    return _PLACEHOLDER.sub(lambda m: str(values.get(m.group(1), "")), template)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args()
+
+    print(f"{'prompt':<30}{'compiled us':>12}{'regex us':>10}{'tokens':>8}{'prefix':>8}{'budget':>8}  hash")
+    over_budget = []
+    for compiled in prompt_registry.templates():
+        values = {name: LONG_TEXT for name in compiled.variables}
+        n = args.iterations
+        compiled_us = timeit.timeit(lambda: compiled.render(values), number=n) / n * 1e6
+        regex_us = timeit.timeit(lambda: _regex_render(compiled.template, values), number=n) / n * 1e6
+        assert compiled.render(values) == _regex_render(compiled.template, values)
+
+        tokens = estimate_tokens(BUILDERS[compiled.key]())
+        budget = compiled.token_budget
+        if budget is not None and tokens > budget:
+            over_budget.append(compiled.key)
+        print(
+            f"{compiled.key:<30}{compiled_us:>12.2f}{regex_us:>10.2f}{tokens:>8}"
+            f"{compiled.prefix_tokens:>8}{budget if budget is not None else '-':>8}  {compiled.content_hash}"
+        )
+
+    if over_budget:
+        print(f"\nOver token budget with worst-case inputs: {', '.join(over_budget)}")
+        return 1
+    print("\nAll budgeted prompts within their token budgets.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+Benchmark reflection items output: verbose JSON shape (before) vs compact wire format (after).
+
+Offline (default): compares the output tokens of the two formats using the example answers
+from the prompts, and checks that the compact example expands to the ReflectionItemsResponse
+shape. Uses tiktoken for exact counts when installed, else the ~4 chars/token estimate.
+
+Live (--live N): sends N real reflection requests per format through LLMService (needs the
+LLM_* variables in .env) and reports completion tokens and end-to-end latency.
+
+Usage:
+    python benchmark_reflection_output.py [--live N]
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+
+# Add parent directory to path for imports
+sys.path.insert(0, str(Path(__file__).parent))
+
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+from app.utils.prompt_registry import estimate_tokens
+from app.utils.prompts import REFLECTION_ITEMS_MAX_TOKENS, get_reflection_items_prompt
+from app.utils.reflection_format import expand_reflection_items
+
+# "# Output Format" .. "# Examples" section of the reflection prompt before the compact format
+VERBOSE_OUTPUT_SECTION = """# Output Format
+
+
+Return a single JSON object with exactly this structure and field names (do not add markdown or any extra text):
+
+
+{
+ "insights": [
+   { "emoji": "💪", "text": "[Short, warm observation about their week or resilience rooted in Atomic Habits ideas]", "highlight": "[Optional one-sentence Atomic Habits takeaway, such as 'Your streak shows how identity-driven habits stick.']" }
+ ],
+ "reflectionQuestions": {
+   "question1": "[Rephrased: What subtle cues or routines helped you show up this week? (or similar, tied to cues/identity)]",
+   "question2": "[Rephrased: When it was tough to start, what got in the way? How might you tweak your environment or routine? (tie to habit friction or cue)]"
+ },
+ "experimentSuggestions": [
+   {
+     "type": "anchor",
+     "title": "Strengthen your anchor",
+     "currentValue": "[Short summary of their current anchor/cue]",
+     "suggestedText": "[Concrete, specific experiment based on cue stacking or making the trigger more obvious]",
+     "why": "[One sentence on why this helps, referencing Atomic Habits concepts or laws]"
+   },
+   {
+     "type": "environment",
+     "title": "Prep your environment",
+     "currentValue": "[Short summary of their current environment setup]",
+     "suggestedText": "[Concrete, specific experiment to make the environment more supportive]",
+     "why": "[One sentence: why this works, referencing reducing friction or making habits easier]"
+   },
+   {
+     "type": "enjoyment",
+     "title": "Make it more enjoyable",
+     "currentValue": "[Short summary of their enjoyment or reward aspect]",
+     "suggestedText": "[Concrete, specific experiment adding a reward or pairing with something enjoyable]",
+     "why": "[One sentence: why this builds positive associations, referencing making habits satisfying]"
+   }
+ ]
+}
+
+
+# Examples
+
+
+Example input (shortened):
+
+
+Identity: "Early riser"
+Starting idea: "Get up at 6am"
+Starter habit: "Drink a glass of water on waking"
+Full habit: "Morning jog at 6:15am"
+Anchor/cue: "Alarm at 6am"
+Environment setup: "Glass and running shoes by the bed"
+Enjoyment: "Listening to favorite music"
+Current streak: 4 days
+Longest streak: 5 days
+Total stones: 7
+Last check-in: "Yesterday"
+
+
+Example output:
+
+
+{
+ "insights": [
+   {
+     "emoji": "💪",
+     "text": "You kept your new habit alive four days in a row. Starting your morning with a simple action shows strong identity-based consistency.",
+     "highlight": "Small actions stacked on a reliable cue build lasting routines."
+   }
+ ],
+ "reflectionQuestions": {
+   "question1": "What made it easier to notice your 6am cue this week?",
+   "question2": "When you skipped your habit, did anything in your morning routine throw you off? How could you tweak your setup?"
+ },
+ "experimentSuggestions": [
+   {
+     "type": "anchor",
+     "title": "Strengthen your anchor",
+     "currentValue": "Alarm at 6am",
+     "suggestedText": "Try placing your alarm on the other side of the room to ensure you get out of bed right away.",
+     "why": "Moving the cue into your physical environment makes the habit more obvious and harder to ignore."
+   },
+   {
+     "type": "environment",
+     "title": "Prep your environment",
+     "currentValue": "Glass and running shoes by the bed",
+     "suggestedText": "Lay out your workout clothes on top of your shoes the night before.",
+     "why": "Minimizing friction in your environment makes it easier to start your habit immediately."
+   },
+   {
+     "type": "enjoyment",
+     "title": "Make it more enjoyable",
+     "currentValue": "Listening to favorite music",
+     "suggestedText": "Create a special morning playlist you only play during your jog.",
+     "why": "Pairing your habit with a reward makes it more satisfying and enjoyable."
+   }
+ ]
+}
+
+
+"""
+
+# The example user from the prompt
+HABIT_CONTEXT = {
+    "identity": "Early riser",
+    "starting_idea": "Get up at 6am",
+    "starter_habit": "Drink a glass of water on waking",
+    "full_habit": "Morning jog at 6:15am",
+    "habit_stack": "Alarm at 6am",
+    "habit_environment": "Glass and running shoes by the bed",
+    "enjoyment": "Listening to favorite music",
+}
+STREAK_DATA = {"currentStreak": 4, "longestStreak": 5, "totalStones": 7, "lastCheckInDate": "2026-01-30"}
+
+
+def _count_tokens(text: str) -> int:
+    try:
+        import tiktoken
+        return len(tiktoken.get_encoding("o200k_base").encode(text))
+    except ImportError:
+        return estimate_tokens(text)
+
+
+def _prompts() -> tuple[str, str]:
+    """(verbose prompt, compact prompt) for the example user."""
+    compact = get_reflection_items_prompt(HABIT_CONTEXT, STREAK_DATA)
+    start = compact.index("# Output Format")
+    end = compact.index("# Notes")
+    return compact[:start] + VERBOSE_OUTPUT_SECTION + compact[end:], compact
+
+
+def _example_output(prompt: str) -> str:
+    """The example answer embedded in a prompt."""
+    start = prompt.index("Example output:") + len("Example output:")
+    end = prompt.index("# Notes", start)
+    return prompt[start:end].strip()
+
+
+def offline() -> None:
+    verbose_prompt, compact_prompt = _prompts()
+    verbose_out = _example_output(verbose_prompt)
+    compact_out = _example_output(compact_prompt)
+    expanded = expand_reflection_items(json.loads(compact_out), HABIT_CONTEXT)
+    assert expanded == json.loads(verbose_out), "compact example does not expand to the verbose example"
+
+    v_tokens, c_tokens = _count_tokens(verbose_out), _count_tokens(compact_out)
+    print(f"{'format':<10}{'prompt tokens':>15}{'output tokens':>15}{'max_tokens':>12}")
+    print(f"{'verbose':<10}{_count_tokens(verbose_prompt):>15}{v_tokens:>15}{4096:>12}")
+    print(f"{'compact':<10}{_count_tokens(compact_prompt):>15}{c_tokens:>15}{REFLECTION_ITEMS_MAX_TOKENS:>12}")
+    print(f"\nOutput tokens: -{100 * (1 - c_tokens / v_tokens):.0f}% (example answer)")
+
+
+async def live(runs: int) -> None:
+    from app.models.reflection import CompactReflectionItems, ReflectionItemsResponse
+    from app.services.llm_metrics import llm_usage_metrics
+    from app.services.llm_service import llm_service
+
+    verbose_prompt, compact_prompt = _prompts()
+    variants = [
+        ("verbose", verbose_prompt, ReflectionItemsResponse, 4096),
+        ("compact", compact_prompt, CompactReflectionItems, REFLECTION_ITEMS_MAX_TOKENS),
+    ]
+    try:
+        for name, prompt, schema, max_tokens in variants:
+            prompt_name = f"bench_reflection_{name}"
+            latencies = []
+            for _ in range(runs):
+                started = time.monotonic()
+                raw = await llm_service.generate_json(prompt, max_tokens=max_tokens, schema=schema, prompt_name=prompt_name)
+                expand_reflection_items(raw, HABIT_CONTEXT)
+                latencies.append(time.monotonic() - started)
+            usage = llm_usage_metrics.snapshot()[prompt_name]
+            print(
+                f"{name:<10} runs={runs} completion_tokens/run={usage['completionTokens'] / runs:.0f} "
+                f"latency p50={statistics.median(latencies):.2f}s mean={statistics.mean(latencies):.2f}s "
+                f"max={max(latencies):.2f}s"
+            )
+    finally:
+        await llm_service.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--live", type=int, default=0, metavar="N", help="real LLM calls per format")
+    args = parser.parse_args()
+    offline()
+    if args.live:
+        print()
+        asyncio.run(live(args.live))
+
+
+if __name__ == "__main__":
+    main()
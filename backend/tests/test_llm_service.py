@@ -0,0 +1,49 @@
+"""
+LLMService structured-output fallback: which provider 400s turn off response_format.
+Run with: python -m pytest tests
+"""
+import asyncio
+
+import httpx
+import pytest
+
+from app.services.llm_service import CompletionRequest, LLMProvider, LLMProviderError, LLMService
+
+
+def _post_once_with_400(error: dict) -> tuple[LLMProvider, LLMProviderError]:
+    """Provider and error after one _post_once attempt answered with HTTP 400 and error."""
+    provider = LLMProvider("primary", "https://llm.test/v1", "test-key", "test-model")
+    service = LLMService()
+    service._client = httpx.AsyncClient(
+        transport=httpx.MockTransport(lambda request: httpx.Response(400, json={"error": error}))
+    )
+    request = CompletionRequest(
+        prompt="Reflect on my habit",
+        temperature=None,
+        max_tokens=50,
+        json_schema={"name": "reflection", "schema": {"type": "object"}},
+    )
+    with pytest.raises(LLMProviderError) as exc_info:
+        asyncio.run(service._post_once(provider, request))
+    return provider, exc_info.value
+
+
+def test_context_length_400_keeps_structured_output():
+    provider, error = _post_once_with_400({
+        "message": "This model's maximum context length is 8192 tokens.",
+        "type": "invalid_request_error",
+        "code": "context_length_exceeded",
+    })
+    assert provider.supports_json_schema is True
+    assert error.retryable is False
+
+
+def test_response_format_400_disables_structured_output():
+    provider, error = _post_once_with_400({
+        "message": "Unsupported parameter: 'response_format' is not supported with this model.",
+        "type": "invalid_request_error",
+        "param": "response_format",
+        "code": "unsupported_parameter",
+    })
+    assert provider.supports_json_schema is False
+    assert error.retryable is True